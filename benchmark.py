@@ -0,0 +1,940 @@
+"""
+Sinyal motoru ve tarama döngüsü için benchmark paketi.
+
+Ölçülen aşamalar:
+    - calculate_full_pine_signals (timeframe parametre setleri x 1k/10k/100k mum)
+    - calculate_batch_pine_signals (çok sembollü toplu hesaplama)
+    - check_klines_for_trigger / find_first_trigger, format_price ve kline çözme (klines_to_dataframe)
+    - Pozisyon motoru turu: 1000 açık pozisyonda tarama aralığı ve MFE/MAE güncellemesi, kayıt belleği
+    - signal_processing_loop'un tam bir turu (yerel Binance/Mongo stand-in'leri ile)
+    - Aynı tur, gecikmeli Mongo stand-in'i ile: DB çağrıları loop üzerinde vs. DB thread havuzunda
+      (event loop gecikmesi toplamı ve en büyüğü; gecikmesiz DB ile aynı turun gecikmesi CPU payı olarak
+      çıkarılır, kalan DB beklemesinin loop'ta geçen kısmıdır)
+    - Gecikmeli Mongo ile pozisyon kapanışı: kapanış başına gidiş-dönüş ve çift kapanış kontrolü
+    - Açılışta durum yükleme: gecikmeli Mongo'dan vs. yerel anlık görüntüden (runtime snapshot)
+
+Her aşama için süre (median/min) ve tracemalloc ile tepe bellek raporlanır, sonuçlar
+JSON olarak kaydedilir ve önceki bir JSON ile karşılaştırılabilir.
+
+Kullanım:
+    python benchmark.py                               # sentetik veri, tüm aşamalar
+    python benchmark.py --quick                       # 100k mum hariç hızlı tur
+    python benchmark.py --record klines.json          # Binance'den gerçek veri kaydet
+    python benchmark.py --recorded klines.json        # kayıtlı veri ile çalıştır
+    python benchmark.py --output yeni.json --baseline benchmark_baseline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import copy
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+from pymongo import DeleteOne
+from pymongo.errors import BulkWriteError
+
+import crypto_signal_v2 as bot
+
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '8h': 28_800_000, '1d': 86_400_000
+}
+DEFAULT_BAR_SIZES = [1_000, 10_000, 100_000]
+RECORD_LIMIT = 1500  # Binance futures kline limiti
+CYCLE_SLEEP_THRESHOLD = 60  # Bu süreden uzun bekleme = döngü turu bitti
+
+# ============================================================================
+# VERİ KAYNAKLARI
+# ============================================================================
+
+def synthetic_klines(n_bars, interval='1h', seed=0, start_price=100.0):
+    """Geometrik rastgele yürüyüşten Binance formatında ham kline listesi üretir"""
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.01, n_bars)))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.004, n_bars))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = rng.uniform(100, 1000, n_bars)
+
+    step = INTERVAL_MS[interval]
+    last_open = (int(time.time() * 1000) // step) * step
+    open_times = last_open - step * np.arange(n_bars - 1, -1, -1, dtype=np.int64)
+
+    return [
+        [int(t), f"{o:.8f}", f"{h:.8f}", f"{l:.8f}", f"{c:.8f}", f"{v:.3f}",
+         int(t) + step - 1, f"{v * c:.4f}", 100, f"{v / 2:.3f}", f"{v * c / 2:.4f}", "0"]
+        for t, o, h, l, c, v in zip(open_times, open_, high, low, close, volume)
+    ]
+
+class KlineStore:
+    """(symbol, interval) -> ham kline listesi; kayıtlı veri yoksa sentetik üretir"""
+
+    def __init__(self, recorded=None, synthetic_bars=RECORD_LIMIT):
+        self.recorded = recorded or {}
+        self.synthetic_bars = synthetic_bars
+        self._synthetic = {}
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(recorded=data.get("symbols", {}))
+
+    @property
+    def source(self):
+        return "recorded" if self.recorded else "synthetic"
+
+    def series(self, symbol, interval):
+        rows = self.recorded.get(symbol, {}).get(interval)
+        if rows:
+            return rows
+        key = (symbol, interval)
+        if key not in self._synthetic:
+            # Aynı sembolün tüm timeframe'leri aynı fiyat yolunu izlesin (ticker ve mumlar tutarlı kalsın)
+            seed = sum(map(ord, symbol))
+            self._synthetic[key] = synthetic_klines(self.synthetic_bars, interval, seed=seed)
+        return self._synthetic[key]
+
+    def tail(self, symbol, interval, limit):
+        return self.series(symbol, interval)[-limit:]
+
+    def series_of_length(self, interval, n_bars):
+        """İstenen uzunlukta seri: yeterli kayıtlı veri varsa onu, yoksa sentetik veriyi döndürür"""
+        for intervals in self.recorded.values():
+            rows = intervals.get(interval)
+            if rows and len(rows) >= n_bars:
+                return rows[-n_bars:], "recorded"
+        return synthetic_klines(n_bars, interval, seed=n_bars), "synthetic"
+
+async def record_klines(path, limit=RECORD_LIMIT):
+    """CRYPTO_SETTINGS sembolleri için gerçek Binance kline verisini dosyaya kaydeder"""
+    intervals = sorted({tf for config in bot.CRYPTO_SETTINGS.values() for tf in config["timeframes"]} | {'1m', '15m'})
+    recorded = {}
+    async with aiohttp.ClientSession() as session:
+        for symbol in bot.CRYPTO_SETTINGS:
+            recorded[symbol] = {}
+            for interval in intervals:
+                url = f"{bot.BINANCE_FUTURES_URL}/fapi/v1/klines?symbol={symbol}&interval={interval}&limit={limit}"
+                recorded[symbol][interval] = await bot.api_request_with_retry(session, url, ssl=False)
+                print(f"✅ {symbol} {interval}: {len(recorded[symbol][interval])} mum kaydedildi")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"recorded_at": str(datetime.now()), "symbols": recorded}, f)
+    print(f"💾 Kayıtlı veri: {path}")
+
+# ============================================================================
+# YEREL BINANCE / MONGO STAND-IN'LERİ
+# ============================================================================
+
+class _Result:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+def _get_path(doc, path):
+    value = doc
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None, False
+        value = value[part]
+    return value, True
+
+def _set_path(doc, path, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        value, exists = _get_path(doc, key)
+        if isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition):
+            for op, operand in condition.items():
+                if op == "$regex":
+                    if not isinstance(value, str) or not re.search(operand, value):
+                        return False
+                elif op == "$exists":
+                    if exists != bool(operand):
+                        return False
+                elif op == "$in":
+                    if value not in operand:
+                        return False
+                elif op == "$ne":
+                    if value == operand:
+                        return False
+                elif op == "$not":
+                    if _matches(doc, {key: operand}):
+                        return False
+                elif op in ("$lt", "$lte", "$gt", "$gte"):
+                    if not exists or value is None:
+                        return False
+                    try:
+                        ok = {"$lt": value < operand, "$lte": value <= operand,
+                              "$gt": value > operand, "$gte": value >= operand}[op]
+                    except TypeError:
+                        return False
+                    if not ok:
+                        return False
+                else:
+                    raise NotImplementedError(f"Desteklenmeyen sorgu operatörü: {op}")
+        elif value != condition:
+            return False
+    return True
+
+class InMemoryCollection:
+    """Botun kullandığı pymongo Collection alt kümesinin bellek içi karşılığı"""
+
+    def __init__(self, docs=None, name="collection", latency=0.0):
+        self.name = name
+        self.latency = latency  # Gidiş-dönüş başına bloklayan bekleme (s), uzak Mongo benzetimi
+        self.docs = {}
+        self.operations = 0
+        for doc in docs or []:
+            self.docs[doc["_id"]] = copy.deepcopy(doc)
+
+    def _round_trip(self):
+        self.operations += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _find(self, query):
+        if set(query) == {"_id"} and not isinstance(query["_id"], dict):
+            doc = self.docs.get(query["_id"])
+            return [doc] if doc is not None else []
+        return [doc for doc in self.docs.values() if _matches(doc, query)]
+
+    def find_one(self, query=None, projection=None):
+        self._round_trip()
+        found = self._find(query or {})
+        return copy.deepcopy(found[0]) if found else None
+
+    def find(self, query=None, projection=None):
+        self._round_trip()
+        return [copy.deepcopy(doc) for doc in self._find(query or {})]
+
+    def count_documents(self, query):
+        self._round_trip()
+        return len(self._find(query))
+
+    def estimated_document_count(self):
+        self._round_trip()
+        return len(self.docs)
+
+    def create_index(self, keys, **kwargs):
+        self._round_trip()
+        return keys if isinstance(keys, str) else "_".join(str(part) for key in keys for part in key)
+
+    def insert_one(self, doc):
+        self._round_trip()
+        if doc.get("_id") in self.docs:
+            raise ValueError(f"Duplicate key: {doc['_id']}")
+        self.docs[doc["_id"]] = copy.deepcopy(doc)
+        return _Result(inserted_id=doc["_id"], acknowledged=True)
+
+    def _apply_update(self, doc, update, inserted=False):
+        if not any(key.startswith('$') for key in update):
+            replaced = {"_id": doc["_id"]}
+            replaced.update(copy.deepcopy(update))
+            doc.clear()
+            doc.update(replaced)
+            return
+        for path, value in update.get("$set", {}).items():
+            _set_path(doc, path, copy.deepcopy(value))
+        if inserted:
+            for path, value in update.get("$setOnInsert", {}).items():
+                _set_path(doc, path, copy.deepcopy(value))
+        for path, value in update.get("$inc", {}).items():
+            current, _ = _get_path(doc, path)
+            _set_path(doc, path, (current or 0) + value)
+        for path, value in update.get("$max", {}).items():
+            current, exists = _get_path(doc, path)
+            if not exists or current is None or value > current:
+                _set_path(doc, path, value)
+        for path, value in update.get("$min", {}).items():
+            current, exists = _get_path(doc, path)
+            if not exists or current is None or value < current:
+                _set_path(doc, path, value)
+        for path, value in update.get("$push", {}).items():
+            current, _ = _get_path(doc, path)
+            items = list(current or [])
+            if isinstance(value, dict) and "$each" in value:
+                items.extend(copy.deepcopy(value["$each"]))
+                if "$slice" in value:
+                    items = items[value["$slice"]:] if value["$slice"] < 0 else items[:value["$slice"]]
+            else:
+                items.append(copy.deepcopy(value))
+            _set_path(doc, path, items)
+        for path in update.get("$unset", {}):
+            parent, _ = _get_path(doc, path.rsplit('.', 1)[0]) if '.' in path else (doc, True)
+            if isinstance(parent, dict):
+                parent.pop(path.rsplit('.', 1)[-1], None)
+
+    def find_one_and_delete(self, query, projection=None, session=None):
+        self._round_trip()
+        found = self._find(query)
+        if not found:
+            return None
+        return copy.deepcopy(self.docs.pop(found[0]["_id"]))
+
+    def update_one(self, query, update, upsert=False):
+        self._round_trip()
+        found = self._find(query)
+        if found:
+            self._apply_update(found[0], update)
+            return _Result(matched_count=1, modified_count=1, upserted_id=None, acknowledged=True)
+        if not upsert:
+            return _Result(matched_count=0, modified_count=0, upserted_id=None, acknowledged=True)
+        doc = {key: value for key, value in query.items() if not isinstance(value, dict)}
+        self._apply_update(doc, update, inserted=True)
+        self.docs[doc["_id"]] = doc
+        return _Result(matched_count=0, modified_count=0, upserted_id=doc["_id"], acknowledged=True)
+
+    def bulk_write(self, requests, ordered=True, session=None):
+        # Tek gidiş-dönüş: tüm UpdateOne istekleri tek işlem sayılır
+        self._round_trip()
+        matched = modified = upserted = deleted = 0
+        for index, request in enumerate(requests):
+            found = self._find(request._filter)
+            if isinstance(request, DeleteOne):
+                if found:
+                    del self.docs[found[0]["_id"]]
+                    deleted += 1
+            elif found:
+                self._apply_update(found[0], request._doc)
+                matched += 1
+                modified += 1
+            elif request._upsert:
+                doc = {key: value for key, value in request._filter.items() if not isinstance(value, dict)}
+                if doc["_id"] in self.docs:  # Filtre eşleşmedi ama _id var: MongoDB gibi duplicate key
+                    raise BulkWriteError({"writeErrors": [{"index": index, "code": 11000, "errmsg": f"E11000 duplicate key: {doc['_id']}"}],
+                                          "writeConcernErrors": [], "nInserted": 0, "nUpserted": upserted, "nMatched": matched,
+                                          "nModified": modified, "nRemoved": deleted, "upserted": []})
+                self._apply_update(doc, request._doc, inserted=True)
+                self.docs[doc["_id"]] = doc
+                upserted += 1
+        return _Result(matched_count=matched, modified_count=modified, upserted_count=upserted,
+                       deleted_count=deleted, acknowledged=True)
+
+    def delete_one(self, query):
+        self._round_trip()
+        found = self._find(query)
+        if found:
+            del self.docs[found[0]["_id"]]
+        return _Result(deleted_count=len(found[:1]), acknowledged=True)
+
+    def delete_many(self, query):
+        self._round_trip()
+        found = self._find(query)
+        for doc in found:
+            del self.docs[doc["_id"]]
+        return _Result(deleted_count=len(found), acknowledged=True)
+
+class FakeBinanceClient:
+    """python-binance Client yerine: futures_ticker verisini KlineStore'dan üretir"""
+
+    def __init__(self, store):
+        self.store = store
+        self.requests = 0
+
+    def futures_ticker(self, symbol=None):
+        self.requests += 1
+        rows = self.store.tail(symbol, '1m', 1440)
+        return {
+            "symbol": symbol,
+            "lastPrice": rows[-1][4],
+            "quoteVolume": str(sum(float(row[7]) for row in rows)),
+        }
+
+async def start_binance_stand_in(store):
+    """/fapi/v1/klines, /fapi/v1/ticker/price ve /fapi/v1/ticker/24hr uç noktalarını KlineStore'dan sunan yerel aiohttp sunucusu"""
+    requests = {"klines": 0, "ticker_price": 0, "ticker_24hr": 0}
+
+    async def klines(request):
+        requests["klines"] += 1
+        query = request.query
+        limit = int(query.get("limit", 500))
+        if "startTime" in query:
+            # Binance gibi: startTime'dan itibaren en fazla `limit` mum
+            start_time = int(query["startTime"])
+            rows = [row for row in store.series(query.get("symbol", ""), query.get("interval", "")) if row[0] >= start_time][:limit]
+        else:
+            rows = store.tail(query.get("symbol", ""), query.get("interval", ""), limit)
+        return web.json_response(rows)
+
+    async def ticker_price(request):
+        # Tüm semboller için son 1m kapanışı (Binance gibi sembol parametresi yoksa hepsi)
+        requests["ticker_price"] += 1
+        symbols = [request.query["symbol"]] if "symbol" in request.query else list(bot.CRYPTO_SETTINGS)
+        rows = [{"symbol": symbol, "price": store.tail(symbol, '1m', 1)[-1][4]} for symbol in symbols]
+        return web.json_response(rows[0] if "symbol" in request.query else rows)
+
+    async def ticker_24hr(request):
+        # Son fiyat ve son 1440 1m mumun quote hacmi (FakeBinanceClient.futures_ticker ile aynı)
+        requests["ticker_24hr"] += 1
+        symbols = [request.query["symbol"]] if "symbol" in request.query else list(bot.CRYPTO_SETTINGS)
+        rows = []
+        for symbol in symbols:
+            tail = store.tail(symbol, '1m', 1440)
+            rows.append({"symbol": symbol, "lastPrice": tail[-1][4], "quoteVolume": str(sum(float(row[7]) for row in tail))})
+        return web.json_response(rows[0] if "symbol" in request.query else rows)
+
+    app = web.Application()
+    app.router.add_get('/fapi/v1/klines', klines)
+    app.router.add_get('/fapi/v1/ticker/price', ticker_price)
+    app.router.add_get('/fapi/v1/ticker/24hr', ticker_24hr)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}", requests
+
+class CycleComplete(BaseException):
+    """signal_processing_loop'un bir turu bittiğinde döngüden çıkmak için (except Exception yakalamaz)"""
+
+class _CycleAsyncio:
+    """Bot modülünün asyncio referansı: uzun beklemeler turu bitirir, kısa beklemeler atlanır"""
+
+    def __getattr__(self, name):
+        return getattr(asyncio, name)
+
+    async def sleep(self, delay, result=None):
+        if delay >= CYCLE_SLEEP_THRESHOLD:
+            raise CycleComplete()
+        await asyncio.sleep(0)
+        return result
+
+@contextlib.contextmanager
+def patched(target, **attributes):
+    originals = {name: getattr(target, name) for name in attributes}
+    for name, value in attributes.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(target, name, value)
+
+class InMemoryDatabase(dict):
+    """mongo_db yerine: koleksiyon adı -> InMemoryCollection"""
+
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+
+    def __missing__(self, name):
+        collection = self[name] = InMemoryCollection(name=name, latency=self.latency)
+        return collection
+
+    @property
+    def operations(self):
+        return sum(collection.operations for collection in self.values())
+
+def _seed_documents():
+    return [{"_id": "bot_stats", "data": {
+        "total_signals": 0, "successful_signals": 0, "failed_signals": 0,
+        "total_profit_loss": 0.0, "active_signals_count": 0, "tracked_coins_count": 0
+    }}, {"_id": "storage_layout", "data": {"version": bot.STORAGE_LAYOUT_VERSION}}]
+
+def storage_patch(database):
+    """Botun tüm koleksiyon global'lerini bellek içi veritabanına bağlayan patched() argümanları"""
+    database["bot_state"] = InMemoryCollection(_seed_documents(), name="bot_state", latency=database.latency)
+    return {
+        "mongo_db": database,
+        "mongo_collection": database[bot.MONGODB_COLLECTION],
+        "positions_collection": database["positions"],
+        "active_signals_collection": database["active_signals"],
+        "stop_cooldowns_collection": database["stop_cooldowns"],
+        "signal_cooldowns_collection": database["signal_cooldowns"],
+        "previous_signals_collection": database["previous_signals"],
+        "bot_state_collection": database["bot_state"],
+        "trades_collection": database["trades"],
+        "storage_layout_ready": True,
+        "mongo_health": dict(bot.mongo_health, healthy=True),
+    }
+
+async def run_scan_cycle(store, base_url, db_latency=0.0):
+    """signal_processing_loop'u stand-in'lerle tam bir tur çalıştırır; istek/işlem sayılarını döndürür"""
+    database = InMemoryDatabase(latency=db_latency)
+    fake_client = FakeBinanceClient(store)
+    connection_checks = {"count": 0}
+
+    def ensure_connection():
+        # Her tur bağlantı kontrolüyle başlar: ikinci çağrı = ikinci tur
+        connection_checks["count"] += 1
+        if connection_checks["count"] > 1:
+            raise CycleComplete()
+        return True
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, patched(
+        bot,
+        **storage_patch(database),
+        client=fake_client,
+        BINANCE_FUTURES_URL=base_url,
+        ALLOWED_USERS=set(),
+        TELEGRAM_CHAT_ID=None,
+        ensure_mongodb_connection=ensure_connection,
+        asyncio=_CycleAsyncio(),
+        # Pozisyon motoru durumu turlar arasında taşınmasın (motor bu ölçümde çalışmaz)
+        global_positions={},
+        global_active_signals={},
+        global_position_events=[],
+        global_stats=dict(bot.DEFAULT_STATS),
+        global_stop_cooldown=bot.CooldownSchedule(),
+        global_signal_cooldown=bot.CooldownSchedule(),
+        global_previous_signals={},
+        previous_signals_initialized=None,
+        position_engine_loaded=True,
+    ):
+        os.chdir(workdir)  # active_signals.json gibi yan dosyalar çalışma dizinini kirletmesin
+        try:
+            # main() ile aynı: istatistik ve cooldown'lar turdan önce bir kez yüklenir (loop'u bloklamayan hali)
+            await bot.reload_repository_async()
+            await bot.signal_processing_loop()
+        except CycleComplete:
+            pass
+        finally:
+            os.chdir(cwd)
+    return {"db_operations": database.operations, "ticker_requests": fake_client.requests}
+
+# ============================================================================
+# ÖLÇÜM
+# ============================================================================
+
+def _quiet(verbose):
+    return contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+def measure(func, repeat=5, number=1, verbose=False):
+    """Senkron aşamayı ölçer: çağrı başına süre (median/min) ve tracemalloc tepe belleği"""
+    timings = []
+    with _quiet(verbose):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            timings.append((time.perf_counter() - start) / number)
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return _summary(timings, peak, number)
+
+async def measure_async(func, repeat=3, verbose=False):
+    """Asenkron aşamayı ölçer; son çağrının dönüş değeri sonuçlara eklenir"""
+    timings = []
+    info = None
+    with _quiet(verbose):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            info = await func()
+            timings.append(time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            await func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    result = _summary(timings, peak, 1)
+    if isinstance(info, dict):
+        result.update(info)
+    return result
+
+def _summary(timings, peak, number):
+    return {
+        "runs": len(timings),
+        "calls_per_run": number,
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+def _report(name, result):
+    print(f"⏱️ {name:<42} median {result['median_s'] * 1000:>10.3f} ms | min {result['min_s'] * 1000:>10.3f} ms | tepe bellek {result['peak_kb']:>10.1f} KB")
+
+# ============================================================================
+# AŞAMALAR
+# ============================================================================
+
+def benchmark_timeframes():
+    return sorted({tf for config in bot.CRYPTO_SETTINGS.values() for tf in config["timeframes"]},
+                  key=lambda tf: INTERVAL_MS[tf])
+
+def bench_full_pine(store, results, bar_sizes, timeframes, verbose):
+    for n_bars in bar_sizes:
+        for tf in timeframes:
+            rows, source = store.series_of_length(tf, n_bars)
+            df = bot.klines_to_dataframe(rows)
+            repeat = 5 if n_bars <= 1_000 else (3 if n_bars <= 10_000 else 1)
+            name = f"full_pine/{tf}/{n_bars}"
+            results[name] = measure(lambda: bot.calculate_full_pine_signals(df.copy(), tf), repeat=repeat, verbose=verbose)
+            results[name]["data"] = source
+            _report(name, results[name])
+
+def bench_batch_pine(store, results, timeframes, n_symbols, n_bars, verbose):
+    for tf in timeframes:
+        frames = {f"SYM{i}USDT": bot.klines_to_dataframe(synthetic_klines(n_bars, tf, seed=i)) for i in range(n_symbols)}
+        name = f"batch_pine/{tf}/{n_symbols}x{n_bars}"
+        results[name] = measure(lambda: bot.calculate_batch_pine_signals(frames, tf), repeat=5, verbose=verbose)
+        _report(name, results[name])
+
+def bench_trigger(store, results, verbose):
+    symbol = next(iter(bot.CRYPTO_SETTINGS))
+    klines = store.tail(symbol, '1m', bot.TRIGGER_KLINE_LIMIT)
+    last_close = float(klines[-1][4])
+    # Seviyeler fiyattan uzak: tetikleme olmaz, tüm mumlar taranır
+    signal = bot.ActiveSignal(symbol=symbol, side=bot.Side.LONG, entry_price=last_close,
+                              target_price=last_close * 10, stop_loss=last_close / 10)
+    name = f"check_klines_for_trigger/{len(klines)}"
+    results[name] = measure(lambda: bot.check_klines_for_trigger(signal, klines), repeat=5, number=200, verbose=verbose)
+    _report(name, results[name])
+
+    # Backtest ölçeği: binlerce mum üzerinde ilk dokunuş taraması
+    rows, _ = store.series_of_length('1m', 10_000)
+    high = np.array([row[2] for row in rows], dtype=float)
+    low = np.array([row[3] for row in rows], dtype=float)
+    name = f"find_first_trigger/{len(rows)}"
+    results[name] = measure(lambda: bot.find_first_trigger(bot.Side.LONG, high, low, high.max() * 10, low.min() / 10), repeat=5, number=200, verbose=verbose)
+    _report(name, results[name])
+
+    # Aynı sembolde çok sayıda pozisyon: seviye indeksinde tek fiyat eşleştirmesi
+    index = bot.TriggerIndex()
+    for key in range(10_000):
+        side = bot.Side.LONG if key % 2 else bot.Side.SHORT
+        spread = 1.05 + (key % 500) / 1000
+        index.add(symbol, key, side, last_close * spread if side is bot.Side.LONG else last_close / spread,
+                  last_close / spread if side is bot.Side.LONG else last_close * spread)
+    name = f"trigger_index/{len(index.positions)}"
+    results[name] = measure(lambda: index.match_price(symbol, last_close), repeat=5, number=2000, verbose=verbose)
+    _report(name, results[name])
+
+    # Pozisyon motoru turu: 1000 açık pozisyonda tarama aralığı + MFE/MAE güncellemesi (tepe bellek = kayıtlar)
+    positions = [
+        bot.Position(symbol=f"SYM{i}USDT", side=bot.Side.LONG if i % 2 else bot.Side.SHORT, open_price=last_close,
+                     target=last_close * (1.1 if i % 2 else 0.9), stop=last_close * (0.95 if i % 2 else 1.05),
+                     entry_timestamp=bot.datetime_to_ms(datetime.now()))
+        for i in range(1000)
+    ]
+    name = f"position_records/{len(positions)}"
+    results[name] = measure(lambda: [bot.ActiveSignal.from_position(position) for position in positions], repeat=3, verbose=verbose)
+    _report(name, results[name])
+
+    now_ms = int(time.time() * 1000)
+    signals = [bot.ActiveSignal.from_position(position) for position in positions]
+    for signal in signals:
+        signal.last_checked_candle = now_ms - now_ms % bot.KLINE_INTERVAL_MS - bot.KLINE_INTERVAL_MS  # Geçmiş mum taraması yok
+    tick = {"price": last_close}
+
+    def position_tick():
+        tick["price"] *= 1.0001  # Her turda yeni uç: MFE/MAE güncellemesi yazma kuyruğuna düşer
+        for signal in signals:
+            bot.plan_position_poll_interval(signal.symbol, signal, tick["price"])
+            bot.update_position_excursion(signal.symbol, signal, tick["price"], tick["price"])
+
+    with patched(bot, active_signal_dirty={}, position_poll_schedule={}):
+        name = f"position_tick/{len(signals)}"
+        results[name] = measure(position_tick, repeat=5, number=20, verbose=verbose)
+    _report(name, results[name])
+
+def bench_format_price(results, verbose):
+    rng = np.random.default_rng(7)
+    refs = [100.123, 2.3456, 0.0123456, 0.00001234, 45000.5, 1.0]
+    pairs = [(float(price), ref) for ref in refs for price in rng.uniform(0.5, 1.5, 500) * ref]
+    pairs += [(price, None) for price, _ in pairs[:1000]]
+
+    def run():
+        for price, ref in pairs:
+            bot.format_price(price, ref)
+
+    name = f"format_price/{len(pairs)}"
+    results[name] = measure(run, repeat=5, verbose=verbose)
+    _report(name, results[name])
+
+def bench_kline_decode(store, results, verbose):
+    for n_bars in (bot.TRIGGER_KLINE_LIMIT, bot.FULL_SIGNAL_LOOKBACK, 10_000):
+        rows, source = store.series_of_length('1h', n_bars)
+        name = f"kline_decode/{n_bars}"
+        results[name] = measure(lambda: bot.klines_to_dataframe(rows), repeat=5, number=10, verbose=verbose)
+        results[name]["data"] = source
+        _report(name, results[name])
+
+async def bench_scan_cycle(store, results, runs, use_pool, verbose):
+    runner, base_url, server_requests = await start_binance_stand_in(store)
+    try:
+        if use_pool:
+            with _quiet(verbose):
+                await bot.start_indicator_pool()
+        name = "scan_cycle" + ("/pool" if use_pool and bot.indicator_pool is not None else "")
+
+        async def cycle():
+            before = dict(server_requests)
+            info = await run_scan_cycle(store, base_url)
+            info["kline_requests"] = server_requests["klines"] - before["klines"]
+            info["ticker_requests"] += server_requests["ticker_24hr"] - before["ticker_24hr"]
+            return info
+
+        results[name] = await measure_async(cycle, repeat=runs, verbose=verbose)
+        results[name]["data"] = store.source
+        _report(name, results[name])
+    finally:
+        if use_pool:
+            with _quiet(verbose):
+                bot.shutdown_indicator_pool()
+        await runner.cleanup()
+
+async def _sample_loop_lag(lags, interval=0.005):
+    """interval uykusunun gecikmesini (ms) lags listesine ekler: loop'u bloklayan her iş burada görünür"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, (loop.time() - started - interval) * 1000))
+
+async def _scan_cycle_loop_lag(store, base_url, runs, latency, verbose):
+    """runs tarama turu boyunca örneklenen event loop gecikmeleri (ms)"""
+    lags = []
+    sampler = asyncio.create_task(_sample_loop_lag(lags))
+    try:
+        with _quiet(verbose):
+            for _ in range(runs):
+                await run_scan_cycle(store, base_url, db_latency=latency)
+    finally:
+        sampler.cancel()
+        await asyncio.gather(sampler, return_exceptions=True)
+    return lags
+
+async def bench_db_latency(store, results, runs, latency, verbose):
+    """Gecikmeli Mongo stand-in'i ile tarama turu: DB çağrıları loop üzerinde (inline) ve DB thread havuzunda"""
+    runner, base_url, _ = await start_binance_stand_in(store)
+    try:
+        for label, workers in (("inline", 0), ("thread_pool", max(bot.DB_THREAD_POOL_WORKERS, 1))):
+            name = f"db_latency/{label}"
+            with patched(bot, DB_THREAD_POOL_WORKERS=workers, db_executor=None):
+                results[name] = await measure_async(lambda: run_scan_cycle(store, base_url, db_latency=latency), repeat=runs, verbose=verbose)
+                # Gecikme ayrı turlarda örneklenir (tracemalloc'lu ölçüm turu loop'u yapay olarak yavaşlatır).
+                # Gecikmesiz DB ile aynı tur referanstır: aradaki fark DB beklemesinin loop'ta geçen kısmıdır,
+                # referansın kendisi loop üzerindeki CPU işidir (kline çözme, inline indikatör hesabı)
+                try:
+                    lags = await _scan_cycle_loop_lag(store, base_url, runs, latency, verbose)
+                    baseline = await _scan_cycle_loop_lag(store, base_url, runs, 0.0, verbose)
+                finally:
+                    bot.shutdown_db_executor()
+            results[name]["db_latency_ms"] = latency * 1000
+            results[name]["loop_lag_total_ms"] = round(sum(lags) / runs, 3)  # Tur başına
+            results[name]["loop_lag_max_ms"] = round(max(lags, default=0.0), 3)
+            results[name]["loop_lag_cpu_ms"] = round(sum(baseline) / runs, 3)  # Gecikmesiz DB ile tur başına
+            results[name]["loop_lag_db_ms"] = round(max(0.0, results[name]["loop_lag_total_ms"] - results[name]["loop_lag_cpu_ms"]), 3)
+            results[name]["data"] = store.source
+            _report(name, results[name])
+            print(f"   ↳ event loop gecikmesi: tur başına toplam {results[name]['loop_lag_total_ms']:.1f} ms, "
+                  f"en büyük {results[name]['loop_lag_max_ms']:.1f} ms (DB gecikmesi {latency * 1000:.0f} ms)")
+            print(f"   ↳ DB beklemesinden gelen: {results[name]['loop_lag_db_ms']:.1f} ms "
+                  f"(gecikmesiz DB ile de olan CPU kaynaklı: {results[name]['loop_lag_cpu_ms']:.1f} ms)")
+    finally:
+        await runner.cleanup()
+
+async def bench_position_close(results, runs, latency, verbose):
+    """
+    Gecikmeli Mongo stand-in'i ile pozisyon kapanışı: find_one_and_delete sahiplenmesi + istatistik/aktif
+    sinyal/cooldown yazımları; yazımlar loop üzerinde sıralı (inline) ve DB thread havuzunda eşzamanlı.
+    Aynı pozisyonun ikinci kapanışının istatistiklere yansımadığı da kontrol edilir.
+    """
+    position = bot.Position(symbol="SOLUSDT", side=bot.Side.LONG, open_price=100.0, target=110.0, stop=95.0)
+
+    async def notify(message):
+        return None
+
+    for label, workers in (("inline", 0), ("thread_pool", max(bot.DB_THREAD_POOL_WORKERS, 1))):
+        name = f"position_close/{label}"
+        database = InMemoryDatabase(latency=latency)
+
+        async def close_once():
+            database["positions"].docs[position.symbol] = {"_id": position.symbol, "symbol": position.symbol, "data": position.to_doc()}
+            await bot.close_position(position.symbol, "take_profit", position.target, position)
+
+        with patched(bot, **storage_patch(database), DB_THREAD_POOL_WORKERS=workers, db_executor=None,
+                     global_stats=dict(bot.DEFAULT_STATS), global_stop_cooldown=bot.CooldownSchedule(), global_signal_cooldown=bot.CooldownSchedule(), global_positions={}, global_active_signals={},
+                     send_signal_to_all_users=notify, send_admin_message=notify):
+            try:
+                results[name] = await measure_async(close_once, repeat=runs, verbose=verbose)
+                before = database.operations
+                with _quiet(verbose):
+                    await close_once()
+                results[name]["db_round_trips"] = database.operations - before
+                closes = database["bot_state"].docs["bot_stats"]["data"]["successful_signals"]
+                with _quiet(verbose):
+                    await bot.close_position(position.symbol, "take_profit", position.target, position)  # Doküman yok: ikinci kapanış
+                results[name]["double_close_blocked"] = database["bot_state"].docs["bot_stats"]["data"]["successful_signals"] == closes
+            finally:
+                bot.shutdown_db_executor()
+        results[name]["db_latency_ms"] = latency * 1000
+        if latency:
+            results[name]["sequential_round_trips"] = round(results[name]["median_s"] / latency)  # Beklenen ardışık gidiş-dönüş
+        _report(name, results[name])
+        print(f"   ↳ kapanış başına {results[name]['db_round_trips']} DB işlemi"
+              + (f" ({results[name]['sequential_round_trips']} ardışık gidiş-dönüş süresi)" if latency else "")
+              + f", ikinci kapanış engellendi: {results[name]['double_close_blocked']}")
+
+async def bench_state_restore(results, runs, latency, verbose, n_positions=200):
+    """
+    Açılışta durum yükleme: gecikmeli Mongo stand-in'inden yükleme (bozuk kayıt temizliği + pozisyon motoru +
+    repository) ile yerel anlık görüntüden yükleme (DB uzlaştırması arka planda) karşılaştırılır.
+    """
+    database = InMemoryDatabase(latency=latency)
+    state = dict(storage_patch(database), DB_THREAD_POOL_WORKERS=0, db_executor=None, position_poll_schedule={},
+                 global_positions={}, global_active_signals={}, global_position_events=[], active_signal_dirty={},
+                 global_stats=dict(bot.DEFAULT_STATS), global_stop_cooldown=bot.CooldownSchedule(), global_signal_cooldown=bot.CooldownSchedule(),
+                 global_previous_signals={}, previous_signals_initialized=None, snapshot_reconcile_pending={"repository": False, "positions": False})
+    with tempfile.TemporaryDirectory() as directory, patched(bot, **state, RUNTIME_SNAPSHOT_PATH=os.path.join(directory, "runtime_snapshot.json")):
+        with _quiet(verbose):
+            positions = {}
+            for i in range(n_positions):
+                price = 1.0 + i
+                positions[f"SYM{i}USDT"] = bot.Position(symbol=f"SYM{i}USDT", side=bot.Side.LONG, open_price=price, target=price * 1.1, stop=price * 0.95,
+                                                        entry_timestamp=bot.datetime_to_ms(datetime.now().replace(microsecond=0)))
+            bot.save_positions_to_db(positions)
+            bot.reload_position_engine_state()
+            bot.reload_repository()
+            bot.save_runtime_snapshot()
+
+        async def from_database():
+            bot.cleanup_corrupted_positions()
+            bot.reload_position_engine_state()
+            bot.reload_repository()
+
+        async def from_snapshot():
+            bot.apply_runtime_snapshot(bot.load_runtime_snapshot())
+
+        for name, func in (("state_restore/database", from_database), ("state_restore/snapshot", from_snapshot)):
+            before = database.operations
+            results[name] = await measure_async(func, repeat=runs, verbose=verbose)
+            results[name]["db_round_trips"] = (database.operations - before) // (runs + 1)
+            results[name]["positions"] = len(bot.global_positions)
+            results[name]["db_latency_ms"] = latency * 1000
+            _report(name, results[name])
+            print(f"   ↳ {results[name]['positions']} pozisyon, açılış başına {results[name]['db_round_trips']} DB gidiş-dönüşü")
+
+# ============================================================================
+# RAPOR / KARŞILAŞTIRMA
+# ============================================================================
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def compare_with_baseline(results, baseline_path, threshold):
+    """Sonuçları önceki JSON ile karşılaştırır; eşikten yavaş aşamaların sayısını döndürür"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\n📊 Karşılaştırma: {baseline_path} (commit {baseline.get('commit')})")
+    regressions = 0
+    for name, result in results.items():
+        old = baseline.get("stages", {}).get(name)
+        if not old:
+            print(f"   🆕 {name}: önceki ölçüm yok")
+            continue
+        ratio = result["median_s"] / old["median_s"] if old["median_s"] > 0 else float('inf')
+        mem_ratio = result["peak_kb"] / old["peak_kb"] if old["peak_kb"] > 0 else float('inf')
+        if ratio > threshold:
+            regressions += 1
+            icon = "🔴"
+        elif ratio < 1 / threshold:
+            icon = "🟢"
+        else:
+            icon = "⚪"
+        print(f"   {icon} {name}: süre x{ratio:.2f}, bellek x{mem_ratio:.2f}")
+    return regressions
+
+async def run(args):
+    store = KlineStore.from_file(args.recorded) if args.recorded else KlineStore()
+    bar_sizes = [n for n in args.bars if not (args.quick and n > 10_000)]
+    timeframes = args.timeframes or benchmark_timeframes()
+    results = {}
+
+    print(f"🚀 Benchmark başlatıldı (veri: {store.source}, timeframe'ler: {', '.join(timeframes)})")
+    stages = set(args.stages)
+    if "full_pine" in stages:
+        bench_full_pine(store, results, bar_sizes, timeframes, args.verbose)
+    if "batch_pine" in stages:
+        bench_batch_pine(store, results, timeframes, args.batch_symbols, bot.FULL_SIGNAL_LOOKBACK, args.verbose)
+    if "trigger" in stages:
+        bench_trigger(store, results, args.verbose)
+    if "format_price" in stages:
+        bench_format_price(results, args.verbose)
+    if "kline_decode" in stages:
+        bench_kline_decode(store, results, args.verbose)
+    if "scan_cycle" in stages:
+        await bench_scan_cycle(store, results, args.cycle_runs, args.pool, args.verbose)
+    if "db_latency" in stages:
+        await bench_db_latency(store, results, args.cycle_runs, args.db_latency_ms / 1000, args.verbose)
+    if "position_close" in stages:
+        await bench_position_close(results, args.cycle_runs, args.db_latency_ms / 1000, args.verbose)
+    if "state_restore" in stages:
+        await bench_state_restore(results, args.cycle_runs, args.db_latency_ms / 1000, args.verbose)
+
+    report = {
+        "version": 1,
+        "created_at": str(datetime.now()),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "data": args.recorded or "synthetic",
+        "stages": results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 Sonuçlar kaydedildi: {args.output}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.threshold)
+        if regressions:
+            print(f"⚠️ {regressions} aşama eşiğin (x{args.threshold}) üzerinde yavaşladı")
+            return 1
+    return 0
+
+ALL_STAGES = ["full_pine", "batch_pine", "trigger", "format_price", "kline_decode", "scan_cycle", "db_latency", "position_close", "state_restore"]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sinyal motoru ve tarama döngüsü benchmark paketi")
+    parser.add_argument("--stages", nargs="+", choices=ALL_STAGES, default=ALL_STAGES, help="Çalıştırılacak aşamalar")
+    parser.add_argument("--bars", nargs="+", type=int, default=DEFAULT_BAR_SIZES, help="full_pine mum sayıları")
+    parser.add_argument("--timeframes", nargs="+", help="Varsayılan: CRYPTO_SETTINGS'deki timeframe'ler")
+    parser.add_argument("--quick", action="store_true", help="10k üzerindeki mum sayılarını atla")
+    parser.add_argument("--batch-symbols", type=int, default=20, help="batch_pine sembol sayısı")
+    parser.add_argument("--cycle-runs", type=int, default=3, help="scan_cycle tekrar sayısı")
+    parser.add_argument("--pool", action="store_true", help="scan_cycle'ı indikatör process havuzu ile çalıştır")
+    parser.add_argument("--db-latency-ms", type=float, default=50.0, help="db_latency, position_close ve state_restore aşamalarında Mongo gidiş-dönüş gecikmesi")
+    parser.add_argument("--recorded", help="--record ile kaydedilmiş kline JSON dosyası")
+    parser.add_argument("--record", help="Binance'den gerçek kline verisini bu dosyaya kaydet ve çık")
+    parser.add_argument("--output", default="benchmark_results.json", help="Sonuç JSON dosyası")
+    parser.add_argument("--baseline", help="Karşılaştırılacak önceki sonuç JSON dosyası")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Yavaşlama eşiği (median oranı)")
+    parser.add_argument("--verbose", action="store_true", help="Bot çıktılarını gizleme")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.record:
+        asyncio.run(record_klines(args.record))
+        return 0
+    return asyncio.run(run(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
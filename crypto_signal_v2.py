@@ -4,8 +4,11 @@ import asyncio
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 import pandas as pd
+import numpy as np
 import ta
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from dataclasses import dataclass, field
+from enum import Enum
 import telegram
 from telegram.ext import Application, CommandHandler, MessageHandler, filters
 import json
@@ -13,11 +16,23 @@ import aiohttp
 from aiohttp import web
 from dotenv import load_dotenv
 import os
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from pymongo import MongoClient, UpdateOne, DeleteOne
+from pymongo.errors import ConnectionFailure, BulkWriteError
+from bson import json_util
 from decimal import Decimal, ROUND_DOWN, getcontext
 from binance.client import Client
 import re
+import math
+import bisect
+import heapq
+import time
+import functools
+import threading
+from collections import deque
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 load_dotenv()
 
@@ -54,16 +69,99 @@ TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
 MONGODB_DB = os.getenv("MONGODB_DB", "crypto_signal_bot")
-MONGODB_COLLECTION = os.getenv("MONGODB_COLLECTION", "allowed_users")
+MONGODB_COLLECTION = os.getenv("MONGODB_COLLECTION", "allowed_users")  # Eski tek koleksiyon düzeni (taşıma kaynağı)
+STORAGE_LAYOUT_VERSION = 2  # 2: varlık başına koleksiyon (_id = sembol veya sabit anahtar)
 
 BOT_OWNER_ID = int(os.getenv("BOT_OWNER_ID", "0"))
 ADMIN_USERS = set()
 
+# Sinyal hesaplama geçmişi (lookback) planlama ayarları
+FULL_SIGNAL_LOOKBACK = 1000  # Referans mum sayısı
+LOOKBACK_TOLERANCE = float(os.getenv("LOOKBACK_TOLERANCE", "0.01"))  # EMA yakınsama toleransı
+LOOKBACK_EVENT_WINDOW = int(os.getenv("LOOKBACK_EVENT_WINDOW", "100"))  # Isınma sonrası sinyal arama penceresi
+LOOKBACK_VERIFY = os.getenv("LOOKBACK_VERIFY", "false").lower() in ("1", "true", "yes")  # Planlanan ve tam sonucu karşılaştır
+TRIGGER_KLINE_LIMIT = 100  # Giriş zamanı bilinmeyen pozisyonlar için taranacak 1m mum sayısı
+TRIGGER_KLINE_PAGE_LIMIT = 1000  # Watermark'tan sonraki mumlar için istek başına en fazla 1m mum
+KLINE_INTERVAL_MS = 60 * 1000  # 1m mum süresi
+TRIGGER_MIN_DIFF = 0.001  # TP/SL seviyesi en az %0.1 geçilmeli (yanlış tetiklemeyi önler)
+POSITION_ENGINE_INTERVAL_SECONDS = 3  # Pozisyon motoru tur aralığı
+POSITION_ENGINE_IDLE_SECONDS = 5  # Açık pozisyon yokken bekleme
+POSITION_POLL_MIN_SECONDS = float(os.getenv("POSITION_POLL_MIN_SECONDS", "3"))  # Tetiğe çok yakın pozisyonların mum tarama aralığı
+POSITION_POLL_MAX_SECONDS = float(os.getenv("POSITION_POLL_MAX_SECONDS", "120"))  # Uzak pozisyonların en seyrek mum tarama aralığı
+POSITION_POLL_BUDGET_PER_MINUTE = float(os.getenv("POSITION_POLL_BUDGET_PER_MINUTE", "60"))  # Dakikada en fazla mum isteği
+POSITION_ATR_PERIOD = 14  # 1m ATR (Wilder) periyodu
+POSITION_DEFAULT_ATR_PCT = 0.002  # ATR henüz bilinmiyorsa fiyatın %0.2'si
+POSITION_CATCHUP_BUDGET_SHARE = 0.25  # Geride kalan (kesinti/yeniden başlatma) watermark'ların yakalanmasına ayrılan bütçe payı
+ACTIVE_SIGNAL_FLUSH_SECONDS = float(os.getenv("ACTIVE_SIGNAL_FLUSH_SECONDS", "15"))  # Aktif sinyal değişikliklerinin DB'ye yazılma aralığı
+BINANCE_FUTURES_URL = os.getenv("BINANCE_FUTURES_URL", "https://fapi.binance.com")  # Yerel test/benchmark için değiştirilebilir
+AGGTRADE_STREAM_ENABLED = os.getenv("AGGTRADE_STREAM_ENABLED", "false").lower() == "true"  # Açık pozisyonlar için aggTrade WebSocket'i
+BINANCE_FUTURES_WS_URL = os.getenv("BINANCE_FUTURES_WS_URL", "wss://fstream.binance.com")
+AGGTRADE_BUFFER_SIZE = int(os.getenv("AGGTRADE_BUFFER_SIZE", "2000"))  # Sembol başına bellekte tutulan son işlem sayısı
+EXCURSION_HISTORY_LIMIT = 500  # /stats MAE/MFE dağılımı için bot_stats'ta tutulan son kapanış sayısı
+AGGTRADE_GAP_FILL_LIMIT = 1000  # Yeniden bağlanmada REST ile doldurulacak en fazla işlem (tek sayfa)
+TRADE_STATS_CACHE_SECONDS = float(os.getenv("TRADE_STATS_CACHE_SECONDS", "60"))  # /stats aggregation sonucunun bellekte tutulma süresi
+TRADE_STATS_TOP_SYMBOLS = 5  # /stats sembol kırılımında gösterilen sembol sayısı
+TRADE_STATS_PERIODS = 7  # /stats dönem kırılımında gösterilen gün sayısı
+
+# İndikatör hesaplamalarını event loop dışına taşıyan process havuzu ayarları
+INDICATOR_POOL_WORKERS = int(os.getenv("INDICATOR_POOL_WORKERS", "2"))  # 0: havuz kapalı, her şey inline
+INDICATOR_POOL_START_METHOD = os.getenv("INDICATOR_POOL_START_METHOD", "spawn")
+INDICATOR_INLINE_MAX_CELLS = int(os.getenv("INDICATOR_INLINE_MAX_CELLS", "1000"))  # n_symbols * n_bars eşiği
+
+# Senkron pymongo çağrılarını event loop dışına taşıyan thread havuzu ve loop gecikmesi ölçümü
+DB_THREAD_POOL_WORKERS = int(os.getenv("DB_THREAD_POOL_WORKERS", "4"))  # 0: DB çağrıları event loop üzerinde
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.5"))  # Gecikme ölçüm aralığı
+LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "250"))  # Bu gecikmenin üstü loglanır
+LOOP_LAG_WINDOW = 600  # /stats yüzdelikleri için tutulan son ölçüm sayısı
+
+# MongoDB sağlık izleme: sıcak yol ping atmaz, heartbeat task'ının önbellekteki durumunu okur
+MONGODB_HEARTBEAT_SECONDS = float(os.getenv("MONGODB_HEARTBEAT_SECONDS", "10"))  # Ping aralığı
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "3000"))  # Erişilemeyen sunucuda bir işlemin en uzun bekleme süresi
+MONGODB_WRITE_BUFFER_LIMIT = int(os.getenv("MONGODB_WRITE_BUFFER_LIMIT", "10000"))  # Tampon bu sayıyı aşınca uyarı verilir (kayıt atılmaz)
+MONGODB_TRANSACTIONS_ENABLED = os.getenv("MONGODB_TRANSACTIONS_ENABLED", "false").lower() == "true"  # Replica set'te pozisyon kapanışı tek transaction'da
+MONGODB_JOURNAL_PATH = os.getenv("MONGODB_JOURNAL_PATH", "mongo_journal.jsonl")  # Tampondaki yazımların yerel kopyası (boş: yalnızca bellekte)
+MONGODB_JOURNAL_FSYNC_MS = float(os.getenv("MONGODB_JOURNAL_FSYNC_MS", "200"))  # Journal eklemeleri en fazla bu aralıkla toplu fsync'lenir
+
+# Hızlı yeniden başlatma: bellekteki durumun yerel anlık görüntüsü
+RUNTIME_SNAPSHOT_PATH = os.getenv("RUNTIME_SNAPSHOT_PATH", "runtime_snapshot.json")  # Boş: anlık görüntü kapalı (açılışta DB'den yüklenir)
+RUNTIME_SNAPSHOT_SECONDS = float(os.getenv("RUNTIME_SNAPSHOT_SECONDS", "60"))  # Periyodik yazım aralığı (pozisyon açılış/kapanışında ayrıca yazılır)
+RUNTIME_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("RUNTIME_SNAPSHOT_MAX_AGE_SECONDS", "3600"))  # Bundan eski anlık görüntü kullanılmaz
+RUNTIME_SNAPSHOT_VERSION = 1  # Biçim değişince artırılır; farklı sürümdeki dosya yok sayılır
+
 mongo_client = None
 mongo_db = None
-mongo_collection = None
-
-client = Client()
+mongo_collection = None  # Eski düzen: tüm varlıklar tek koleksiyonda "_id" önekleriyle; yalnızca taşıma için okunur
+positions_collection = None  # _id: sembol
+active_signals_collection = None  # _id: sembol, status indeksi
+stop_cooldowns_collection = None  # _id: sembol, until indeksi
+signal_cooldowns_collection = None  # _id: sembol, until indeksi
+previous_signals_collection = None  # _id: sembol
+bot_state_collection = None  # _id: "bot_stats", "cooldown", "allowed_users", "admin_users", "previous_signals_initialized", "storage_layout", "trade_history"
+trades_collection = None  # Kapanan pozisyonlar (yalnızca ekleme), (symbol, closed_at) ve closed_at indeksli
+storage_layout_ready = False  # İndeksler ve taşıma bu süreçte bir kez
+mongo_health = {"healthy": False, "checked_at": None, "last_ok": None, "last_error": None, "failures": 0}  # Son heartbeat sonucu
+mongo_write_buffer = deque()  # Bağlantı yokken bekletilen yazımlar: {"seq", "collection", "label", "spec"}; sınırsız, aktarılmayan kayıt atılmaz
+mongo_write_buffer_lock = threading.RLock()  # Tampon ve journal'ın tek kilidi: ekleme, aktarım (checkpoint dahil), sync ve kapatma
+mongo_write_buffer_warned = False  # MONGODB_WRITE_BUFFER_LIMIT aşımı bildirildi mi (tampon boşalınca sıfırlanır)
+mongo_journal = None  # WriteJournal (open_write_journal ile açılır); None ise tampon yalnızca bellekte
+mongo_journal_last_seq = 0  # Son verilen kayıt sırası (time.time_ns tabanlı; yeniden başlatmada da artar)
+mongo_supports_transactions = False  # Sunucu replica set üyesi veya mongos (hello yanıtından)
+
+indicator_pool = None
+db_executor = None  # DB thread havuzu (ilk run_db çağrısında oluşturulur)
+loop_lag_samples = deque(maxlen=LOOP_LAG_WINDOW)  # Son gecikme ölçümleri (ms)
+loop_lag_stats = {"samples": 0, "max_ms": 0.0, "over_threshold": 0}
+
+# Client() kurulurken Binance'e ping atar: import'ta ağ çağrısı olmasın diye ilk kullanımda kurulur
+# (indikatör havuzunun spawn worker'ları bu modülü yeniden import eder)
+client = None
+
+def get_binance_client():
+    """Süreçteki tek python-binance istemcisi (ilk çağrıda kurulur)"""
+    global client
+    if client is None:
+        client = Client()
+    return client
 
 def validate_user_command(update, require_admin=False, require_owner=False):
     """Kullanıcı komut yetkisini kontrol eder"""
@@ -162,28 +260,23 @@ async def api_request_with_retry(session, url, ssl=False, max_retries=None):
     raise Exception(f"API isteği {max_retries} denemeden sonra başarısız")
 
 def save_data_to_db(doc_id, data, collection_name="data"):
-    """Genel veri kaydetme fonksiyonu (upsert)."""
-    global mongo_collection
-    if mongo_collection is None:
+    """Genel veri kaydetme fonksiyonu (upsert, bot_state koleksiyonu); bağlantı yoksa yazım yerel tampona alınır."""
+    if mongo_db is None:
         return False
     try:
-        mongo_collection.update_one(
-            {"_id": doc_id},
-            {"$set": {"data": data, "updated_at": str(datetime.now())}},
-            upsert=True
-        )
-        return True
+        unit_of_work = MongoUnitOfWork(f"{collection_name} DB kaydı")
+        unit_of_work.update(bot_state_collection, doc_id, {"$set": {"data": data, "updated_at": str(datetime.now())}}, upsert=True)
+        return unit_of_work.commit()
     except Exception as e:
         print(f"❌ {collection_name} DB kaydı hatası: {e}")
         return False
 
 def load_data_from_db(doc_id, default_value=None):
-    """Genel veri okuma fonksiyonu."""
-    global mongo_collection
-    if mongo_collection is None:
+    """Genel veri okuma fonksiyonu (bot_state koleksiyonu)."""
+    if mongo_db is None:
         return default_value
     try:
-        doc = mongo_collection.find_one({"_id": doc_id})
+        doc = bot_state_collection.find_one({"_id": doc_id})
         if doc:
             # Eğer "data" alanı varsa onu döndür, yoksa tüm dokümanı döndür (geriye uyumluluk için)
             if "data" in doc:
@@ -195,78 +288,369 @@ def load_data_from_db(doc_id, default_value=None):
         print(f"❌ {doc_id} DB okuma hatası: {e}")
     return default_value
 
+# ============================================================================
+# POZİSYON KAYITLARI: motor durumu tipli (float fiyatlar, Side yönü); metin yalnızca mesajlarda
+# ============================================================================
+
+class Side(Enum):
+    """Pozisyon yönü; değer mesajlarda ve DB'de kullanılan etikettir"""
+    LONG = "ALIŞ"
+    SHORT = "SATIŞ"
+
+    @classmethod
+    def parse(cls, value):
+        """ALIŞ/ALIS/SATIŞ/SATIS etiketini (veya Side) Side'a çevirir; tanınmayan değerde ValueError"""
+        if isinstance(value, cls):
+            return value
+        try:
+            return SIDE_ALIASES[str(value).strip()]
+        except KeyError:
+            raise ValueError(f"Bilinmeyen pozisyon yönü: {value!r}") from None
+
+    def change_percent(self, entry_price, price):
+        """Giriş fiyatından price'a lehte değişim (%): ALIŞ'ta yükseliş, SATIŞ'ta düşüş kârdır"""
+        if self is Side.LONG:
+            return (price - entry_price) / entry_price * 100
+        return (entry_price - price) / entry_price * 100
+
+SIDE_ALIASES = {"ALIŞ": Side.LONG, "ALIS": Side.LONG, "SATIŞ": Side.SHORT, "SATIS": Side.SHORT}
+POSITION_REQUIRED_FIELDS = ('type', 'target', 'stop', 'open_price', 'leverage')
+
+def parse_price(value):
+    """DB'deki fiyat alanını float'a çevirir (eski kayıtlardaki "$1,234.5" gibi format_price metinleri dahil)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(str(value).replace('$', '').replace(',', ''))
+
+def datetime_to_ms(value):
+    """Yerel datetime'ı epoch ms'ye çevirir (ms altı kesilir; ms_to_datetime ile gidiş-dönüş kayıpsız)"""
+    return int(value.timestamp()) * 1000 + value.microsecond // 1000
+
+def ms_to_datetime(timestamp_ms):
+    """Epoch ms'yi yerel datetime'a çevirir (DB'deki tarih alanları ve gösterim için); None ise None"""
+    if timestamp_ms is None:
+        return None
+    return datetime.fromtimestamp(timestamp_ms // 1000).replace(microsecond=timestamp_ms % 1000 * 1000)
+
+@dataclass(slots=True)
+class Position:
+    """Açık pozisyon (positions dokümanının "data" alanı)"""
+    symbol: str
+    side: Side
+    open_price: float
+    target: float
+    stop: float
+    leverage: int = 10
+    signals: dict = field(default_factory=dict)
+    entry_time: str = ""
+    entry_timestamp: int | None = None  # Giriş zamanı (epoch ms)
+
+    @classmethod
+    def from_doc(cls, symbol, data):
+        """DB verisinden pozisyon; eksik alan, bilinmeyen yön veya pozitif olmayan fiyatta ValueError"""
+        missing = [key for key in POSITION_REQUIRED_FIELDS if key not in data]
+        if missing:
+            raise ValueError(f"Eksik alanlar: {missing}")
+        position = cls(
+            symbol=symbol,
+            side=Side.parse(data['type']),
+            open_price=parse_price(data['open_price']),
+            target=parse_price(data['target']),
+            stop=parse_price(data['stop']),
+            leverage=int(data['leverage']),
+            signals=data.get('signals') or {},
+            entry_time=str(data.get('entry_time') or ""),
+            entry_timestamp=get_entry_timestamp_ms(data),
+        )
+        if position.open_price <= 0 or position.target <= 0 or position.stop <= 0:
+            raise ValueError(f"Geçersiz fiyat değerleri (Giriş: {position.open_price}, Hedef: {position.target}, Stop: {position.stop})")
+        return position
+
+    def to_doc(self):
+        """positions dokümanının "data" alanı"""
+        return {
+            "type": self.side.value,
+            "target": self.target,
+            "stop": self.stop,
+            "open_price": self.open_price,
+            "leverage": self.leverage,
+            "signals": self.signals,
+            "entry_time": self.entry_time,
+            "entry_timestamp": ms_to_datetime(self.entry_timestamp),  # DB'de tarih olarak
+        }
+
+@dataclass(slots=True)
+class ActiveSignal:
+    """Pozisyon motorunun izlediği aktif sinyal (active_signals dokümanı)"""
+    symbol: str
+    side: Side
+    entry_price: float
+    target_price: float
+    stop_loss: float
+    leverage: int = 10
+    signals: dict = field(default_factory=dict)
+    signal_time: str = ""
+    entry_timestamp: int | None = None  # Giriş zamanı (epoch ms)
+    current_price: float = 0.0
+    last_update: str = ""
+    max_price: float = 0.0
+    min_price: float = 0.0
+    mfe_percent: float = 0.0  # En büyük lehte hareket (%)
+    mae_percent: float = 0.0  # En büyük aleyhte hareket (%)
+    status: str = "active"
+    last_checked_candle: int = 0  # Son değerlendirilen kapanmış 1m mum (ms, watermark)
+
+    @classmethod
+    def from_position(cls, position):
+        """Yeni pozisyonun aktif sinyali; güncel/max/min fiyat giriş fiyatından başlar"""
+        return cls(
+            symbol=position.symbol,
+            side=position.side,
+            entry_price=position.open_price,
+            target_price=position.target,
+            stop_loss=position.stop,
+            leverage=position.leverage,
+            signals=position.signals,
+            signal_time=position.entry_time or datetime.now().strftime('%Y-%m-%d %H:%M'),
+            entry_timestamp=get_entry_timestamp_ms({"entry_timestamp": position.entry_timestamp, "entry_time": position.entry_time}),
+            current_price=position.open_price,
+            last_update=str(datetime.now()),
+            max_price=position.open_price,
+            min_price=position.open_price,
+        )
+
+    @classmethod
+    def from_doc(cls, doc):
+        """DB dokümanından; eski kayıtların metin fiyatları (ve *_float kopyaları) yalnızca burada çevrilir"""
+        def price(key, default=0.0):
+            value = doc.get(key)
+            if isinstance(value, (int, float)):
+                return float(value)
+            if doc.get(f"{key}_float"):
+                return float(doc[f"{key}_float"])
+            return parse_price(value) if value not in (None, "") else default
+
+        entry_price = price("entry_price")
+        return cls(
+            symbol=doc["symbol"],
+            side=Side.parse(doc.get("type", "ALIŞ")),
+            entry_price=entry_price,
+            target_price=price("target_price"),
+            stop_loss=price("stop_loss"),
+            leverage=int(doc.get("leverage", 10)),
+            signals=doc.get("signals") or {},
+            signal_time=str(doc.get("signal_time") or ""),
+            entry_timestamp=get_entry_timestamp_ms(doc),
+            current_price=price("current_price", entry_price),
+            last_update=str(doc.get("last_update") or ""),
+            max_price=float(doc.get("max_price") or entry_price),
+            min_price=float(doc.get("min_price") or entry_price),
+            mfe_percent=float(doc.get("mfe_percent") or 0.0),
+            mae_percent=float(doc.get("mae_percent") or 0.0),
+            status=doc.get("status", "active"),
+            last_checked_candle=int(doc.get("last_checked_candle") or 0),
+        )
+
+    def to_doc(self):
+        """active_signals dokümanının alanları (_id hariç; watermark ayrıca $max ile yazılır)"""
+        return {
+            "symbol": self.symbol,
+            "type": self.side.value,
+            "entry_price": self.entry_price,
+            "target_price": self.target_price,
+            "stop_loss": self.stop_loss,
+            "signals": self.signals,
+            "leverage": self.leverage,
+            "signal_time": self.signal_time,
+            "current_price": self.current_price,
+            "last_update": self.last_update,
+            "max_price": self.max_price,
+            "min_price": self.min_price,
+            "mfe_percent": self.mfe_percent,
+            "mae_percent": self.mae_percent,
+            "status": self.status,
+            "entry_timestamp": self.entry_timestamp,
+        }
+
+def find_first_trigger(side, high, low, target_price, stop_loss_price, min_trigger_diff=None):
+    """
+    high/low dizilerinde TP veya SL seviyesini ilk geçen mumu bulur (vektörel, backtest'te de kullanılabilir).
+    Dönüş: (mum indeksi, "take_profit"/"stop_loss", tetikleyen mumun high/low değeri) veya (None, None, None)
+
+    Aynı mum hem TP'yi hem SL'yi geçerse mum içi sıra bilinemez; kural olarak TP önceliklidir
+    (kar alma öncelikli). Seviye, en az min_trigger_diff oranında geçilmiş olmalıdır.
+    """
+    if min_trigger_diff is None:
+        min_trigger_diff = TRIGGER_MIN_DIFF
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+
+    if side is Side.LONG:
+        tp_hits = (high >= target_price) & ((high - target_price) >= (target_price * min_trigger_diff))
+        sl_hits = (low <= stop_loss_price) & ((stop_loss_price - low) >= (stop_loss_price * min_trigger_diff))
+        tp_prices, sl_prices = high, low
+    else:
+        tp_hits = (low <= target_price) & ((target_price - low) >= (target_price * min_trigger_diff))
+        sl_hits = (high >= stop_loss_price) & ((high - stop_loss_price) >= (stop_loss_price * min_trigger_diff))
+        tp_prices, sl_prices = low, high
+
+    hits = tp_hits | sl_hits
+    if not hits.any():
+        return None, None, None
+    index = int(np.argmax(hits))
+    if tp_hits[index]:
+        return index, "take_profit", float(tp_prices[index])
+    return index, "stop_loss", float(sl_prices[index])
+
+class TriggerIndex:
+    """
+    Sembol başına sıralı TP/SL seviye defterleri. "up" defteri fiyat yükselince tetiklenen
+    eşikleri (ALIŞ TP, SATIŞ SL), "down" defteri fiyat düşünce tetiklenenleri (ALIŞ SL, SATIŞ TP)
+    tutar. Eşikler min_trigger_diff bandını içerir (seviye ± seviye * min_trigger_diff).
+    Bir fiyat veya mum high/low değeri, pozisyon sayısından bağımsız olarak bisect ile
+    O(log n + tetiklenen) sürede eşleştirilir; ekleme/çıkarma nadir olduğu için liste üzerinde yapılır.
+    Tetikleme olayları: {"symbol", "key", "trigger_type", "level", "price"} sözlükleri.
+    """
+
+    def __init__(self, min_trigger_diff=None):
+        self.min_trigger_diff = TRIGGER_MIN_DIFF if min_trigger_diff is None else min_trigger_diff
+        self.books = {}  # {symbol: {"up": (eşikler, kayıtlar), "down": (eşikler, kayıtlar)}}
+        self.positions = {}  # {(symbol, key): (side, target_price, stop_loss_price)}
+
+    def add(self, symbol, key, side, target_price, stop_loss_price):
+        """Bir pozisyonun TP/SL seviyelerini ekler (aynı key varsa önce çıkarılır)"""
+        self.remove(symbol, key)
+        band = self.min_trigger_diff
+        if side is Side.LONG:
+            levels = [("up", target_price + target_price * band, "take_profit", target_price),
+                      ("down", stop_loss_price - stop_loss_price * band, "stop_loss", stop_loss_price)]
+        else:
+            levels = [("down", target_price - target_price * band, "take_profit", target_price),
+                      ("up", stop_loss_price + stop_loss_price * band, "stop_loss", stop_loss_price)]
+
+        book = self.books.setdefault(symbol, {"up": ([], []), "down": ([], [])})
+        for direction, threshold, trigger_type, level in levels:
+            thresholds, entries = book[direction]
+            position = bisect.bisect_right(thresholds, threshold)
+            thresholds.insert(position, threshold)
+            entries.insert(position, (key, trigger_type, level))
+        self.positions[(symbol, key)] = (side, target_price, stop_loss_price)
+        return True
+
+    def remove(self, symbol, key):
+        """Bir pozisyonun seviyelerini çıkarır"""
+        if self.positions.pop((symbol, key), None) is None:
+            return False
+        book = self.books[symbol]
+        for side in ("up", "down"):
+            thresholds, entries = book[side]
+            for position in range(len(entries) - 1, -1, -1):
+                if entries[position][0] == key:
+                    del thresholds[position]
+                    del entries[position]
+        if not book["up"][0] and not book["down"][0]:
+            del self.books[symbol]
+        return True
+
+    def sync_signals(self, active_signals):
+        """İndeksi aktif sinyallerle eşitler: değişen seviyeleri günceller, kapananları çıkarır"""
+        wanted = {}
+        for symbol, signal in active_signals.items():
+            if signal.target_price > 0 and signal.stop_loss > 0:
+                wanted[(symbol, symbol)] = (signal.side, signal.target_price, signal.stop_loss)
+        for symbol, key in list(self.positions):
+            if (symbol, key) not in wanted:
+                self.remove(symbol, key)
+        for (symbol, key), levels in wanted.items():
+            if self.positions.get((symbol, key)) != levels:
+                self.add(symbol, key, *levels)
+
+    def _match(self, symbol, high, low):
+        book = self.books.get(symbol)
+        if not book:
+            return []
+        up_thresholds, up_entries = book["up"]
+        down_thresholds, down_entries = book["down"]
+        hits = [(entry, high) for entry in up_entries[:bisect.bisect_right(up_thresholds, high)]]
+        hits += [(entry, low) for entry in down_entries[bisect.bisect_left(down_thresholds, low):]]
+
+        # Aynı mumda hem TP hem SL: kural olarak TP öncelikli (find_first_trigger ile aynı)
+        events = {}
+        for (key, trigger_type, level), price in hits:
+            if key not in events or trigger_type == "take_profit":
+                events[key] = {"symbol": symbol, "key": key, "trigger_type": trigger_type, "level": level, "price": price}
+        return list(events.values())
+
+    def match_price(self, symbol, price):
+        """Anlık fiyatla tetiklenen pozisyonları döndürür"""
+        return self._match(symbol, price, price)
+
+    def match_candle(self, symbol, high, low):
+        """Bir mumun high/low aralığıyla tetiklenen pozisyonları döndürür"""
+        return self._match(symbol, high, low)
+
+    def match_klines(self, symbol, klines):
+        """Ham kline listesinde her pozisyon için ilk dokunuşu döndürür (olaylara candle_index ve open_time eklenir)"""
+        book = self.books.get(symbol)
+        if not book:
+            return []
+        position_count = len(book["up"][1])  # Her pozisyonun "up" defterinde tam bir seviyesi var
+        triggered = {}
+        for index, kline in enumerate(klines):
+            for event in self._match(symbol, float(kline[2]), float(kline[3])):
+                if event["key"] not in triggered:
+                    event["candle_index"] = index
+                    event["open_time"] = int(kline[0])
+                    triggered[event["key"]] = event
+            if len(triggered) == position_count:
+                break
+        return list(triggered.values())
+
+global_trigger_index = TriggerIndex()
+
 def check_klines_for_trigger(signal, klines):
+    """
+    Ham 1m mumlarda (Binance kline listesi) TP/SL tetiklemesini ilk dokunuşa göre arar.
+    Dönüş: (tetiklendi mi, tetikleme tipi, fiyat, mum indeksi, mum açılış zamanı [ms])
+    Tetikleme yoksa fiyat son mumun kapanışıdır; indeks ve zaman None döner.
+    """
+    symbol = signal.symbol
     try:
-        signal_type = signal.get('type', 'ALIŞ')
-        symbol = signal.get('symbol', 'UNKNOWN')
-        
-        # Hedef ve stop fiyatlarını al
-        if 'target_price' in signal and 'stop_loss' in signal:
-            target_price = float(str(signal['target_price']).replace('$', '').replace(',', ''))
-            stop_loss_price = float(str(signal['stop_loss']).replace('$', '').replace(',', ''))
-        else:
-            # Pozisyon verilerinden al
-            target_price = float(str(signal.get('target', 0)).replace('$', '').replace(',', ''))
-            stop_loss_price = float(str(signal.get('stop', 0)).replace('$', '').replace(',', ''))
+        target_price, stop_loss_price = signal.target_price, signal.stop_loss
         
         if target_price <= 0 or stop_loss_price <= 0:
             print(f"⚠️ {symbol} - Geçersiz hedef/stop fiyatları: TP={target_price}, SL={stop_loss_price}")
-            return False, None, None
+            return False, None, None, None, None
         
         if not klines:
             print(f"⚠️ {symbol} - Mum verisi boş")
-            return False, None, None
-        
-        # Mum verilerini DataFrame'e dönüştür
-        if isinstance(klines, list) and len(klines) > 0:
-            if len(klines[0]) >= 6:  # OHLCV formatı
-                df = pd.DataFrame(klines, columns=['open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'])
-                df = df[['open', 'high', 'low', 'close']].astype(float)
+            return False, None, None, None, None
+        
+        if not isinstance(klines, list) or len(klines[0]) < 6:  # OHLCV formatı
+            print(f"⚠️ {symbol} - Geçersiz mum veri formatı")
+            return False, None, None, None, None
+        
+        # Sadece ihtiyaç duyulan kolonlar: açılış zamanı, high, low, close
+        high = np.array([kline[2] for kline in klines], dtype=float)
+        low = np.array([kline[3] for kline in klines], dtype=float)
+        
+        index, trigger_type, trigger_price = find_first_trigger(signal.side, high, low, target_price, stop_loss_price)
+        if index is not None:
+            open_time = int(klines[index][0])
+            candle_time = datetime.fromtimestamp(open_time / 1000).strftime('%Y-%m-%d %H:%M')
+            if trigger_type == "take_profit":
+                print(f"✅ {symbol} - TP tetiklendi! Mum #{index} ({candle_time}): Fiyat={trigger_price:.6f}, TP={target_price:.6f}")
             else:
-                print(f"⚠️ {signal.get('symbol', 'UNKNOWN')} - Geçersiz mum veri formatı")
-                return False, None, None
-        else:
-            print(f"⚠️ {signal.get('symbol', 'UNKNOWN')} - Mum verisi bulunamadı")
-            return False, None, None
-        
-        symbol = signal.get('symbol', 'UNKNOWN')
-        
-        for index, row in df.iterrows():
-            high = float(row['high'])
-            low = float(row['low'])
-            
-                    # Minimum tetikleme farkı (sıfır bölme ve yanlış tetiklemeyi önler)
-        min_trigger_diff = 0.001  # %0.1 minimum fark
-        
-        # ALIŞ sinyali kontrolü (long pozisyon)
-        if signal_type == "ALIŞ" or signal_type == "ALIS":
-            # Önce hedef kontrolü (kural olarak kar alma öncelikli)
-            if high >= target_price and (high - target_price) >= (target_price * min_trigger_diff):
-                print(f"✅ {symbol} - TP tetiklendi! Mum: High={high:.6f}, TP={target_price:.6f}")
-                return True, "take_profit", high
-            # Sonra stop-loss kontrolü - eşit veya geçmişse
-            if low <= stop_loss_price and (stop_loss_price - low) >= (stop_loss_price * min_trigger_diff):
-                print(f"❌ {symbol} - SL tetiklendi! Mum: Low={low:.6f}, SL={stop_loss_price:.6f}")
-                return True, "stop_loss", low
-                
-        # SATIŞ sinyali kontrolü (short pozisyon)
-        elif signal_type == "SATIŞ" or signal_type == "SATIS":
-            # Önce hedef kontrolü
-            if low <= target_price and (target_price - low) >= (target_price * min_trigger_diff):
-                print(f"✅ {symbol} - TP tetiklendi! Mum: Low={low:.6f}, TP={target_price:.6f}")
-                return True, "take_profit", low
-            # Sonra stop-loss kontrolü - eşit veya geçmişse
-            if high >= stop_loss_price and (high - stop_loss_price) >= (stop_loss_price * min_trigger_diff):
-                print(f"❌ {symbol} - SL tetiklendi! Mum: High={high:.6f}, SL={stop_loss_price:.6f}")
-                return True, "stop_loss", high
-
-        # Hiçbir tetikleme yoksa, false döner ve son mumu döndürür
-        final_price = float(df['close'].iloc[-1]) if not df.empty else None
-        return False, None, final_price
+                print(f"❌ {symbol} - SL tetiklendi! Mum #{index} ({candle_time}): Fiyat={trigger_price:.6f}, SL={stop_loss_price:.6f}")
+            return True, trigger_type, trigger_price, index, open_time
+
+        # Hiçbir tetikleme yoksa, false döner ve son mumun kapanışını döndürür
+        final_price = float(klines[-1][4])
+        return False, None, final_price, None, None
         
     except Exception as e:
-        print(f"❌ check_klines_for_trigger hatası ({signal.get('symbol', 'UNKNOWN')}): {e}")
-        return False, None, None
+        print(f"❌ check_klines_for_trigger hatası ({symbol}): {e}")
+        return False, None, None, None, None
 
 def save_stats_to_db(stats):
     """İstatistik sözlüğünü MongoDB'ye kaydeder."""
@@ -276,21 +660,41 @@ def load_stats_from_db():
     """MongoDB'den son istatistik sözlüğünü döndürür."""
     return load_data_from_db("bot_stats", {})
 
-def update_stats_atomic(updates):
+def update_stats_atomic(updates, history=None, unit_of_work=None):
+    """
+    İstatistik sayaçlarını $inc ile atomik günceller. history verilirse ({alan: kayıt}) kayıt aynı
+    yazımda data.<alan> listesine eklenir ve liste son EXCURSION_HISTORY_LIMIT kayıtla sınırlanır.
+    unit_of_work verilirse güncelleme iş birimine eklenir, commit'te yazılır.
+    """
+    # Önce bellekteki tek kaynak güncellenir (okumalar DB'ye gitmez)
+    for key, value in updates.items():
+        global_stats[key] = global_stats.get(key, 0) + value
+    for key, record in (history or {}).items():
+        global_stats[key] = (list(global_stats.get(key) or []) + [record])[-EXCURSION_HISTORY_LIMIT:]
+    
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print("❌ MongoDB bağlantısı kurulamadı, atomik güncelleme yapılamadı")
-                return False
-        
         # Atomik $inc operatörü ile güncelleme
         update_data = {}
         for key, value in updates.items():
             update_data[f"data.{key}"] = value
         
-        result = mongo_collection.update_one(
+        update = {"$inc": update_data, "$set": {"data.last_updated": str(datetime.now())}}
+        if history:
+            update["$push"] = {
+                f"data.{key}": {"$each": [record], "$slice": -EXCURSION_HISTORY_LIMIT}
+                for key, record in history.items()
+            }
+        if unit_of_work is not None:
+            unit_of_work.update(bot_state_collection, "bot_stats", update, upsert=True)
+            return True
+        
+        if not mongodb_ready():
+            print("❌ MongoDB bağlantısı kurulamadı, atomik güncelleme yapılamadı")
+            return False
+        
+        result = bot_state_collection.update_one(
             {"_id": "bot_stats"},
-            {"$inc": update_data, "$set": {"data.last_updated": str(datetime.now())}},
+            update,
             upsert=True
         )
         
@@ -305,87 +709,101 @@ def update_stats_atomic(updates):
         print(f"❌ Atomik istatistik güncelleme hatası: {e}")
         return False
 
-def update_position_status_atomic(symbol, status, additional_data=None):
+# ============================================================================
+# İŞLEM GEÇMİŞİ: kapanan her pozisyon trades'e eklenir, /stats aggregation ile hesaplanır
+# ============================================================================
+
+trade_stats_cache = {}  # {(symbol, days): (time.monotonic(), sonuç)} - kapanışta temizlenir
+
+def record_trade(trade, unit_of_work):
+    """
+    Kapanan pozisyonu trades'e ekleme işini iş birimine ekler. _id sembol + kapanış anıdır ve
+    $setOnInsert kullanılır: tampondan tekrar oynatılan yazım ikinci kayıt oluşturmaz, var olan değişmez.
+    """
+    trade_id = f"{trade['symbol']}-{int(trade['closed_at'].timestamp() * 1000)}"
+    unit_of_work.update(trades_collection, trade_id, {"$setOnInsert": trade}, upsert=True)
+
+def build_trade_stats_pipeline(symbol=None, since=None):
+    """
+    /stats aggregation'ı: filtre ($match, indeksli alanlar) sonrası tek $facet'te toplam, sembol ve
+    gün kırılımları. Gruplar kapanış sayısı, TP/SL sayısı, kâr/zarar ve ortalama MFE/MAE içerir.
+    """
+    match = {}
+    if symbol:
+        match["symbol"] = symbol
+    if since:
+        match["closed_at"] = {"$gte": since}
+
+    def summary(group_id):
+        return {"$group": {
+            "_id": group_id,
+            "trades": {"$sum": 1},
+            "successful": {"$sum": {"$cond": [{"$eq": ["$result", "take_profit"]}, 1, 0]}},
+            "failed": {"$sum": {"$cond": [{"$eq": ["$result", "stop_loss"]}, 1, 0]}},
+            "profit_loss_usd": {"$sum": "$profit_loss_usd"},
+            "avg_mfe_percent": {"$avg": "$mfe_percent"},
+            "avg_mae_percent": {"$avg": "$mae_percent"},
+        }}
+
+    return [
+        {"$match": match},
+        {"$facet": {
+            "total": [summary(None)],
+            "by_symbol": [summary("$symbol"), {"$sort": {"profit_loss_usd": -1}}, {"$limit": TRADE_STATS_TOP_SYMBOLS}],
+            "by_period": [summary({"$dateToString": {"format": "%Y-%m-%d", "date": "$closed_at"}}), {"$sort": {"_id": -1}}, {"$limit": TRADE_STATS_PERIODS}],
+        }},
+    ]
+
+def load_trade_stats(symbol=None, days=None):
+    """
+    trades aggregation'ını çalıştırır (DB thread havuzunda çalışabilir). /clearall sonrası (reset_at)
+    kapanışlar sayılmaz; filtresiz toplama trades öncesi kapanışların tabanı eklenir.
+    MongoDB erişilemiyorsa veya sorgu hata verirse None.
+    """
+    if not mongodb_ready():
+        return None
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print("❌ MongoDB bağlantısı kurulamadı, pozisyon durumu güncellenemedi")
-                return False
-        
-        # Önce dokümanın var olup olmadığını kontrol et
-        existing_doc = mongo_collection.find_one({"_id": f"active_signal_{symbol}"})
-        
-        if existing_doc:
-            # Doküman varsa, data alanı var mı kontrol et
-            if "data" in existing_doc:
-                # Data alanı varsa normal güncelleme
-                update_data = {"$set": {"data.status": status, "data.last_updated": str(datetime.now())}}
-                
-                if additional_data:
-                    for key, value in additional_data.items():
-                        update_data["$set"][f"data.{key}"] = value
-                
-                result = mongo_collection.update_one(
-                    {"_id": f"active_signal_{symbol}"},
-                    update_data,
-                    upsert=False
-                )
-            else:
-                # Data alanı yoksa, önce onu oluştur
-                update_data = {"$set": {"data": {"status": status, "last_updated": str(datetime.now())}}}
-                
-                if additional_data:
-                    for key, value in additional_data.items():
-                        update_data["$set"][f"data.{key}"] = value
-                
-                result = mongo_collection.update_one(
-                    {"_id": f"active_signal_{symbol}"},
-                    update_data,
-                    upsert=False
-                )
-        else:
-            # Doküman yoksa, yeni oluştur
-            new_doc = {
-                "_id": f"active_signal_{symbol}",
-                "data": {
-                    "status": status,
-                    "last_updated": str(datetime.now())
-                }
-            }
-            
-            if additional_data:
-                for key, value in additional_data.items():
-                    new_doc["data"][key] = value
-            
-            result = mongo_collection.insert_one(new_doc)
-        
-        # insert_one için upserted_id, update_one için modified_count kontrol et
-        if hasattr(result, 'modified_count') and result.modified_count > 0:
-            print(f"✅ {symbol} pozisyon durumu güncellendi: {status}")
-            return True
-        elif hasattr(result, 'upserted_id') and result.upserted_id:
-            print(f"✅ {symbol} pozisyon durumu oluşturuldu: {status}")
-            return True
-        else:
-            print(f"⚠️ {symbol} pozisyon durumu güncellenemedi: {status} (Result: {result})")
-            return False
-            
+        history = bot_state_collection.find_one({"_id": "trade_history"}) or {}
+        bounds = [bound for bound in (history.get("reset_at"), datetime.now() - timedelta(days=days) if days else None) if bound]
+        result = next(trades_collection.aggregate(build_trade_stats_pipeline(symbol, max(bounds) if bounds else None)), {})
     except Exception as e:
-        print(f"❌ Pozisyon durumu güncelleme hatası ({symbol}): {e}")
-        return False
+        print(f"❌ İşlem istatistikleri hesaplanamadı: {e}")
+        return None
+    total = (result.get("total") or [{}])[0]
+    baseline = (history.get("baseline") or {}) if not symbol and not days else {}
+    stats = {
+        "trades": total.get("trades", 0),
+        "successful_signals": total.get("successful", 0) + baseline.get("successful_signals", 0),
+        "failed_signals": total.get("failed", 0) + baseline.get("failed_signals", 0),
+        "total_profit_loss": total.get("profit_loss_usd", 0.0) + baseline.get("total_profit_loss", 0.0),
+        "avg_mfe_percent": total.get("avg_mfe_percent"),
+        "avg_mae_percent": total.get("avg_mae_percent"),
+        "by_symbol": result.get("by_symbol") or [],
+        "by_period": result.get("by_period") or [],
+    }
+    return stats
+
+async def get_trade_stats(symbol=None, days=None):
+    """load_trade_stats'ın önbellekli hali: TRADE_STATS_CACHE_SECONDS içinde ve kapanış olmadıkça DB'ye gidilmez"""
+    key = (symbol, days)
+    cached = trade_stats_cache.get(key)
+    if cached and time.monotonic() - cached[0] < TRADE_STATS_CACHE_SECONDS:
+        return cached[1]
+    stats = await run_db(load_trade_stats, symbol, days)
+    if stats is not None:
+        trade_stats_cache[key] = (time.monotonic(), stats)
+    return stats
 
 def save_active_signals_to_db(active_signals):
-    """Aktif sinyalleri MongoDB'ye kaydeder."""
+    """Aktif sinyalleri MongoDB'ye kaydeder (MongoDB erişilemiyorsa yazımlar tampona ve journal'a alınır)."""
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print("❌ MongoDB bağlantısı kurulamadı, aktif sinyaller kaydedilemedi")
-                return False
-        
         # Eğer boş sözlük ise, tüm aktif sinyal dokümanlarını sil
         if not active_signals:
+            if not mongodb_ready():
+                print("❌ MongoDB bağlantısı kurulamadı, aktif sinyaller temizlenemedi")
+                return False
             try:
-                delete_result = mongo_collection.delete_many({"_id": {"$regex": "^active_signal_"}})
+                delete_result = active_signals_collection.delete_many({})
                 deleted_count = getattr(delete_result, "deleted_count", 0)
                 print(f"🧹 Boş aktif sinyal listesi için {deleted_count} doküman silindi")
                 return True
@@ -393,39 +811,19 @@ def save_active_signals_to_db(active_signals):
                 print(f"❌ Boş aktif sinyal temizleme hatası: {e}")
                 return False
         
-        # Her aktif sinyali ayrı doküman olarak kaydet
+        # Her aktif sinyal ayrı doküman; hepsi tek bulk_write ile yazılır
+        unit_of_work = MongoUnitOfWork("Aktif sinyal kaydı")
         for symbol, signal in active_signals.items():
-            signal_doc = {
-                "_id": f"active_signal_{symbol}",
-                "symbol": signal["symbol"],
-                "type": signal["type"],
-                "entry_price": signal["entry_price"],
-                "entry_price_float": signal["entry_price_float"],
-                "target_price": signal["target_price"],
-                "stop_loss": signal["stop_loss"],
-                "signals": signal["signals"],
-                "leverage": signal["leverage"],
-                "signal_time": signal["signal_time"],
-                "current_price": signal["current_price"],
-                "current_price_float": signal["current_price_float"],
-                "last_update": signal["last_update"],
-                "max_price": signal.get("max_price", 0),  # Max fiyat
-                "min_price": signal.get("min_price", 0),  # Min fiyat
-                "status": signal.get("status", "active"),  # Mevcut durumu kullan, yoksa "active"
-                "saved_at": str(datetime.now())
-            }
+            signal_doc = {"_id": symbol, **signal.to_doc(), "saved_at": str(datetime.now())}
+            update = {"$set": signal_doc}
+            if signal.last_checked_candle:
+                # Watermark eski bir kopyayla geri alınmasın
+                update["$max"] = {"last_checked_candle": signal.last_checked_candle}
             
-            # Doğrudan MongoDB'ye kaydet (save_data_to_db kullanma)
-            try:
-                mongo_collection.update_one(
-                    {"_id": f"active_signal_{symbol}"},
-                    {"$set": signal_doc},
-                    upsert=True
-                )
-            except Exception as e:
-                print(f"❌ {symbol} aktif sinyali kaydedilemedi: {e}")
-                return False
+            unit_of_work.update(active_signals_collection, symbol, update, upsert=True)
         
+        if not unit_of_work.commit():
+            return False
         print(f"✅ MongoDB'ye {len(active_signals)} aktif sinyal kaydedildi")
         return True
     except Exception as e:
@@ -435,75 +833,708 @@ def save_active_signals_to_db(active_signals):
 def load_active_signals_from_db():
     """MongoDB'den aktif sinyalleri döndürür."""
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print("❌ MongoDB bağlantısı kurulamadı, aktif sinyaller yüklenemedi")
-                return {}
+        if not mongodb_ready():
+            print("❌ MongoDB bağlantısı kurulamadı, aktif sinyaller yüklenemedi")
+            return {}
         
         result = {}
-        docs = mongo_collection.find({"_id": {"$regex": "^active_signal_"}})
+        docs = active_signals_collection.find({})
         
         for doc in docs:
             # Artık veri doğrudan dokümanda, data alanında değil
             if "symbol" not in doc:
                 continue
-            symbol = doc["symbol"]
-            result[symbol] = {
-                "symbol": doc.get("symbol", symbol),
-                "type": doc.get("type", "ALIŞ"),
-                "entry_price": doc.get("entry_price", "0"),
-                "entry_price_float": doc.get("entry_price_float", 0.0),
-                "target_price": doc.get("target_price", "0"),
-                "stop_loss": doc.get("stop_loss", "0"),
-                "signals": doc.get("signals", {}),
-                "leverage": doc.get("leverage", 10),
-                "signal_time": doc.get("signal_time", ""),
-                "current_price": doc.get("current_price", "0"),
-                "current_price_float": doc.get("current_price_float", 0.0),
-                "last_update": doc.get("last_update", ""),
-                "max_price": doc.get("max_price", 0),  # Max fiyat
-                "min_price": doc.get("min_price", 0),  # Min fiyat
-                "status": doc.get("status", "active")  # Varsayılan durum "active"
-            }
+            try:
+                signal = ActiveSignal.from_doc(doc)
+            except (ValueError, TypeError) as e:
+                print(f"⚠️ {doc['symbol']} aktif sinyali okunamadı, atlanıyor: {e}")
+                continue
+            result[signal.symbol] = signal
         return result
     except Exception as e:
         print(f"❌ MongoDB'den aktif sinyaller yüklenirken hata: {e}")
         return {}
 
+def get_db_executor():
+    """DB thread havuzunu döndürür (DB_THREAD_POOL_WORKERS <= 0 ise None)"""
+    global db_executor
+    if db_executor is None and DB_THREAD_POOL_WORKERS > 0:
+        db_executor = ThreadPoolExecutor(max_workers=DB_THREAD_POOL_WORKERS, thread_name_prefix="mongo")
+    return db_executor
+
+def shutdown_db_executor():
+    """DB thread havuzunu kapatır (devam eden yazımlar tamamlanır)"""
+    global db_executor
+    if db_executor is not None:
+        db_executor.shutdown(wait=True)
+        db_executor = None
+
+async def run_db(func, *args, **kwargs):
+    """
+    Senkron DB fonksiyonunu sınırlı thread havuzunda çalıştırır; Mongo gidiş-dönüşü beklenirken event loop
+    diğer görevlere (Telegram, pozisyon motoru) devam eder. Fonksiyon paylaşılan bellek durumunu değiştirmemeli:
+    bellek güncellemeleri loop üzerinde, yalnızca DB okuma/yazması havuzda yapılır.
+    """
+    executor = get_db_executor()
+    if executor is None:
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+class MongoUnitOfWork:
+    """
+    Bir mantıksal işlemin (tarama turu, pozisyon kapanışı, temizlik) çoklu doküman değişikliklerini
+    toplar ve commit'te koleksiyon başına tek sırasız bulk_write ile yazar. Sırasız yazımda bir işlemin
+    hatası diğerlerini durdurmaz; hatalar işlem bazında (koleksiyon/etiket) raporlanır ve errors'ta kalır.
+    MongoDB erişilemiyorsa (heartbeat durumu veya bağlantı hatası) işlemler beklemeden yerel tampona
+    alınır ve bağlantı gelince aynı sırayla yazılır.
+    coalesce=True ile eklenen güncelleme aynı dokümanın bekleyen coalesce güncellemesinin yerine geçer
+    (ör. tur içinde birden çok kez yazılan istatistik anlık görüntüsü).
+    """
+
+    def __init__(self, description):
+        self.description = description
+        self.batches = {}  # {koleksiyon adı: (koleksiyon, {anahtar: (etiket, yazım tanımı)})}
+        self.errors = []  # [(koleksiyon adı, etiket, mesaj)]
+        self._sequence = 0
+
+    def _add(self, collection, key, label, operation):
+        if key is None:
+            self._sequence += 1
+            key = self._sequence
+        self.batches.setdefault(collection.name, (collection, {}))[1][key] = (label, operation)
+
+    def update(self, collection, doc_id, update, upsert=False, coalesce=False):
+        """Tek dokümanlık güncelleme ekler (_id = doc_id)"""
+        key = ("update", doc_id) if coalesce else None
+        self._add(collection, key, doc_id, {"op": "update", "_id": doc_id, "update": update, "upsert": upsert})
+
+    def delete(self, collection, doc_id):
+        """Tek dokümanlık silme ekler (aynı doküman iki kez silinmez)"""
+        self._add(collection, ("delete", doc_id), doc_id, {"op": "delete", "_id": doc_id})
+
+    def __len__(self):
+        return sum(len(entries) for _, entries in self.batches.values())
+
+    def _take(self):
+        """Bekleyen işlemleri alır; yazılamayacaksa tampona ekleyip None döndürür"""
+        batches, self.batches = self.batches, {}
+        # Tampondaki eski yazımlar önce gider; aktarılamadıysa sıra bozulmasın diye bu iş birimi de tampona.
+        # Aktarım, kontrol ve ekleme tek kilit altında: arada başka thread'in aktarımı/eklemesi araya girmez
+        with mongo_write_buffer_lock:
+            if mongodb_ready():
+                replay_buffered_writes()
+            if not mongodb_ready() or mongo_write_buffer:
+                buffer_mongo_writes([(collection, label, spec) for collection, entries in batches.values() for label, spec in entries.values()], self.description)
+                return None
+        return batches
+
+    def _write_batch(self, name, collection, entries):
+        """Bir koleksiyonun işlemlerini tek sırasız bulk_write ile yazar; yazılamayan işlemleri döndürür"""
+        if not mongo_health["healthy"]:  # Başka bir koleksiyonda bağlantı koptu: zaman aşımı tekrar beklenmez
+            buffer_mongo_writes([(collection, label, spec) for label, spec in entries], self.description)
+            return []
+        try:
+            collection.bulk_write([mongo_operation(spec) for _, spec in entries], ordered=False)
+            return []
+        except BulkWriteError as e:
+            errors = [(name, entries[error["index"]][0], error.get("errmsg", "")) for error in e.details.get("writeErrors", [])]
+            errors += [(name, "*", error.get("errmsg", "")) for error in e.details.get("writeConcernErrors", [])]
+        except ConnectionFailure as e:
+            mark_mongodb_health(False, e)
+            buffer_mongo_writes([(collection, label, spec) for label, spec in entries], self.description)
+            return []
+        except Exception as e:
+            errors = [(name, label, str(e)) for label, _ in entries]
+        for collection_name, label, message in errors:
+            print(f"❌ {self.description}: {collection_name}/{label} yazılamadı: {message}")
+        return errors
+
+    def _record_errors(self, results):
+        for errors in results:
+            self.errors.extend(errors)
+        return not any(results)
+
+    def commit(self):
+        """Bekleyen işlemleri yazar ve kuyruğu boşaltır; tüm işlemler yazıldıysa (veya tampona alındıysa) True döndürür"""
+        if not self.batches:
+            return not self.errors
+        batches = self._take()
+        if batches is None:
+            return not self.errors
+        return self._record_errors([self._write_batch(name, collection, list(entries.values())) for name, (collection, entries) in batches.items()])
+
+    async def commit_async(self):
+        """
+        commit'in event loop'u bloklamayan hali: koleksiyonların bulk_write'ları DB thread havuzunda
+        eşzamanlı gönderilir (bekleme koleksiyon sayısı kadar gidiş-dönüş değil, en yavaş yazım kadar)
+        """
+        if not self.batches:
+            return not self.errors
+        batches = await run_db(self._take)
+        if batches is None:
+            return not self.errors
+        return self._record_errors(await asyncio.gather(*(
+            run_db(self._write_batch, name, collection, list(entries.values())) for name, (collection, entries) in batches.items()
+        )))
+
+    def commit_transaction(self, claim=None):
+        """
+        Bekleyen işlemleri tek multi-document transaction'da yazar (replica set veya mongos gerekir): ya
+        hepsi yazılır ya hiçbiri. claim(session) önce çalışır; False döndürürse transaction geri alınır
+        ve False döner. Geçici transaction hataları with_transaction tarafından yeniden denenir; diğer
+        hatalarda işlemler iş biriminde kalır (çağıran transaction'sız yazabilir).
+        """
+        batches, self.batches = self.batches, {}
+
+        def run(session):
+            if claim is not None and not claim(session):
+                session.abort_transaction()
+                return False
+            for collection, entries in batches.values():
+                collection.bulk_write([mongo_operation(spec) for _, spec in entries.values()], ordered=True, session=session)
+            return True
+
+        try:
+            with mongo_client.start_session() as session:
+                return session.with_transaction(run)
+        except Exception:
+            self.batches = batches
+            raise
+
+def mongo_operation(spec, journal_seq=None):
+    """
+    Yazım tanımından ({"op": "update"/"delete", "_id", "update", "upsert"}) pymongo işlemi kurar.
+    journal_seq verilirse (tampon/journal aktarımı) $inc/$push içeren güncelleme, dokümandaki journal_seq
+    ile korunur: aynı kayıt ikinci kez uygulanmaz. $set, upsert ve silme zaten tekrar uygulanabilir.
+    """
+    if spec["op"] == "delete":
+        return DeleteOne({"_id": spec["_id"]})
+    query, update = {"_id": spec["_id"]}, spec["update"]
+    if journal_seq is not None and journal_guarded(spec):
+        query["journal_seq"] = {"$not": {"$gte": journal_seq}}
+        update = {**update, "$max": {**update.get("$max", {}), "journal_seq": journal_seq}}
+    return UpdateOne(query, update, upsert=spec.get("upsert", False))
+
+def journal_guarded(spec):
+    """Tekrar uygulanması sonucu değiştiren (sayaç/liste) güncelleme mi"""
+    return spec["op"] == "update" and ("$inc" in spec["update"] or "$push" in spec["update"])
+
+def next_journal_seq():
+    """Tampon kaydı sırası; yeniden başlatmada da artan (journal_seq korumaları eski kayıtları ayırt eder)"""
+    global mongo_journal_last_seq
+    mongo_journal_last_seq = max(time.time_ns(), mongo_journal_last_seq + 1)
+    return mongo_journal_last_seq
+
+def buffer_mongo_writes(entries, description):
+    """
+    Yazılamayan işlemleri sırası korunarak yerel tampona ve journal'a ekler. Tampon sınırsızdır: hiçbir kayıt
+    aktarılmadan atılmaz; MONGODB_WRITE_BUFFER_LIMIT aşılınca bir kez uyarı loglanır ve /stats'ta gösterilir.
+    """
+    global mongo_write_buffer_warned
+    with mongo_write_buffer_lock:
+        records = [{"seq": next_journal_seq(), "collection": collection.name, "label": label, "spec": spec} for collection, label, spec in entries]
+        mongo_write_buffer.extend(records)
+        if mongo_journal is not None:
+            mongo_journal.append(records)
+        buffered = len(mongo_write_buffer)
+        over_limit = buffered > MONGODB_WRITE_BUFFER_LIMIT and not mongo_write_buffer_warned
+        if over_limit:
+            mongo_write_buffer_warned = True
+    print(f"💾 {description}: {len(records)} işlem yerel tampona alındı (tamponda {buffered})")
+    if over_limit:
+        message = f"⚠️ MongoDB yazım tamponu {MONGODB_WRITE_BUFFER_LIMIT} sınırını aştı ({buffered} bekleyen işlem); kayıtlar atılmıyor, bağlantı gelince aktarılacak"
+        print(message)
+
+def replay_buffered_writes():
+    """
+    Tampondaki yazımları koleksiyon başına sıralı bulk_write ile aktarır. Sıralı yazım ilk hatada durur:
+    hatalı işlem loglanıp atlanır, sonrakiler tampona geri döner; bağlantı hatasında hepsi tamponda kalır.
+    Aktarım idempotenttir (mongo_operation): journal checkpoint'inden önce çökülürse kayıtlar tekrar
+    aktarılabilir. Bittiğinde journal kalan kayıtlarla yeniden yazılır. Aktarım boyunca tampon kilidi tutulur:
+    kayıtlar yazılana kadar tamponda kalır ve yeni eklemeler aktarım bitene kadar bekler (sıra korunur).
+    Aktarılan işlem sayısını döndürür.
+    """
+    global mongo_write_buffer_warned
+    with mongo_write_buffer_lock:
+        if not mongo_write_buffer:
+            return 0
+        pending = list(mongo_write_buffer)
+        grouped = {}  # {koleksiyon adı: [kayıt]}
+        for record in pending:
+            grouped.setdefault(record["collection"], []).append(record)
+
+        written = 0
+        remaining = []
+        for name, records in grouped.items():
+            try:
+                mongo_db[name].bulk_write([mongo_operation(record["spec"], record["seq"]) for record in records], ordered=True)
+                written += len(records)
+            except BulkWriteError as e:
+                write_errors = e.details.get("writeErrors", [])
+                index = write_errors[0]["index"] if write_errors else len(records)
+                if write_errors:
+                    failed = records[index]
+                    if write_errors[0].get("code") == 11000 and journal_guarded(failed["spec"]):
+                        # Korumalı upsert'te eşleşme yok ama doküman var: kayıt daha önce uygulanmış
+                        print(f"ℹ️ Tampondaki {name}/{failed['label']} daha önce aktarılmış, atlanıyor")
+                    else:
+                        print(f"❌ Tampondaki {name}/{failed['label']} yazılamadı, atlanıyor: {write_errors[0].get('errmsg', '')}")
+                written += index
+                remaining.extend(records[index + 1:])
+            except Exception as e:
+                if isinstance(e, ConnectionFailure):
+                    mark_mongodb_health(False, e)
+                else:
+                    print(f"❌ Tampondaki {name} yazımları aktarılamadı: {e}")
+                remaining.extend(records)
+        mongo_write_buffer.clear()
+        mongo_write_buffer.extend(remaining)
+        if not mongo_write_buffer:
+            mongo_write_buffer_warned = False
+        if mongo_journal is not None and len(remaining) < len(pending):
+            checkpoint_write_journal()
+        if written:
+            print(f"✅ Tampondaki {written} MongoDB yazımı aktarıldı (bekleyen {len(mongo_write_buffer)})")
+        return written
+
+class WriteJournal:
+    """
+    Tampondaki MongoDB yazımlarının yerel, yalnızca eklemeli kopyası (satır başına bir JSON kaydı; tarihler
+    bson.json_util ile korunur). Kayıtlar eklendiği anda dosyaya yazılır (süreç çökerse kaybolmaz); disk
+    için fsync her eklemede değil, write_journal_sync_loop ile toplu yapılır. Aktarımdan sonra dosya kalan
+    kayıtlarla geçici dosya + os.replace ile atomik olarak yeniden yazılır (checkpoint).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.dirty = False  # fsync bekleyen ekleme var
+
+    def open(self):
+        """Önceki süreçten kalan kayıtları okur (yarım yazılmış son satır atlanır) ve dosyayı eklemeye açar"""
+        records = []
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        records.append(json_util.loads(line))
+                    except ValueError:
+                        print(f"⚠️ Journal {line_number}. satır okunamadı (yarım yazım), atlanıyor")
+        self.rewrite(records)
+        return records
+
+    def append(self, records):
+        self.file.write("".join(json_util.dumps(record) + "\n" for record in records))
+        self.file.flush()
+        self.dirty = True
+
+    def sync(self):
+        if self.dirty:
+            os.fsync(self.file.fileno())
+            self.dirty = False
+
+    def rewrite(self, records):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("".join(json_util.dumps(record) + "\n" for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+        if self.file is not None:
+            self.file.close()
+        os.replace(temp_path, self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.dirty = False
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+def open_write_journal():
+    """
+    Journal'ı açar: önceki süreçten kalan (aktarılamamış) yazımlar tampona yüklenir ve bağlantı varsa
+    durum DB'den okunmadan önce aktarılır. Yüklenen kayıt sayısını döndürür.
+    """
+    global mongo_journal, mongo_journal_last_seq
+    if not MONGODB_JOURNAL_PATH or mongo_journal is not None:
+        return 0
+    journal = WriteJournal(MONGODB_JOURNAL_PATH)
+    with mongo_write_buffer_lock:
+        records = journal.open()
+        mongo_write_buffer.extend(records)
+        mongo_journal_last_seq = max([mongo_journal_last_seq] + [record["seq"] for record in records])
+        mongo_journal = journal
+    if records:
+        print(f"📒 Journal'dan {len(records)} aktarılmamış MongoDB yazımı yüklendi ({MONGODB_JOURNAL_PATH})")
+        if mongodb_ready():
+            replay_buffered_writes()
+    return len(records)
+
+def checkpoint_write_journal():
+    """Journal'ı tamponda kalan kayıtlarla yeniden yazar (aktarılanlar dosyadan düşer)"""
+    with mongo_write_buffer_lock:
+        if mongo_journal is not None:
+            mongo_journal.rewrite(list(mongo_write_buffer))
+
+def sync_write_journal():
+    with mongo_write_buffer_lock:
+        if mongo_journal is not None:
+            mongo_journal.sync()
+
+def close_write_journal():
+    """Kapanışta journal'ı diske yazar ve kapatır (aktarılamayan kayıtlar sonraki başlatmada yüklenir)"""
+    global mongo_journal
+    with mongo_write_buffer_lock:
+        if mongo_journal is not None:
+            mongo_journal.close()
+            mongo_journal = None
+
+async def write_journal_sync_loop(interval_ms=None):
+    """Journal eklemelerini toplu fsync'ler: en fazla MONGODB_JOURNAL_FSYNC_MS'de bir, yalnızca yeni ekleme varsa"""
+    interval = (interval_ms or MONGODB_JOURNAL_FSYNC_MS) / 1000
+    while True:
+        await asyncio.sleep(interval)
+        if mongo_journal is not None and mongo_journal.dirty:
+            try:
+                await asyncio.to_thread(sync_write_journal)
+            except Exception as e:
+                print(f"❌ Journal fsync hatası: {e}")
+
+def queue_position_removal(unit_of_work, symbol):
+    """Pozisyonun positions ve active_signals dokümanlarının silinmesini iş birimine ekler"""
+    unit_of_work.delete(positions_collection, symbol)
+    unit_of_work.delete(active_signals_collection, symbol)
+
+def claim_position_close(symbol, unit_of_work):
+    """
+    Kapanışta pozisyonu sahiplenir: positions dokümanı find_one_and_delete ile tek gidiş-dönüşte silinir.
+    Doküman yoksa pozisyonu başka bir süreç kapatmıştır: iş birimi yazılmaz, False döner. Transaction
+    açıksa (MONGODB_TRANSACTIONS_ENABLED ve replica set) sahiplenme ve iş biriminin tüm yazımları aynı
+    transaction'da commit edilir; değilse iş birimi çağıranın commit'ine kalır. MongoDB erişilemiyorsa
+    motorun tekil sahipliğine güvenilir, silme iş birimine eklenir ve tampona alınır.
+    """
+    def claim(session=None):
+        return positions_collection.find_one_and_delete({"_id": symbol}, projection={"_id": 1}, session=session) is not None
+
+    if mongodb_ready() and mongo_write_buffer:
+        replay_buffered_writes()  # Tamponda pozisyonun kendi kaydı olabilir: sahiplenmeden önce yazılmalı (boşsa DB'ye gidilmez)
+    if mongodb_ready() and not mongo_write_buffer:
+        if MONGODB_TRANSACTIONS_ENABLED and mongo_supports_transactions:
+            try:
+                return unit_of_work.commit_transaction(claim)
+            except ConnectionFailure as e:
+                mark_mongodb_health(False, e)
+            except Exception as e:
+                print(f"⚠️ {symbol} kapanış transaction'ı yazılamadı, transaction'sız devam ediliyor: {e}")
+        if mongo_health["healthy"]:
+            try:
+                return claim()
+            except ConnectionFailure as e:
+                mark_mongodb_health(False, e)
+    unit_of_work.delete(positions_collection, symbol)
+    return True
+
+active_signal_dirty = {}  # {symbol: {"$set": {...}, "$max": {...}, "$min": {...}}} - henüz yazılmamış değişiklikler
+active_signal_last_flush = 0.0  # time.monotonic()
+
+def mark_active_signal_dirty(symbol, set_fields=None, max_fields=None, min_fields=None):
+    """
+    Aktif sinyalin değişen alanlarını yazma kuyruğuna ekler. Aynı alan için $set son değeri,
+    $max/$min en büyük/küçük değeri tutar; kuyruk flush_active_signal_updates ile tek bulk_write'ta
+    yazılır.
+    """
+    pending = active_signal_dirty.setdefault(symbol, {})
+    if set_fields:
+        pending.setdefault("$set", {}).update(set_fields)
+    for operator, fields, pick in (("$max", max_fields, max), ("$min", min_fields, min)):
+        if fields:
+            target = pending.setdefault(operator, {})
+            for key, value in fields.items():
+                target[key] = pick(target[key], value) if key in target else value
+
+def discard_active_signal_updates(symbol):
+    """Kapanan/silinen aktif sinyalin bekleyen değişikliklerini atar"""
+    active_signal_dirty.pop(symbol, None)
+
+def _take_active_signal_updates(force):
+    """Yazılacak değişiklikleri kuyruktan alır; kuyruk boşsa veya aralık dolmadıysa (force=False) None"""
+    global active_signal_last_flush
+    if not active_signal_dirty:
+        return None
+    now = time.monotonic()
+    if not force and now - active_signal_last_flush < ACTIVE_SIGNAL_FLUSH_SECONDS:
+        return None
+    pending = dict(active_signal_dirty)
+    active_signal_dirty.clear()
+    active_signal_last_flush = now
+    return pending
+
+def _active_signal_updates_unit_of_work(pending):
+    """
+    Alınan değişiklikleri tek iş birimine koyar (upsert yok: silinmiş doküman geri gelmez). MongoDB
+    erişilemiyorsa iş birimi diğer yazımlar gibi tampon + journal'a alır: kesinti sırasında çökülse de
+    değişiklikler kaybolmaz.
+    """
+    writes = MongoUnitOfWork("Aktif sinyal değişiklikleri")
+    for symbol, update in pending.items():
+        writes.update(active_signals_collection, symbol, update)
+    return writes
+
+def _restore_active_signal_updates(pending):
+    """Yazılamayan değişiklikleri kuyruğa geri koyar; yazım sırasında gelen yeni değerler önceliklidir"""
+    global active_signal_last_flush
+    for symbol, update in pending.items():
+        merged = {operator: dict(fields) for operator, fields in update.items()}
+        for operator, fields in active_signal_dirty.get(symbol, {}).items():
+            target = merged.setdefault(operator, {})
+            pick = {"$max": max, "$min": min}.get(operator)
+            for key, value in fields.items():
+                target[key] = pick(target[key], value) if pick and key in target else value
+        active_signal_dirty[symbol] = merged
+    active_signal_last_flush = 0.0  # Bir sonraki flush aralık beklemeden tekrar dener
+
+def _settle_active_signal_updates(pending, writes):
+    """Sunucunun reddettiği değişiklikleri kuyruğa geri koyar; yazılan (veya tampona alınan) sayısını döndürür"""
+    failed_labels = {label for _, label, _ in writes.errors}
+    failed = pending if "*" in failed_labels else {symbol: update for symbol, update in pending.items() if symbol in failed_labels}
+    if failed:
+        _restore_active_signal_updates(failed)
+    return len(pending) - len(failed)
+
+def flush_active_signal_updates(force=False):
+    """
+    Bekleyen aktif sinyal değişikliklerini tek bulk_write ile yazar; MongoDB erişilemiyorsa değişiklikler
+    tampon + journal'a alınır. force=False iken ACTIVE_SIGNAL_FLUSH_SECONDS dolmadan yazmaz. Yazılan
+    (veya tampona alınan) doküman sayısını döndürür; sunucunun reddettiği değişiklikler kuyrukta kalır
+    ve bir sonraki flush'ta tekrar denenir.
+    """
+    pending = _take_active_signal_updates(force)
+    if pending is None:
+        return 0
+    writes = _active_signal_updates_unit_of_work(pending)
+    writes.commit()
+    return _settle_active_signal_updates(pending, writes)
+
+async def flush_active_signal_updates_async(force=False):
+    """flush_active_signal_updates'in event loop'u bloklamayan hali (yazım DB thread havuzunda)"""
+    pending = _take_active_signal_updates(force)
+    if pending is None:
+        return 0
+    writes = _active_signal_updates_unit_of_work(pending)
+    await writes.commit_async()
+    return _settle_active_signal_updates(pending, writes)
+
 ALLOWED_USERS = set()
 
 def connect_mongodb():
-    """MongoDB bağlantısını kur"""
-    global mongo_client, mongo_db, mongo_collection
+    """
+    Süreçteki tek MongoClient'ı kurar (sonraki çağrılar aynı istemciyi kullanır; pymongo kopan
+    bağlantıları kendisi yeniler) ve ping ile sağlık durumunu günceller. İlk başarılı bağlantıda
+    indeksler oluşturulur ve eski düzen taşınır.
+    """
+    global mongo_client, mongo_db, mongo_collection, positions_collection, active_signals_collection
+    global stop_cooldowns_collection, signal_cooldowns_collection, previous_signals_collection, bot_state_collection
+    global trades_collection, mongo_supports_transactions
     try:
-        mongo_client = MongoClient(MONGODB_URI, 
-                                  serverSelectionTimeoutMS=30000,
-                                  connectTimeoutMS=30000,
-                                  socketTimeoutMS=30000,
-                                  maxPoolSize=10)
-        mongo_client.admin.command('ping')
-        mongo_db = mongo_client[MONGODB_DB]
-        mongo_collection = mongo_db[MONGODB_COLLECTION]
-        return True
-    except (ConnectionFailure, ServerSelectionTimeoutError) as e:
-        print(f"❌ MongoDB bağlantı hatası: {e}")
-        return False
+        if mongo_client is None:
+            # İstemci oluşturmak ağ beklemez; sunucu seçimi zaman aşımı erişilemeyen sunucuda her işlemin üst sınırı
+            mongo_client = MongoClient(MONGODB_URI, 
+                                      serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                                      connectTimeoutMS=30000,
+                                      socketTimeoutMS=30000,
+                                      maxPoolSize=10)
+            mongo_db = mongo_client[MONGODB_DB]
+            mongo_collection = mongo_db[MONGODB_COLLECTION]
+            positions_collection = mongo_db["positions"]
+            active_signals_collection = mongo_db["active_signals"]
+            stop_cooldowns_collection = mongo_db["stop_cooldowns"]
+            signal_cooldowns_collection = mongo_db["signal_cooldowns"]
+            previous_signals_collection = mongo_db["previous_signals"]
+            bot_state_collection = mongo_db["bot_state"]
+            trades_collection = mongo_db["trades"]
+        # ping yerine hello: aynı gidiş-dönüşte transaction desteği (replica set / mongos) öğrenilir
+        hello = mongo_client.admin.command('hello')
+        mongo_supports_transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
     except Exception as e:
+        mark_mongodb_health(False, e)
         print(f"❌ MongoDB bağlantı hatası: {e}")
         return False
+    mark_mongodb_health(True)
+    prepare_storage_layout()
+    return True
+
+def mark_mongodb_health(healthy, error=None):
+    """Sağlık durumunu günceller; yalnızca durum değişiminde loglar"""
+    was_healthy = mongo_health["healthy"]
+    mongo_health["checked_at"] = datetime.now()
+    if healthy:
+        mongo_health.update(healthy=True, last_ok=mongo_health["checked_at"], failures=0)
+        if not was_healthy and mongo_health["last_error"] is not None:
+            print(f"✅ MongoDB bağlantısı geri geldi (tamponda {len(mongo_write_buffer)} yazım)")
+    else:
+        mongo_health.update(healthy=False, last_error=str(error), failures=mongo_health["failures"] + 1)
+        if was_healthy:
+            print(f"⚠️ MongoDB erişilemiyor, yazımlar yerel tamponda bekletilecek: {error}")
 
-def ensure_mongodb_connection():
-    """MongoDB bağlantısının aktif olduğundan emin ol, değilse yeniden bağlan"""
-    global mongo_collection
+def mongodb_ready():
+    """
+    Sıcak yol bağlantı kontrolü: ağ çağrısı yapmaz, heartbeat'in önbellekteki durumunu okur.
+    İstemci hiç kurulmadıysa (ilk çağrı) bir kez kurmayı dener.
+    """
+    if mongo_db is None:
+        return connect_mongodb()
+    return mongo_health["healthy"]
+
+def check_mongodb_health():
+    """Heartbeat adımı (DB thread havuzunda): ping atar, bağlantı geldiyse bekletilen yazımları aktarır"""
+    if mongo_db is None:
+        if not connect_mongodb():
+            return False
+    else:
+        try:
+            mongo_client.admin.command('ping')
+        except Exception as e:
+            mark_mongodb_health(False, e)
+            return False
+        mark_mongodb_health(True)
+        prepare_storage_layout()
+    replay_buffered_writes()
+    return True
+
+async def mongodb_heartbeat(interval=None):
+    """MongoDB sağlığını arka planda izler; diğer kodlar yalnızca mongo_health'i okur"""
+    interval = interval or MONGODB_HEARTBEAT_SECONDS
+    while True:
+        try:
+            await run_db(check_mongodb_health)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ MongoDB heartbeat hatası: {e}")
+        await asyncio.sleep(interval)
+
+def legacy_document_fields(symbol, doc):
+    """Eski dokümanın alanları (_id hariç) + symbol"""
+    return {"symbol": symbol, **{key: value for key, value in doc.items() if key not in ("_id", "symbol")}}
+
+def legacy_stop_cooldown_doc(symbol, doc):
+    """Eski stop cooldown dokümanı + until (indeksli bitiş zamanı)"""
+    cooldown_time = doc.get("data")
+    if isinstance(cooldown_time, str):
+        cooldown_time = datetime.fromisoformat(cooldown_time)
+    return {"symbol": symbol, "data": cooldown_time, "until": cooldown_time + timedelta(hours=2) if cooldown_time else None, "timestamp": doc.get("timestamp")}
+
+def legacy_previous_signal_doc(symbol, doc):
+    """Eski önceki sinyal dokümanı; eski kayıtlar save_data_to_db ile "data" altına yazılmıştı"""
+    signals = doc.get("signals") or doc.get("data", {}).get("signals", {})
+    return {"symbol": symbol, "signals": signals, "updated_time": str(datetime.now())}
+
+# Eski "_id" öneki -> doküman dönüştürücü (hedef koleksiyonlar migrate_legacy_storage içinde)
+LEGACY_ID_PREFIXES = {
+    "position_": legacy_document_fields,
+    "active_signal_": legacy_document_fields,
+    "stop_cooldown_": legacy_stop_cooldown_doc,
+    "signal_cooldown_": legacy_document_fields,
+    "previous_signal_": legacy_previous_signal_doc,
+}
+LEGACY_STATE_IDS = ("bot_stats", "cooldown", "previous_signals_initialized", "allowed_users", "admin_users")
+
+def ensure_storage_indexes():
+    """Sıcak sorguların indeksleri (_id = sembol zaten nokta sorgusu indeksidir)"""
+    active_signals_collection.create_index("status")
+    for collection in (stop_cooldowns_collection, signal_cooldowns_collection):
+        collection.create_index("until")
+        # TTL: süresi dolan cooldown dokümanlarını MongoDB kendisi siler (expires_at UTC tutulur)
+        collection.create_index("expires_at", expireAfterSeconds=0)
+    trades_collection.create_index([("symbol", 1), ("closed_at", -1)])
+    trades_collection.create_index([("closed_at", -1)])
+
+def migrate_legacy_storage():
+    """
+    Eski tek koleksiyon düzenindeki dokümanları varlık koleksiyonlarına bir kez kopyalar. Bot yeni
+    düzene yazarken de güvenlidir: kopyalama $setOnInsert ile yapılır, yeni düzende olan doküman
+    ezilmez. Bitince bot_state'e düzen sürümü yazılır; eski dokümanlar geri dönüş için silinmez.
+    """
+    layout = bot_state_collection.find_one({"_id": "storage_layout"})
+    if layout and layout.get("version", 0) >= STORAGE_LAYOUT_VERSION:
+        return 0
+    if mongo_collection.name in ("positions", "active_signals", "stop_cooldowns", "signal_cooldowns", "previous_signals", "bot_state"):
+        print(f"⚠️ MONGODB_COLLECTION ({mongo_collection.name}) yeni düzendeki bir koleksiyonla aynı, taşıma atlanıyor")
+        return 0
+
+    targets = {
+        "position_": positions_collection,
+        "active_signal_": active_signals_collection,
+        "stop_cooldown_": stop_cooldowns_collection,
+        "signal_cooldown_": signal_cooldowns_collection,
+        "previous_signal_": previous_signals_collection,
+    }
+    migrated = 0
+    for prefix, convert in LEGACY_ID_PREFIXES.items():
+        operations = []
+        for doc in mongo_collection.find({"_id": {"$regex": f"^{prefix}"}}):
+            symbol = doc["_id"][len(prefix):]
+            operations.append(UpdateOne({"_id": symbol}, {"$setOnInsert": convert(symbol, doc)}, upsert=True))
+        if operations:
+            targets[prefix].bulk_write(operations, ordered=False)
+            migrated += len(operations)
+            print(f"📦 {len(operations)} {prefix}* dokümanı {targets[prefix].name} koleksiyonuna taşındı")
+
+    for doc_id in LEGACY_STATE_IDS:
+        doc = mongo_collection.find_one({"_id": doc_id})
+        if doc:
+            fields = {key: value for key, value in doc.items() if key != "_id"}
+            bot_state_collection.update_one({"_id": doc_id}, {"$setOnInsert": fields}, upsert=True)
+            migrated += 1
+
+    bot_state_collection.update_one(
+        {"_id": "storage_layout"},
+        {"$set": {"version": STORAGE_LAYOUT_VERSION, "migrated_at": datetime.now(), "migrated_documents": migrated}},
+        upsert=True
+    )
+    print(f"✅ Depolama düzeni v{STORAGE_LAYOUT_VERSION}: {migrated} eski doküman taşındı ({MONGODB_COLLECTION} silinmedi)")
+    return migrated
+
+def start_trade_history():
+    """
+    trades koleksiyonu öncesi kapanışların sayaçlarını (bot_stats) bir kez taban olarak kaydeder:
+    genel /stats toplamı = taban + trades aggregation'ı (kırılımlar yalnızca trades'i kapsar).
+    """
+    if bot_state_collection.find_one({"_id": "trade_history"}, projection={"_id": 1}) is not None:
+        return
+    stats = (bot_state_collection.find_one({"_id": "bot_stats"}) or {}).get("data") or {}
+    baseline = {key: stats.get(key, 0) for key in ("successful_signals", "failed_signals", "total_profit_loss")}
+    if trades_collection.find_one({}, projection={"_id": 1}) is not None:
+        baseline = {key: 0 for key in baseline}  # Geçmiş zaten trades'te
+    bot_state_collection.update_one(
+        {"_id": "trade_history"},
+        {"$setOnInsert": {"baseline": baseline, "started_at": datetime.now()}},
+        upsert=True
+    )
+
+def prepare_storage_layout():
+    """İndeksler ve eski düzen taşıması; süreç başına bir kez (yeniden bağlanmalarda tekrarlanmaz)"""
+    global storage_layout_ready
+    if storage_layout_ready:
+        return
     try:
-        if mongo_collection is None:
-            return connect_mongodb()
-        
-        mongo_client.admin.command('ping')
-        return True
+        ensure_storage_indexes()
+        migrate_legacy_storage()
+        start_trade_history()
+        storage_layout_ready = True
     except Exception as e:
-        print(f"⚠️ MongoDB bağlantısı koptu, yeniden bağlanılıyor: {e}")
-        return connect_mongodb()
+        print(f"❌ Depolama düzeni hazırlanırken hata (bir sonraki bağlantıda tekrar denenecek): {e}")
+
+def ensure_mongodb_connection():
+    """
+    MongoDB kullanılabilir mi (heartbeat'in önbellekteki durumu; ping atmaz). İstemci hiç kurulmadıysa
+    mongodb_ready bağlanmayı dener, bu yüzden async koddan run_db ile çağrılır.
+    """
+    return mongodb_ready()
 
 def load_allowed_users():
     """İzin verilen kullanıcıları ve admin bilgilerini MongoDB'den yükle"""
@@ -557,10 +1588,9 @@ def load_allowed_users():
 def save_allowed_users():
     """İzin verilen kullanıcıları MongoDB'ye kaydet"""
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print("❌ MongoDB bağlantısı kurulamadı, kullanıcılar kaydedilemedi")
-                return False
+        if mongo_db is None and not connect_mongodb():  # Erişilemiyorsa save_data_to_db tampona alır
+            print("❌ MongoDB bağlantısı kurulamadı, kullanıcılar kaydedilemedi")
+            return False
         
         user_data = {
             "user_ids": list(ALLOWED_USERS),
@@ -577,70 +1607,72 @@ def save_allowed_users():
 
 async def set_cooldown_to_db(cooldown_delta: timedelta):
     """Cooldown bitiş zamanını veritabanına kaydeder."""
-    try:
-        if mongo_collection is None:
-            if not connect_mongodb():
+    def write_cooldown_status():
+        try:
+            if not mongodb_ready():
                 print("❌ MongoDB bağlantısı kurulamadı, cooldown kaydedilemedi")
                 return False
         
-        cooldown_until = datetime.now() + cooldown_delta
-        mongo_collection.update_one(
-            {"_id": "cooldown"},
-            {"$set": {"until": cooldown_until, "timestamp": datetime.now()}},
-            upsert=True
-        )
-        print(f"⏳ Cooldown süresi ayarlandı: {cooldown_until}")
-        return True
-    except Exception as e:
-        print(f"❌ Cooldown veritabanına kaydedilirken hata: {e}")
-        return False
+            cooldown_until = datetime.now() + cooldown_delta
+            bot_state_collection.update_one(
+                {"_id": "cooldown"},
+                {"$set": {"until": cooldown_until, "timestamp": datetime.now()}},
+                upsert=True
+            )
+            print(f"⏳ Cooldown süresi ayarlandı: {cooldown_until}")
+            return True
+        except Exception as e:
+            print(f"❌ Cooldown veritabanına kaydedilirken hata: {e}")
+            return False
+    return await run_db(write_cooldown_status)
 
 async def check_cooldown_status():
     """Cooldown durumunu veritabanından kontrol eder ve döner."""
-    try:
-        if mongo_collection is None:
-            if not connect_mongodb():
+    def read_cooldown_status():
+        try:
+            if not mongodb_ready():
                 return None
         
-        doc = mongo_collection.find_one({"_id": "cooldown"})
-        if doc and doc.get("until") and doc["until"] > datetime.now():
-            return doc["until"]
+            doc = bot_state_collection.find_one({"_id": "cooldown"})
+            if doc and doc.get("until") and doc["until"] > datetime.now():
+                return doc["until"]
         
-        return None  # Cooldown yok
-    except Exception as e:
-        print(f"❌ Cooldown durumu kontrol edilirken hata: {e}")
-        return None
+            return None  # Cooldown yok
+        except Exception as e:
+            print(f"❌ Cooldown durumu kontrol edilirken hata: {e}")
+            return None
+    return await run_db(read_cooldown_status)
 
-async def clear_cooldown_status():
+async def clear_cooldown_status(unit_of_work=None):
     """Cooldown durumunu veritabanından temizler."""
-    try:
-        if mongo_collection is None:
-            if not connect_mongodb():
+    if unit_of_work is not None:
+        unit_of_work.delete(bot_state_collection, "cooldown")
+        return True
+    
+    def delete_cooldown_status():
+        try:
+            if not mongodb_ready():
                 print("❌ MongoDB bağlantısı kurulamadı, cooldown temizlenemedi")
                 return False
         
-        mongo_collection.delete_one({"_id": "cooldown"})
-        return True
-    except Exception as e:
-        print(f"❌ Cooldown durumu temizlenirken hata: {e}")
-        return False
+            bot_state_collection.delete_one({"_id": "cooldown"})
+            return True
+        except Exception as e:
+            print(f"❌ Cooldown durumu temizlenirken hata: {e}")
+            return False
+    return await run_db(delete_cooldown_status)
 
-async def set_signal_cooldown_to_db(symbols, cooldown_delta: timedelta):
-    """Belirtilen sembolleri cooldown'a ekler."""
+async def set_signal_cooldown_to_db(symbols, cooldown_delta: timedelta, unit_of_work=None):
+    """Belirtilen sembolleri cooldown'a ekler (bellekte hemen; DB'de tek bulk_write, unit_of_work verilirse onun commit'inde)."""
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print("❌ MongoDB bağlantısı kurulamadı, sinyal cooldown kaydedilemedi")
-                return False
-        
         cooldown_until = datetime.now() + cooldown_delta
         
+        writes = unit_of_work if unit_of_work is not None else MongoUnitOfWork("Sinyal cooldown kaydı")
         for symbol in symbols:
-            mongo_collection.update_one(
-                {"_id": f"signal_cooldown_{symbol}"},
-                {"$set": {"until": cooldown_until, "timestamp": datetime.now()}},
-                upsert=True
-            )
+            global_signal_cooldown.set(symbol, cooldown_until)
+            writes.update(signal_cooldowns_collection, symbol, {"$set": cooldown_expiry_fields(cooldown_until)}, upsert=True)
+        if unit_of_work is None and not await writes.commit_async():
+            return False
         
         print(f"⏳ {len(symbols)} sinyal cooldown'a eklendi: {', '.join(symbols)}")
         return True
@@ -648,105 +1680,41 @@ async def set_signal_cooldown_to_db(symbols, cooldown_delta: timedelta):
         print(f"❌ Sinyal cooldown veritabanına kaydedilirken hata: {e}")
         return False
 
-async def check_signal_cooldown(symbol):
-    """Belirli bir sembolün cooldown durumunu kontrol eder."""
-    try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                return False
-        
-        doc = mongo_collection.find_one({"_id": f"signal_cooldown_{symbol}"})
-        if doc and doc.get("until") and doc["until"] > datetime.now():
-            return True  # Cooldown'da
-        
-        return False  # Cooldown yok
-    except Exception as e:
-        print(f"❌ Sinyal cooldown durumu kontrol edilirken hata: {e}")
-        return False
+def check_signal_cooldown(symbol):
+    """Belirli bir sembolün sinyal cooldown'da olup olmadığını bellekten kontrol eder (DB okuması yok)."""
+    return global_signal_cooldown.is_active(symbol)
 
 async def clear_signal_cooldown(symbol):
     """Belirli bir sembolün cooldown durumunu temizler."""
-    try:
-        if mongo_collection is None:
-            if not connect_mongodb():
+    global_signal_cooldown.discard(symbol)
+    
+    def delete_signal_cooldown():
+        try:
+            if not mongodb_ready():
                 return False
         
-        mongo_collection.delete_one({"_id": f"signal_cooldown_{symbol}"})
-        return True
-    except Exception as e:
-        print(f"❌ Sinyal cooldown temizlenirken hata: {e}")
-        return False
-
-async def get_expired_cooldown_signals():
-    """Cooldown süresi biten sinyalleri döndürür ve temizler."""
-    try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                return []
-        
-        expired_signals = []
-        current_time = datetime.now()
-        
-        # Süresi biten cooldown'ları bul
-        expired_docs = mongo_collection.find({
-            "_id": {"$regex": "^signal_cooldown_"},
-            "until": {"$lte": current_time}
-        })
-        
-        for doc in expired_docs:
-            symbol = doc["_id"].replace("signal_cooldown_", "")
-            expired_signals.append(symbol)
-            # Süresi biten cooldown'ı sil
-            mongo_collection.delete_one({"_id": doc["_id"]})
-        
-        if expired_signals:
-            print(f"🔄 {len(expired_signals)} sinyal cooldown süresi bitti: {', '.join(expired_signals)}")
-        
-        return expired_signals
-    except Exception as e:
-        print(f"❌ Süresi biten cooldown sinyalleri alınırken hata: {e}")
-        return []
+            signal_cooldowns_collection.delete_one({"_id": symbol})
+            return True
+        except Exception as e:
+            print(f"❌ Sinyal cooldown temizlenirken hata: {e}")
+            return False
+    return await run_db(delete_signal_cooldown)
 
-async def get_volumes_for_symbols(symbols):
-    """Belirtilen semboller için hacim verilerini Binance'den çeker."""
-    try:
-        volumes = {}
-        for symbol in symbols:
-            try:
-                ticker_data = client.futures_ticker(symbol=symbol)
-                
-                # API bazen liste döndürüyor, bazen dict
-                if isinstance(ticker_data, list):
-                    if len(ticker_data) == 0:
-                        volumes[symbol] = 0
-                        continue
-                    ticker = ticker_data[0]  # İlk elementi al
-                else:
-                    ticker = ticker_data
-                
-                if ticker and isinstance(ticker, dict) and 'quoteVolume' in ticker:
-                    volumes[symbol] = float(ticker['quoteVolume'])
-                else:
-                    volumes[symbol] = 0
-                    
-            except Exception as e:
-                print(f"⚠️ {symbol} hacim verisi alınamadı: {e}")
-                volumes[symbol] = 0
-        
-        return volumes
-    except Exception as e:
-        print(f"❌ Hacim verileri alınırken hata: {e}")
-        return {symbol: 0 for symbol in symbols}
+def get_expired_cooldown_signals():
+    """Cooldown süresi biten sinyalleri bellekten çıkarır ve döndürür (DB dokümanlarını TTL indeksi siler)."""
+    expired_signals = global_signal_cooldown.pop_expired()
+    if expired_signals:
+        print(f"🔄 {len(expired_signals)} sinyal cooldown süresi bitti: {', '.join(expired_signals)}")
+    return expired_signals
 
 # save_admin_groups fonksiyonu kaldırıldı - artık grup desteği yok
 
 def save_admin_users():
     """Admin kullanıcılarını MongoDB'ye kaydet"""
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print("❌ MongoDB bağlantısı kurulamadı, admin kullanıcıları kaydedilemedi")
-                return False
+        if mongo_db is None and not connect_mongodb():  # Erişilemiyorsa save_data_to_db tampona alır
+            print("❌ MongoDB bağlantısı kurulamadı, admin kullanıcıları kaydedilemedi")
+            return False
         
         admin_data = {
             "admin_ids": list(ADMIN_USERS),
@@ -764,110 +1732,51 @@ def save_admin_users():
 
 def close_mongodb():
     """MongoDB bağlantısını kapat"""
-    global mongo_client
+    global mongo_client, mongo_db
     if mongo_client:
         try:
             mongo_client.close()
+            mongo_client = None
+            mongo_db = None
+            mongo_health["healthy"] = False
             print("✅ MongoDB bağlantısı kapatıldı")
         except Exception as e:
             print(f"⚠️ MongoDB bağlantısı kapatılırken hata: {e}")
 
 def save_positions_to_db(positions):
-    """Pozisyonları MongoDB'ye kaydet"""
+    """Pozisyonları ve aktif sinyal dokümanlarını kaydeder (koleksiyon başına tek bulk_write)"""
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print("❌ MongoDB bağlantısı kurulamadı, pozisyonlar kaydedilemedi")
-                return False
-                
+        unit_of_work = MongoUnitOfWork("Pozisyon kaydı")
         for symbol, position in positions.items():
-            doc_id = f"position_{symbol}"
-            
-            if not position or not isinstance(position, dict):
+            if not isinstance(position, Position):
                 print(f"⚠️ {symbol} - Geçersiz pozisyon verisi, atlanıyor")
                 continue
-                
-            required_fields = ['type', 'target', 'stop', 'open_price', 'leverage']
-            missing_fields = [field for field in required_fields if field not in position]
-            
-            if missing_fields:
-                print(f"⚠️ {symbol} - Eksik alanlar: {missing_fields}, pozisyon atlanıyor")
-                continue
-            
-            try:
-                open_price = float(position['open_price'])
-                target_price = float(position['target'])
-                stop_price = float(position['stop'])
-                
-                if open_price <= 0 or target_price <= 0 or stop_price <= 0:
-                    print(f"⚠️ {symbol} - Geçersiz fiyat değerleri, pozisyon atlanıyor")
-                    print(f"   Giriş: {open_price}, Hedef: {target_price}, Stop: {stop_price}")
-                    continue
-                    
-            except (ValueError, TypeError) as e:
-                print(f"⚠️ {symbol} - Fiyat dönüşüm hatası: {e}, pozisyon atlanıyor")
+            if position.open_price <= 0 or position.target <= 0 or position.stop <= 0:
+                print(f"⚠️ {symbol} - Geçersiz fiyat değerleri, pozisyon atlanıyor")
+                print(f"   Giriş: {position.open_price}, Hedef: {position.target}, Stop: {position.stop}")
                 continue
 
             # Pozisyon verilerini data alanında kaydet (tutarlı yapı için)
-            result = mongo_collection.update_one(
-                {"_id": doc_id},
-                {
-                    "$set": {
-                        "symbol": symbol,
-                        "data": position,  # TÜM POZİSYON VERİSİ BURAYA GELECEK
-                        "timestamp": datetime.now()
-                    }
-                },
-                upsert=True
-            )
+            unit_of_work.update(positions_collection, symbol, {
+                "$set": {
+                    "symbol": symbol,
+                    "data": position.to_doc(),
+                    "timestamp": datetime.now()
+                }
+            }, upsert=True)
             
-            if result.modified_count > 0 or result.upserted_id:
-                print(f"✅ {symbol} pozisyonu güncellendi/eklendi")
-                
-                # Pozisyon kaydedildikten sonra active_signal dokümanını da oluştur
-                try:
-                    # Pozisyon verilerinden active_signal dokümanı oluştur
-                    active_signal_doc = {
-                        "_id": f"active_signal_{symbol}",
-                        "symbol": symbol,
-                        "type": position.get("type", "ALIŞ"),
-                        "entry_price": format_price(position.get("open_price", 0), position.get("open_price", 0)),
-                        "entry_price_float": position.get("open_price", 0),
-                        "target_price": format_price(position.get("target", 0), position.get("open_price", 0)),
-                        "stop_loss": format_price(position.get("stop", 0), position.get("open_price", 0)),
-                        "signals": position.get("signals", {}),
-                        "leverage": position.get("leverage", 10),
-                        "signal_time": position.get("entry_time", datetime.now().strftime('%Y-%m-%d %H:%M')),
-                        "current_price": format_price(position.get("open_price", 0), position.get("open_price", 0)),
-                        "current_price_float": position.get("open_price", 0),
-                        "last_update": str(datetime.now()),
-                        "status": "active",
-                        "saved_at": str(datetime.now())
-                    }
-                    
-                    # Active signal dokümanını kaydet
-                    mongo_collection.update_one(
-                        {"_id": f"active_signal_{symbol}"},
-                        {"$set": active_signal_doc},
-                        upsert=True
-                    )
-                    print(f"✅ {symbol} active_signal dokümanı oluşturuldu")
-                    
-                except Exception as e:
-                    print(f"⚠️ {symbol} active_signal dokümanı oluşturulurken hata: {e}")
-            else:
-                print(f"⚠️ {symbol} pozisyonu güncellenemedi")
-        
-        print(f"✅ {len(positions)} pozisyon MongoDB'ye kaydedildi")
-        
-        # Pozisyon durumlarını güncelle - artık active_signal dokümanları zaten oluşturuldu
-        for symbol in positions.keys():
-            try:
-                # Durumu "active" olarak güncelle
-                update_position_status_atomic(symbol, "active")
-            except Exception as e:
-                print(f"⚠️ {symbol} pozisyon durumu güncellenirken hata: {e}")
+            # Pozisyon verilerinden active_signal dokümanı; "active" durumu (data.status) aynı yazımda verilir
+            active_signal_doc = {
+                "_id": symbol,
+                **ActiveSignal.from_position(position).to_doc(),
+                "data": {"status": "active", "last_updated": str(datetime.now())},
+                "saved_at": str(datetime.now())
+            }
+            unit_of_work.update(active_signals_collection, symbol, {"$set": active_signal_doc}, upsert=True)
         
+        if not unit_of_work.commit():
+            return False
+        print(f"✅ {len(positions)} pozisyon ve aktif sinyal dokümanı MongoDB'ye kaydedildi")
         return True
     except Exception as e:
         print(f"❌ Pozisyonlar MongoDB'ye kaydedilirken hata: {e}")
@@ -876,7 +1785,7 @@ def save_positions_to_db(positions):
 def migrate_old_position_format():
     """Eski pozisyon verilerini yeni formata dönüştürür"""
     try:
-        if mongo_collection is None:
+        if mongo_db is None:
             return False
         
         # Migration fonksiyonu artık gerekli değil - kaldırıldı
@@ -889,44 +1798,25 @@ def migrate_old_position_format():
 
 def load_positions_from_db():
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print("❌ MongoDB bağlantısı kurulamadı, pozisyonlar yüklenemedi")
-                return {}
+        if not mongodb_ready():
+            print("❌ MongoDB bağlantısı kurulamadı, pozisyonlar yüklenemedi")
+            return {}
         
         positions = {}
-        docs = mongo_collection.find({"_id": {"$regex": "^position_"}})
+        docs = positions_collection.find({})
         
         for doc in docs:
-            symbol = doc["_id"].replace("position_", "")
+            symbol = doc["_id"]
             position_data = doc.get('data', doc)
             
             if not position_data or not isinstance(position_data, dict):
                 print(f"⚠️ {symbol} - Geçersiz pozisyon verisi formatı, atlanıyor")
                 continue
             
-            required_fields = ['type', 'target', 'stop', 'open_price', 'leverage']
-            missing_fields = [field for field in required_fields if field not in position_data]
-            
-            if missing_fields:
-                print(f"⚠️ {symbol} - Eksik alanlar: {missing_fields}, pozisyon atlanıyor")
-                continue
-            
             try:
-                open_price = float(position_data['open_price'])
-                target_price = float(position_data['target'])
-                stop_price = float(position_data['stop'])
-                
-                if open_price <= 0 or target_price <= 0 or stop_price <= 0:
-                    print(f"⚠️ {symbol} - Geçersiz fiyat değerleri, pozisyon atlanıyor")
-                    print(f"   Giriş: {open_price}, Hedef: {target_price}, Stop: {stop_price}")
-                    continue
-                    
+                positions[symbol] = Position.from_doc(symbol, position_data)
             except (ValueError, TypeError) as e:
-                print(f"⚠️ {symbol} - Fiyat dönüşüm hatası: {e}, pozisyon atlanıyor")
-                continue
-            
-            positions[symbol] = position_data
+                print(f"⚠️ {symbol} - {e}, pozisyon atlanıyor")
         
         return positions
     except Exception as e:
@@ -936,39 +1826,18 @@ def load_positions_from_db():
 def load_position_from_db(symbol):
     """MongoDB'den tek pozisyon yükler."""
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print("❌ MongoDB bağlantısı kurulamadı, pozisyon yüklenemedi")
-                return None
+        if not mongodb_ready():
+            print("❌ MongoDB bağlantısı kurulamadı, pozisyon yüklenemedi")
+            return None
         
-        doc = mongo_collection.find_one({"_id": f"position_{symbol}"})
+        doc = positions_collection.find_one({"_id": symbol})
         if doc:
             # Veriyi hem yeni (data anahtarı) hem de eski yapıdan (doğrudan doküman) almaya çalış
             position_data = doc.get('data', doc)
             
             if "open_price" in position_data:
                 try:
-                    open_price_raw = position_data.get("open_price", 0)
-                    target_price_raw = position_data.get("target", 0)
-                    stop_loss_raw = position_data.get("stop", 0)
-                    
-                    open_price = float(open_price_raw) if open_price_raw is not None else 0.0
-                    target_price = float(target_price_raw) if target_price_raw is not None else 0.0
-                    stop_loss = float(stop_loss_raw) if stop_loss_raw is not None else 0.0
-
-                    if open_price <= 0 or target_price <= 0 or stop_loss <= 0:
-                        print(f"⚠️ {symbol} - Geçersiz pozisyon fiyatları tespit edildi")
-                        print(f"   Giriş: {open_price}, Hedef: {target_price}, Stop: {stop_loss}")
-                        print(f"   ⚠️ Pozisyon verisi yüklenemedi, ancak silinmedi")
-                        return None
-                    
-                    validated_data = position_data.copy()
-                    validated_data["open_price"] = open_price
-                    validated_data["target"] = target_price
-                    validated_data["stop"] = stop_loss
-                    validated_data["leverage"] = int(position_data.get("leverage", 10))
-                    return validated_data
-                    
+                    return Position.from_doc(symbol, position_data)
                 except (ValueError, TypeError) as e:
                     print(f"❌ {symbol} - Pozisyon verisi dönüşüm hatası: {e}")
                     print(f"   Raw doc: {doc}")
@@ -976,7 +1845,7 @@ def load_position_from_db(symbol):
                     return None
         
         # Aktif sinyal dokümanından veri okuma kısmını kaldır - artık pozisyon dokümanlarından okuyoruz
-        # Bu kısım kaldırıldı çünkü pozisyon verileri artık doğrudan position_ dokümanlarında
+        # Bu kısım kaldırıldı çünkü pozisyon verileri artık doğrudan positions koleksiyonunda
         print(f"❌ {symbol} için hiçbir pozisyon verisi bulunamadı!")
         return None
         
@@ -984,50 +1853,73 @@ def load_position_from_db(symbol):
         print(f"❌ MongoDB'den {symbol} pozisyonu yüklenirken hata: {e}")
         return None
 
-def load_stop_cooldown_from_db():
-    """MongoDB'den stop cooldown verilerini yükler"""
+def cooldown_expiry_fields(cooldown_until):
+    """Cooldown dokümanının bitiş alanları: until (yerel saat, okuma için) ve expires_at (UTC, TTL indeksi için)"""
+    return {"until": cooldown_until, "expires_at": cooldown_until.astimezone(timezone.utc), "timestamp": datetime.now()}
+
+def load_cooldowns_from_db(collection, description, duration=None):
+    """
+    Süresi dolmamış cooldown'ları {symbol: bitiş} olarak okur. Eski formatlar (metin tarih, until
+    alanı olmayan ve yalnızca başlangıç "data" tutan dokümanlar) burada bir kez çevrilir; TTL alanı
+    olmayan dokümanlara expires_at eklenir ki bundan sonra MongoDB silsin.
+    """
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print("❌ MongoDB bağlantısı kurulamadı, stop cooldown yüklenemedi")
-                return {}
-        
-        stop_cooldown = {}
-        docs = mongo_collection.find({"_id": {"$regex": "^stop_cooldown_"}})
-        
-        for doc in docs:
-            symbol = doc["_id"].replace("stop_cooldown_", "")
-            stop_cooldown[symbol] = doc["data"]
-        
-        print(f"📊 MongoDB'den {len(stop_cooldown)} stop cooldown yüklendi")
-        return stop_cooldown
+        if not mongodb_ready():
+            print(f"❌ MongoDB bağlantısı kurulamadı, {description} yüklenemedi")
+            return {}
+        
+        now = datetime.now()
+        cooldowns = {}
+        backfill = []
+        for doc in collection.find({}):
+            cooldown_until = doc.get("until")
+            if cooldown_until is None and duration is not None and doc.get("data"):
+                started = doc["data"]
+                cooldown_until = (datetime.fromisoformat(started) if isinstance(started, str) else started) + duration
+            if isinstance(cooldown_until, str):
+                cooldown_until = datetime.fromisoformat(cooldown_until)
+            if not isinstance(cooldown_until, datetime):
+                continue
+            if "expires_at" not in doc:
+                backfill.append(UpdateOne({"_id": doc["_id"]}, {"$set": cooldown_expiry_fields(cooldown_until)}))
+            if cooldown_until > now:
+                cooldowns[doc["_id"]] = cooldown_until
+        if backfill:
+            collection.bulk_write(backfill, ordered=False)
+            print(f"🔧 {len(backfill)} {description} dokümanına TTL alanı eklendi")
+        
+        print(f"📊 MongoDB'den {len(cooldowns)} {description} yüklendi")
+        return cooldowns
     except Exception as e:
-        print(f"❌ MongoDB'den stop cooldown yüklenirken hata: {e}")
+        print(f"❌ MongoDB'den {description} yüklenirken hata: {e}")
         return {}
 
+def load_stop_cooldown_from_db():
+    """MongoDB'den stop cooldown'ları {symbol: bitiş} olarak yükler"""
+    return load_cooldowns_from_db(stop_cooldowns_collection, "stop cooldown", STOP_COOLDOWN_DURATION)
+
+def load_signal_cooldown_from_db():
+    """MongoDB'den sinyal cooldown'larını {symbol: bitiş} olarak yükler"""
+    return load_cooldowns_from_db(signal_cooldowns_collection, "sinyal cooldown")
+
 def save_previous_signals_to_db(previous_signals):
     """Önceki sinyalleri MongoDB'ye kaydet (sadece ilk çalıştırmada)"""
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print("❌ MongoDB bağlantısı kurulamadı, önceki sinyaller kaydedilemedi")
-                return False
+        if not mongodb_ready():
+            print("❌ MongoDB bağlantısı kurulamadı, önceki sinyaller kaydedilemedi")
+            return False
         
-        existing_doc = mongo_collection.find_one({"_id": "previous_signals_initialized"})
+        existing_doc = bot_state_collection.find_one({"_id": "previous_signals_initialized"})
         if existing_doc:
             print("ℹ️ Önceki sinyaller zaten kaydedilmiş, tekrar kaydedilmiyor")
             return True
         
-        for symbol, signals in previous_signals.items():
-            signal_doc = {
-                "_id": f"previous_signal_{symbol}",
-                "symbol": symbol,
-                "signals": signals,
-                "saved_time": str(datetime.now())
-            }
-            
-            if not save_data_to_db(f"previous_signal_{symbol}", signal_doc, "Önceki Sinyal"):
-                return False
+        operations = [
+            UpdateOne({"_id": symbol}, {"$set": {"symbol": symbol, "signals": signals, "saved_time": str(datetime.now())}}, upsert=True)
+            for symbol, signals in previous_signals.items()
+        ]
+        if operations:
+            previous_signals_collection.bulk_write(operations, ordered=False)
         
         if not save_data_to_db("previous_signals_initialized", {"initialized": True, "initialized_time": str(datetime.now())}, "İlk Kayıt"):
             return False
@@ -1040,14 +1932,13 @@ def save_previous_signals_to_db(previous_signals):
 
 def load_previous_signals_from_db():
     try:
-        def transform_signal(doc):
-            symbol = doc["_id"].replace("previous_signal_", "")
-            if "signals" in doc:
-                return {symbol: doc["signals"]}
-            else:
-                return {symbol: doc}
+        if not mongodb_ready():
+            print("❌ MongoDB bağlantısı kurulamadı, önceki sinyaller yüklenemedi")
+            return {}
         
-        return load_data_by_pattern("^previous_signal_", "signals", "önceki sinyal", transform_signal)
+        result = {doc["_id"]: doc.get("signals", {}) for doc in previous_signals_collection.find({})}
+        print(f"✅ MongoDB'den {len(result)} önceki sinyal yüklendi")
+        return result
     except Exception as e:
         print(f"❌ MongoDB'den önceki sinyaller yüklenirken hata: {e}")
         return {}
@@ -1056,18 +1947,18 @@ def is_first_run():
     """İlk çalıştırma mı kontrol et"""
     def check_first_run():
         # Önceki sinyallerin kaydedilip kaydedilmediğini kontrol et
-        existing_doc = mongo_collection.find_one({"_id": "previous_signals_initialized"})
+        existing_doc = bot_state_collection.find_one({"_id": "previous_signals_initialized"})
         if existing_doc is None:
             return True  # İlk çalıştırma
         
-        # Pozisyonların varlığını da kontrol et
-        position_count = mongo_collection.count_documents({"_id": {"$regex": "^position_"}})
+        # Pozisyonların varlığını da kontrol et (koleksiyon metadatasından, tarama yok)
+        position_count = positions_collection.estimated_document_count()
         if position_count > 0:
             print(f"📊 MongoDB'de {position_count} aktif pozisyon bulundu, yeniden başlatma olarak algılanıyor")
             return False  # Yeniden başlatma
         
         # Önceki sinyallerin varlığını kontrol et
-        signal_count = mongo_collection.count_documents({"_id": {"$regex": "^previous_signal_"}})
+        signal_count = previous_signals_collection.estimated_document_count()
         if signal_count > 0:
             print(f"📊 MongoDB'de {signal_count} önceki sinyal bulundu, yeniden başlatma olarak algılanıyor")
             return False  # Yeniden başlatma
@@ -1078,20 +1969,14 @@ def is_first_run():
 
 def update_previous_signal_in_db(symbol, signals):
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                return False
-        
-        signal_doc = {
-            "_id": f"previous_signal_{symbol}",
-            "symbol": symbol,
-            "signals": signals,
-            "updated_time": str(datetime.now())
-        }
-        
-        if not save_data_to_db(f"previous_signal_{symbol}", signal_doc, "Önceki Sinyal"):
+        if not mongodb_ready():
             return False
         
+        previous_signals_collection.update_one(
+            {"_id": symbol},
+            {"$set": {"symbol": symbol, "signals": signals, "updated_time": str(datetime.now())}},
+            upsert=True
+        )
         return True
     except Exception as e:
         print(f"❌ Önceki sinyal güncellenirken hata: {e}")
@@ -1099,14 +1984,14 @@ def update_previous_signal_in_db(symbol, signals):
 
 def remove_position_from_db(symbol):
     def delete_position():
-        mongo_collection.delete_one({"_id": f"position_{symbol}"})
+        positions_collection.delete_one({"_id": symbol})
         print(f"✅ {symbol} pozisyonu MongoDB'den kaldırıldı")
         return True
     
     return safe_mongodb_operation(delete_position, f"{symbol} pozisyonu kaldırma", False)
 
 app = None
-global_stats = {
+DEFAULT_STATS = {
     "total_signals": 0,
     "successful_signals": 0,
     "failed_signals": 0,
@@ -1114,16 +1999,179 @@ global_stats = {
     "active_signals_count": 0,
     "tracked_coins_count": 0
 }
+global_stats = dict(DEFAULT_STATS)
 global_active_signals = {}
 global_waiting_signals = {} 
 global_successful_signals = {}
 global_failed_signals = {}
 global_positions = {} 
-global_stop_cooldown = {} 
+global_position_events = []  # [(olay, symbol, veri)] - pozisyon motoru her turda boşaltır
+unsaved_positions = set()  # Motorda izlenen ama DB'ye yazılamamış pozisyonlar (motor her turda tekrar dener)
+position_engine_loaded = False  # Pozisyonlar bu süreçte en az bir kez DB'den yüklendi
 global_allowed_users = set() 
 global_admin_users = set() 
 global_last_signal_scan_time = None
 
+# ============================================================================
+# REPOSITORY: istatistikler ve cooldown'lar için süreç içi tek kaynak
+# ============================================================================
+# Başlangıçta (ve /reload ile) DB'den bir kez yüklenir; okumalar bellekten yapılır, her değişiklik
+# DB'ye hemen yazılır (write-through). Pozisyonlar ve aktif sinyaller pozisyon motorundadır.
+
+STOP_COOLDOWN_DURATION = timedelta(hours=2)  # COOLDOWN_HOURS
+SIGNAL_COOLDOWN_DURATION = timedelta(minutes=30)  # COOLDOWN_MINUTES
+
+class CooldownSchedule:
+    """
+    Sembol -> cooldown bitiş zamanı. Kontrol sözlükten O(1) yapılır; bitiş zamanları bir min-heap'te
+    tutulur ve süresi dolanlar heap'in başından O(log n) ile alınır. Yenilenen veya çıkarılan sembolün
+    eski heap kaydı silinmez, alınırken sözlükteki bitişle eşleşmezse atlanır.
+    DB'deki dokümanları süreleri dolunca MongoDB TTL indeksi (expires_at) kendisi siler.
+    """
+
+    def __init__(self, entries=None):
+        self.replace(entries or {})
+
+    def __len__(self):
+        return len(self.until)
+
+    def __contains__(self, symbol):
+        return self.is_active(symbol)
+
+    def keys(self):
+        return self.until.keys()
+
+    def items(self):
+        return self.until.items()
+
+    def replace(self, entries):
+        """Tüm cooldown'ları verilen {symbol: bitiş} ile değiştirir"""
+        self.until = dict(entries)
+        self.heap = [(until, symbol) for symbol, until in self.until.items()]
+        heapq.heapify(self.heap)
+
+    def set(self, symbol, until):
+        """Sembolün cooldown bitişini ayarlar (varsa yeniler)"""
+        self.until[symbol] = until
+        heapq.heappush(self.heap, (until, symbol))
+        if len(self.heap) > 2 * len(self.until) + 64:  # Atlanacak eski kayıtlar birikmesin
+            self.replace(self.until)
+
+    def discard(self, symbol):
+        """Sembolü cooldown'dan çıkarır"""
+        return self.until.pop(symbol, None) is not None
+
+    def is_active(self, symbol, now=None):
+        until = self.until.get(symbol)
+        return until is not None and until > (now or datetime.now())
+
+    def remaining(self, symbol, now=None):
+        until = self.until.get(symbol)
+        return max(until - (now or datetime.now()), timedelta(0)) if until else timedelta(0)
+
+    def pop_expired(self, now=None):
+        """Süresi dolan sembolleri çıkarır ve döndürür"""
+        now = now or datetime.now()
+        expired = []
+        while self.heap and self.heap[0][0] <= now:
+            until, symbol = heapq.heappop(self.heap)
+            if self.until.get(symbol) == until:
+                del self.until[symbol]
+                expired.append(symbol)
+        return expired
+
+global_stop_cooldown = CooldownSchedule()  # {symbol: bitiş} - stop olan semboller
+global_signal_cooldown = CooldownSchedule()  # {symbol: bitiş} - eşik aşımında ertelenen sinyaller
+repository_loaded = False  # Repository bu süreçte en az bir kez DB'den yüklendi (tarama kesintide bellekle sürebilir)
+
+def mongodb_state_current():
+    """
+    DB'deki durum okunabilir mi: bağlantı var ve tampondaki (journal) yazımların hepsi aktarıldı.
+    Aksi halde DB bellekten eskidir; yeniden yükleme belleği eski durumla ezmemeli.
+    """
+    if mongodb_ready() and mongo_write_buffer:
+        replay_buffered_writes()
+    return mongodb_ready() and not mongo_write_buffer
+
+def load_repository_state():
+    """
+    İstatistikleri ve cooldown'ları DB'den okur; belleği değiştirmez (DB thread havuzunda çalışabilir).
+    DB erişilemiyorsa veya aktarılmamış yazım varsa None döner.
+    """
+    if not mongodb_state_current():
+        return None
+    stats = dict(DEFAULT_STATS)
+    stats.update(load_stats_from_db() or {})
+    return stats, load_stop_cooldown_from_db(), load_signal_cooldown_from_db()
+
+def apply_repository_state(state):
+    """Okunan durumu bellekteki repository'ye yazar (event loop üzerinde); state None ise bellek korunur"""
+    global repository_loaded
+    if state is None:
+        print(f"⚠️ MongoDB erişilemiyor veya aktarılmamış yazım var (tamponda {len(mongo_write_buffer)}), repository bellekteki durumla devam ediyor")
+        return False
+    stats, stop_cooldowns, signal_cooldowns = state
+    global_stats.clear()
+    global_stats.update(stats)
+    global_stop_cooldown.replace(stop_cooldowns)
+    global_signal_cooldown.replace(signal_cooldowns)
+    repository_loaded = True
+    print(f"📂 Repository yüklendi: istatistikler, {len(global_stop_cooldown)} stop cooldown, {len(global_signal_cooldown)} sinyal cooldown")
+    return True
+
+def reload_repository():
+    """İstatistikleri ve stop cooldown'ları DB'den belleğe yeniden yükler"""
+    return apply_repository_state(load_repository_state())
+
+async def reload_repository_async():
+    """reload_repository'nin event loop'u bloklamayan hali (okuma DB thread havuzunda)"""
+    return apply_repository_state(await run_db(load_repository_state))
+
+STATS_GAUGE_FIELDS = ("active_signals_count", "tracked_coins_count")  # Anlık değerler; sayaçlar update_stats_atomic/record_trade ile $inc'lenir
+
+def save_stats(unit_of_work=None):
+    """
+    Bellekteki anlık göstergeleri (STATS_GAUGE_FIELDS) noktalı $set ile yazar; $inc'lenen sayaçlar
+    (sinyal/kapanış sayıları, kâr/zarar) burada yazılmaz, böylece eşzamanlı artışlar ezilmez.
+    unit_of_work verilirse turun son değeri commit'te tek güncelleme olarak yazılır.
+    """
+    update = {"$set": {**{f"data.{key}": global_stats.get(key, 0) for key in STATS_GAUGE_FIELDS}, "updated_at": str(datetime.now())}}
+    writes = unit_of_work if unit_of_work is not None else MongoUnitOfWork("İstatistik kaydı")
+    writes.update(bot_state_collection, "bot_stats", update, upsert=True, coalesce=True)
+    return True if unit_of_work is not None else writes.commit()
+
+def add_stop_cooldown(symbol, cooldown_time=None, unit_of_work=None):
+    """Sembolü stop cooldown'a ekler; yalnızca o sembolün dokümanı yazılır"""
+    cooldown_time = cooldown_time or datetime.now()
+    cooldown_until = cooldown_time + STOP_COOLDOWN_DURATION
+    global_stop_cooldown.set(symbol, cooldown_until)
+    update = {"$set": {"data": cooldown_time, **cooldown_expiry_fields(cooldown_until)}}
+    if unit_of_work is not None:
+        unit_of_work.update(stop_cooldowns_collection, symbol, update, upsert=True)
+        return True
+
+    def upsert_cooldown():
+        stop_cooldowns_collection.update_one({"_id": symbol}, update, upsert=True)
+        return True
+    return safe_mongodb_operation(upsert_cooldown, f"{symbol} stop cooldown kaydı", False)
+
+def remove_stop_cooldowns(symbols, unit_of_work=None):
+    """Sembolleri stop cooldown'dan çıkarır; yalnızca bu sembollerin dokümanları silinir"""
+    symbols = list(symbols)
+    for symbol in symbols:
+        global_stop_cooldown.discard(symbol)
+    if not symbols:
+        return True
+    if unit_of_work is not None:
+        for symbol in symbols:
+            unit_of_work.delete(stop_cooldowns_collection, symbol)
+        return True
+
+    def delete_cooldowns():
+        stop_cooldowns_collection.delete_many({"_id": {"$in": symbols}})
+        return True
+    return safe_mongodb_operation(delete_cooldowns, "stop cooldown silme", False)
+
 def is_authorized_chat(update):
     """Kullanıcının yetkili olduğu sohbet mi kontrol et"""
     chat = update.effective_chat
@@ -1240,6 +2288,7 @@ async def help_command(update, context):
 📊 **Temel Komutlar:**
 /help - Bu yardım mesajını göster
 /stats - İstatistikleri göster
+/stats <sembol> <7d> - Sembol ve/veya dönem bazında işlem istatistikleri
 /active - Aktif sinyalleri göster
 /test - Test sinyali gönder
 
@@ -1255,6 +2304,7 @@ async def help_command(update, context):
 
 🧹 **Temizleme Komutları:**
 /clearall - Tüm verileri temizle (pozisyonlar, önceki sinyaller, bekleyen kuyruklar, istatistikler)
+/reload - Bellekteki durumu DB'den yeniden yükle (DB elle değiştirildiyse)
 
 🔧 **Özel Yetkiler:**
 • Tüm komutlara erişim
@@ -1269,6 +2319,7 @@ async def help_command(update, context):
 📊 **Temel Komutlar:**
 /help - Bu yardım mesajını göster
 /stats - İstatistikleri göster
+/stats <sembol> <7d> - Sembol ve/veya dönem bazında işlem istatistikleri
 /active - Aktif sinyalleri göster
 /test - Test sinyali gönder
 
@@ -1361,6 +2412,89 @@ async def test_command(update, context):
     await send_signal_to_all_users(test_message)
     await update.message.reply_text("✅ Test sinyali başarıyla gönderildi!")
 
+def format_excursion_stats(excursions):
+    """bot_stats'taki kapanış kayıtlarından MAE/MFE dağılımı metni (ek sorgu yok); kayıt yoksa boş"""
+    if not excursions:
+        return ""
+    lines = [f"\n📐 **MAE/MFE (son {len(excursions)} kapanış):**"]
+    groups = [("Tümü", excursions)]
+    groups += [(label, [e for e in excursions if e.get("result") == result]) for label, result in (("TP", "take_profit"), ("SL", "stop_loss"))]
+    for label, records in groups:
+        if not records:
+            continue
+        mfe = np.array([float(e.get("mfe_percent", 0)) for e in records])
+        mae = np.array([float(e.get("mae_percent", 0)) for e in records])
+        lines.append(
+            f"• {label} ({len(records)}): MFE ort %{mfe.mean():.2f} / medyan %{np.median(mfe):.2f} / p90 %{np.percentile(mfe, 90):.2f}, "
+            f"MAE ort %{mae.mean():.2f} / medyan %{np.median(mae):.2f} / p90 %{np.percentile(mae, 90):.2f}"
+        )
+    return "\n".join(lines)
+
+def format_loop_lag_stats():
+    """Event loop gecikmesi özeti (son LOOP_LAG_WINDOW ölçüm); ölçüm yoksa boş"""
+    if not loop_lag_samples:
+        return ""
+    lags = np.array(loop_lag_samples)
+    return (
+        f"\n⏱️ **Event Loop Gecikmesi (son {len(lags)} ölçüm):**\n"
+        f"• medyan {np.median(lags):.1f} ms / p99 {np.percentile(lags, 99):.1f} ms / max {lags.max():.1f} ms\n"
+        f"• Başlangıçtan beri: max {loop_lag_stats['max_ms']:.0f} ms, {LOOP_LAG_WARN_MS:.0f} ms üstü {loop_lag_stats['over_threshold']} kez"
+    )
+
+def format_mongodb_health():
+    """Heartbeat'in son MongoDB durumu ve tamponda bekleyen yazım sayısı"""
+    if mongo_health["checked_at"] is None:
+        return ""
+    if mongo_health["healthy"]:
+        state = f"✅ erişilebilir (son ping {mongo_health['checked_at'].strftime('%H:%M:%S')})"
+    else:
+        last_ok = mongo_health["last_ok"].strftime('%H:%M:%S') if mongo_health["last_ok"] else "-"
+        state = f"⚠️ erişilemiyor ({mongo_health['failures']} ardışık hata, son başarılı {last_ok})"
+    buffered = len(mongo_write_buffer)
+    limit_note = f" (⚠️ {MONGODB_WRITE_BUFFER_LIMIT} sınırı aşıldı)" if buffered > MONGODB_WRITE_BUFFER_LIMIT else ""
+    return f"\n🗄️ **MongoDB:** {state}, tamponda {buffered} yazım{limit_note}"
+
+def parse_stats_args(args):
+    """/stats argümanları: sembol (SOLUSDT) ve/veya dönem (7d, 30g); (sembol, gün) döndürür"""
+    symbol, days = None, None
+    for arg in args or []:
+        match = re.fullmatch(r'(\d+)[dgDG]', arg.strip())
+        if match:
+            days = int(match.group(1)) or None
+        elif arg.strip():
+            symbol = arg.strip().upper()
+    return symbol, days
+
+def format_trade_breakdown(trade_stats, show_symbols=True):
+    """Aggregation sonucunun sembol ve gün kırılımları; trades boşsa boş"""
+    if not trade_stats or not trade_stats["trades"]:
+        return ""
+    lines = []
+    if show_symbols and trade_stats["by_symbol"]:
+        lines.append(f"\n🏆 **Sembol Bazında (ilk {TRADE_STATS_TOP_SYMBOLS}, kâr/zarara göre):**")
+        lines += [f"• {row['_id']}: {row['trades']} kapanış ({row['successful']} TP / {row['failed']} SL), ${row['profit_loss_usd']:.2f}" for row in trade_stats["by_symbol"]]
+    if trade_stats["by_period"]:
+        lines.append(f"\n📅 **Günlük (son {len(trade_stats['by_period'])} gün):**")
+        lines += [f"• {row['_id']}: {row['trades']} kapanış ({row['successful']} TP / {row['failed']} SL), ${row['profit_loss_usd']:.2f}" for row in trade_stats["by_period"]]
+    return "\n".join(lines)
+
+def format_filtered_trade_stats(symbol, days, trade_stats):
+    """/stats <sembol> / <gün> yanıtı: filtrelenmiş kapanış özeti ve günlük kırılım"""
+    scope = " / ".join(part for part in (symbol, f"son {days} gün" if days else None) if part)
+    if trade_stats is None:
+        return f"📊 **İşlem İstatistikleri ({scope}):**\n\n⚠️ MongoDB erişilemiyor, işlem geçmişi okunamadı."
+    if not trade_stats["trades"]:
+        return f"📊 **İşlem İstatistikleri ({scope}):**\n\nBu filtre için kapanmış işlem yok."
+    closed = trade_stats["successful_signals"] + trade_stats["failed_signals"]
+    success_rate = trade_stats["successful_signals"] / closed * 100 if closed else 0
+    return f"""📊 **İşlem İstatistikleri ({scope}):**
+
+• Kapanış: {trade_stats['trades']} ({trade_stats['successful_signals']} TP / {trade_stats['failed_signals']} SL)
+• Başarı Oranı: %{success_rate:.1f}
+• Kar/Zarar (100$ yatırım): ${trade_stats['total_profit_loss']:.2f}
+• Ortalama MFE/MAE: %{trade_stats['avg_mfe_percent'] or 0:.2f} / %{trade_stats['avg_mae_percent'] or 0:.2f}
+{format_trade_breakdown(trade_stats, show_symbols=not symbol)}"""
+
 async def stats_command(update, context):
     if not update.effective_user:
         return
@@ -1370,7 +2504,16 @@ async def stats_command(update, context):
     if not is_admin(user_id):
         return 
     
-    stats = load_stats_from_db() or global_stats
+    symbol_filter, days = parse_stats_args(getattr(context, "args", None))
+    if symbol_filter or days:
+        await send_command_response(update, format_filtered_trade_stats(symbol_filter, days, await get_trade_stats(symbol_filter, days)))
+        return
+    
+    # Kapanış sayaçları ve kâr/zarar trades aggregation'ından (önbellekli); DB erişilemiyorsa bellekteki sayaçlar
+    trade_stats = await get_trade_stats()
+    stats = dict(global_stats)
+    if trade_stats is not None:
+        stats.update({key: trade_stats[key] for key in ("successful_signals", "failed_signals", "total_profit_loss")})
     if not stats:
         stats_text = "📊 **Bot İstatistikleri:**\n\nHenüz istatistik verisi yok."
     else:
@@ -1401,59 +2544,40 @@ async def stats_command(update, context):
 💰 **Kar/Zarar (100$ yatırım):**
 • Toplam: ${stats.get('total_profit_loss', 0):.2f}
 • Başarı Oranı: %{success_rate:.1f}
+{format_trade_breakdown(trade_stats)}
+{format_excursion_stats(stats.get('excursions') or [])}
+{format_loop_lag_stats()}
+{format_mongodb_health()}
 
 🕒 **Son Güncelleme:** {datetime.now().strftime('%H:%M:%S')}
 {status_emoji} **Bot Durumu:** {safe_status_text}"""
     
     # Aktif sinyallerin detaylı bilgilerini ekle
-    active_signals = load_active_signals_from_db() or global_active_signals
+    active_signals = global_active_signals
     if active_signals:
         detailed_signals_text = "\n\n📊 **Aktif Sinyal Detayları:**\n"
         for symbol, signal in active_signals.items():
             try:
-                entry_price = float(str(signal.get('entry_price', 0)).replace('$', '').replace(',', ''))
-                current_price = float(str(signal.get('current_price', 0)).replace('$', '').replace(',', ''))
+                entry_price = signal.entry_price
+                current_price = signal.current_price
                 
-                # Yüzde değişimi hesapla
+                # Yüzde değişimi hesapla (SATIŞ'ta fiyat düşerse kar, ALIŞ'ta yükselirse kar)
                 if entry_price > 0:
-                    signal_type = signal.get('type', 'ALIŞ')
-                    if signal_type == "SATIŞ" or signal_type == "SATIS":
-                        # SATIŞ sinyali için: Fiyat düşerse kar, yükselirse zarar
-                        percent_change = ((entry_price - current_price) / entry_price) * 100
-                    else:
-                        # ALIŞ sinyali için: Fiyat yükselirse kar, düşerse zarar
-                        percent_change = ((current_price - entry_price) / entry_price) * 100
-                    
+                    percent_change = signal.side.change_percent(entry_price, current_price)
                     change_emoji = "🟢" if percent_change >= 0 else "🔴"
                     change_text = f"{percent_change:+.2f}%"
                 else:
                     change_emoji = "⚪"
                     change_text = "0.00%"
                 
-                # Max/Min değerleri al (eğer varsa)
-                max_price = signal.get('max_price', 0)
-                min_price = signal.get('min_price', 0)
-                
-                if max_price and min_price:
-                    signal_type = signal.get('type', 'ALIŞ')
-                    if signal_type == "SATIŞ" or signal_type == "SATIS":
-                        # SATIŞ sinyali için max/min hesaplama
-                        max_percent = ((entry_price - float(str(max_price).replace('$', '').replace(',', ''))) / entry_price) * 100
-                        min_percent = ((entry_price - float(str(min_price).replace('$', '').replace(',', ''))) / entry_price) * 100
-                    else:
-                        # ALIŞ sinyali için max/min hesaplama
-                        max_percent = ((float(str(max_price).replace('$', '').replace(',', '')) - entry_price) / entry_price) * 100
-                        min_percent = ((float(str(min_price).replace('$', '').replace(',', '')) - entry_price) / entry_price) * 100
-                    
+                if entry_price > 0 and signal.max_price and signal.min_price:
+                    max_percent = signal.side.change_percent(entry_price, signal.max_price)
+                    min_percent = signal.side.change_percent(entry_price, signal.min_price)
                     max_min_text = f" MAX: ({max_percent:+.2f}%) / MİN: ({min_percent:+.2f}%)"
                 else:
                     max_min_text = ""
                 
-                # Sinyal tipini belirle
-                signal_type = signal.get('type', 'ALIŞ')
-                type_emoji = "🟢" if signal_type == "ALIŞ" else "🔴"
-                
-                detailed_signals_text += f"{change_emoji} {symbol} ({signal_type}):\nGiriş: ${entry_price:.6f}\nGüncel: ${current_price:.6f}\nDurum: ({change_text}){max_min_text}\n\n"
+                detailed_signals_text += f"{change_emoji} {symbol} ({signal.side.value}):\nGiriş: ${entry_price:.6f}\nGüncel: ${current_price:.6f}\nDurum: ({change_text}){max_min_text}\n\n"
                 
             except Exception as e:
                 print(f"❌ {symbol} sinyal detayı hesaplanamadı: {e}")
@@ -1485,7 +2609,7 @@ async def active_command(update, context):
     if user_id != BOT_OWNER_ID and user_id not in ALLOWED_USERS and user_id not in ADMIN_USERS:
         return  # İzin verilmeyen kullanıcılar için hiçbir yanıt verme
     
-    active_signals = load_active_signals_from_db() or global_active_signals
+    active_signals = global_active_signals
     if not active_signals:
         active_text = "📈 **Aktif Sinyaller:**\n\nHenüz aktif sinyal yok."
     else:
@@ -1493,13 +2617,13 @@ async def active_command(update, context):
         for symbol, signal in active_signals.items():
             # Markdown formatını güvenli hale getir
             safe_symbol = str(symbol).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-            safe_type = str(signal['type']).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-            safe_entry = str(signal['entry_price']).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-            safe_target = str(signal['target_price']).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-            safe_stop = str(signal['stop_loss']).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-            safe_current = str(signal['current_price']).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-            safe_leverage = str(signal['leverage']).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-            safe_time = str(signal['signal_time']).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
+            safe_type = signal.side.value
+            safe_entry = format_price(signal.entry_price, signal.entry_price)
+            safe_target = format_price(signal.target_price, signal.entry_price)
+            safe_stop = format_price(signal.stop_loss, signal.entry_price)
+            safe_current = format_price(signal.current_price, signal.entry_price)
+            safe_leverage = signal.leverage
+            safe_time = str(signal.signal_time).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
             
             active_text += f"""🔹 **{safe_symbol}** ({safe_type})
 • Giriş: {safe_entry}
@@ -1554,7 +2678,7 @@ async def adduser_command(update, context):
         return
     
     ALLOWED_USERS.add(new_user_id)
-    save_allowed_users()  # MongoDB'ye kaydet
+    await run_db(save_allowed_users)  # MongoDB'ye kaydet
     await send_command_response(update, f"✅ Kullanıcı {new_user_id} başarıyla eklendi ve kalıcı olarak kaydedildi.")
 
 async def removeuser_command(update, context):
@@ -1575,7 +2699,7 @@ async def removeuser_command(update, context):
     
     if remove_user_id in ALLOWED_USERS:
         ALLOWED_USERS.remove(remove_user_id)
-        save_allowed_users()  # MongoDB'ye kaydet
+        await run_db(save_allowed_users)  # MongoDB'ye kaydet
         await send_command_response(update, f"✅ Kullanıcı {remove_user_id} başarıyla çıkarıldı ve kalıcı olarak kaydedildi.")
     else:
         await send_command_response(update, f"❌ Kullanıcı {remove_user_id} zaten izin verilen kullanıcılar listesinde yok.")
@@ -1619,7 +2743,7 @@ async def adminekle_command(update, context):
         return
     
     ADMIN_USERS.add(new_admin_id)
-    save_admin_users()  # MongoDB'ye kaydet
+    await run_db(save_admin_users)  # MongoDB'ye kaydet
     await send_command_response(update, f"✅ Admin {new_admin_id} başarıyla eklendi ve kalıcı olarak kaydedildi.")
 
 async def adminsil_command(update, context):
@@ -1640,7 +2764,7 @@ async def adminsil_command(update, context):
     
     if remove_admin_id in ADMIN_USERS:
         ADMIN_USERS.remove(remove_admin_id)
-        save_admin_users()  # MongoDB'ye kaydet
+        await run_db(save_admin_users)  # MongoDB'ye kaydet
         await send_command_response(update, f"✅ Admin {remove_admin_id} başarıyla silindi ve kalıcı olarak kaydedildi.")
     else:
         await send_command_response(update, f"❌ Admin {remove_admin_id} zaten admin listesinde yok.")
@@ -1747,6 +2871,7 @@ async def setup_bot():
     app.add_handler(CommandHandler("adminsil", adminsil_command))
     app.add_handler(CommandHandler("listadmins", listadmins_command))
     app.add_handler(CommandHandler("clearall", clear_all_command))
+    app.add_handler(CommandHandler("reload", reload_command))
     app.add_handler(CommandHandler("migrate", migrate_command))
 
     
@@ -1943,7 +3068,7 @@ async def async_get_historical_data(symbol, interval, lookback):
     if not symbol.endswith('USDT'):
         symbol = symbol + 'USDT'
     
-    url = f"https://fapi.binance.com/fapi/v1/klines?symbol={symbol}&interval={interval}&limit={lookback}"
+    url = f"{BINANCE_FUTURES_URL}/fapi/v1/klines?symbol={symbol}&interval={interval}&limit={lookback}"
     try:
         async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=10)) as session:
             async with session.get(url, ssl=False) as resp:
@@ -1955,6 +3080,10 @@ async def async_get_historical_data(symbol, interval, lookback):
     except Exception as e:
         raise Exception(f"Futures veri çekme hatası: {symbol} - {interval} - {str(e)}")
     
+    return klines_to_dataframe(klines)
+
+def klines_to_dataframe(klines):
+    """Binance ham kline listesini OHLCV DataFrame'ine dönüştürür"""
     df = pd.DataFrame(klines, columns=[
         'timestamp', 'open', 'high', 'low', 'close', 'volume',
         'close_time', 'quote_volume', 'trades', 'taker_buy_base',
@@ -1968,8 +3097,8 @@ async def async_get_historical_data(symbol, interval, lookback):
     df['open'] = df['open'].astype(float)
     return df
 
-def calculate_full_pine_signals(df, timeframe):
-    is_higher_tf = timeframe in ['5m']  # Sadece 5m yüksek timeframe olarak kabul edilir
+def get_pine_parameters(timeframe):
+    """Timeframe'e göre Pine indikatör parametrelerini döndürür"""
     is_weekly = False  # Artık haftalık timeframe kullanılmıyor
     is_daily = False   # Artık günlük timeframe kullanılmıyor
     is_4h = False      # Artık 4h timeframe kullanılmıyor
@@ -2096,6 +3225,53 @@ def calculate_full_pine_signals(df, timeframe):
         rsi_overbought = 60
         rsi_oversold = 40
 
+    # Supertrend ATR böleni (supertrend_dynamic ile aynı sıra)
+    if is_weekly:
+        supertrend_divisor = 2
+    elif is_daily:
+        supertrend_divisor = 1.2
+    elif is_4h:
+        supertrend_divisor = 1.3
+    elif is_2h:
+        supertrend_divisor = 1.4
+    elif is_1h:
+        supertrend_divisor = 1.45
+    elif timeframe == '8h':
+        supertrend_divisor = 1.35
+    else:
+        supertrend_divisor = 1.5
+
+    return {
+        "rsi_length": rsi_length,
+        "macd_fast": macd_fast,
+        "macd_slow": macd_slow,
+        "macd_signal": macd_signal,
+        "short_ma_period": short_ma_period,
+        "long_ma_period": long_ma_period,
+        "mfi_length": mfi_length,
+        "fib_lookback": fib_lookback,
+        "atr_period": atr_period,
+        "volume_multiplier": volume_multiplier,
+        "rsi_overbought": rsi_overbought,
+        "rsi_oversold": rsi_oversold,
+        "supertrend_divisor": supertrend_divisor,
+    }
+
+def calculate_full_pine_signals(df, timeframe):
+    params = get_pine_parameters(timeframe)
+    rsi_length = params["rsi_length"]
+    macd_fast = params["macd_fast"]
+    macd_slow = params["macd_slow"]
+    macd_signal = params["macd_signal"]
+    short_ma_period = params["short_ma_period"]
+    long_ma_period = params["long_ma_period"]
+    mfi_length = params["mfi_length"]
+    fib_lookback = params["fib_lookback"]
+    atr_period = params["atr_period"]
+    volume_multiplier = params["volume_multiplier"]
+    rsi_overbought = params["rsi_overbought"]
+    rsi_oversold = params["rsi_oversold"]
+
     # EMA 200 ve trend
     df['ema200'] = ta.trend.EMAIndicator(df['close'], window=200).ema_indicator()
     df['trend_bullish'] = df['close'] > df['ema200']
@@ -2112,21 +3288,8 @@ def calculate_full_pine_signals(df, timeframe):
         atr = ta.volatility.AverageTrueRange(df['high'], df['low'], df['close'], window=atr_period).average_true_range()
         atr_dynamic = atr.rolling(window=5).mean()  # SMA(ATR, 5)
         
-        if is_weekly:
-            multiplier = atr_dynamic / 2
-        elif is_daily:
-            multiplier = atr_dynamic / 1.2
-        elif is_4h:
-            multiplier = atr_dynamic / 1.3
-        elif is_2h:
-            multiplier = atr_dynamic / 1.4
-        elif is_1h:
-            multiplier = atr_dynamic / 1.45
-        elif timeframe == '8h':
-            multiplier = atr_dynamic / 1.35
-        else:
-            multiplier = atr_dynamic / 1.5
-            
+        multiplier = atr_dynamic / params["supertrend_divisor"]
+
         upperband = hl2 + multiplier
         lowerband = hl2 - multiplier
         direction = [1]
@@ -2209,32 +3372,444 @@ def calculate_full_pine_signals(df, timeframe):
         )
     ) & df['fib_in_range']
 
-    sell_signal = (
-        crossunder(df['macd'], df['macd_signal']) |
-        (
-            (df['rsi'] > rsi_overbought) &
-            (df['supertrend_dir'] == -1) &
-            df['ma_bearish'] &
-            df['enough_volume'] &
-            df['mfi_bearish'] &
-            df['trend_bearish']
-        )
-    ) & df['fib_in_range']
+    sell_signal = (
+        crossunder(df['macd'], df['macd_signal']) |
+        (
+            (df['rsi'] > rsi_overbought) &
+            (df['supertrend_dir'] == -1) &
+            df['ma_bearish'] &
+            df['enough_volume'] &
+            df['mfi_bearish'] &
+            df['trend_bearish']
+        )
+    ) & df['fib_in_range']
+
+    df['signal'] = 0
+    df.loc[buy_signal, 'signal'] = 1
+    df.loc[sell_signal, 'signal'] = -1
+    df['raw_signal'] = df['signal'].copy()  # İleri doldurma öncesi ham sinyaller (lookback planlayıcı için)
+
+    for i in range(len(df)):
+        if df['signal'].iloc[i] == 0:
+            if i > 0:
+                df.at[df.index[i], 'signal'] = df['signal'].iloc[i-1]
+            else:
+                if df['macd'].iloc[i] > df['macd_signal'].iloc[i]:
+                    df.at[df.index[i], 'signal'] = 1
+                else:
+                    df.at[df.index[i], 'signal'] = -1
+    return df
+
+def _ewm_rows(values, **kwargs):
+    """(n_symbols, n_bars) matrisinde her satır için pandas ewm ortalaması (ta ile birebir aynı)"""
+    return pd.DataFrame(values.T).ewm(adjust=False, **kwargs).mean().to_numpy().T
+
+def _rolling_rows(values, window, how):
+    """(n_symbols, n_bars) matrisinde her satır için pandas rolling istatistiği"""
+    return getattr(pd.DataFrame(values.T).rolling(window=window), how)().to_numpy().T
+
+def _shift_rows(values):
+    """Matrisi bar ekseninde 1 sağa kaydırır, ilk sütun NaN olur"""
+    shifted = np.empty_like(values)
+    shifted[:, 0] = np.nan
+    shifted[:, 1:] = values[:, :-1]
+    return shifted
+
+def calculate_batch_pine_matrix(high, low, close, volume, timeframe):
+    """
+    Aynı timeframe'i paylaşan semboller için Pine sinyallerini tek geçişte hesaplar.
+    Girdiler (n_symbols, n_bars) matrisleridir; tüm indikatörler bar ekseninde (axis 1)
+    hesaplanır ve sonuçlar calculate_full_pine_signals ile birebir aynıdır.
+    Dönüş: (signal, raw_signal) matrisleri - raw_signal ileri doldurma öncesi 1/-1/0 değerleridir
+    """
+    params = get_pine_parameters(timeframe)
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    volume = np.asarray(volume, dtype=float)
+    n_symbols, n_bars = close.shape
+    atr_period = params["atr_period"]
+
+    if n_bars < atr_period:
+        raise ValueError(f"Yetersiz mum sayısı: {n_bars} (en az {atr_period} gerekli)")
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # EMA 200 ve trend
+        ema200 = _ewm_rows(close, span=200, min_periods=200)
+        trend_bullish = close > ema200
+        trend_bearish = close < ema200
+
+        # RSI (ta.momentum.RSIIndicator ile aynı)
+        diff = close - _shift_rows(close)
+        up_direction = np.where(diff > 0, diff, 0.0)
+        down_direction = -np.where(diff < 0, diff, 0.0)
+        rsi_length = params["rsi_length"]
+        emaup = _ewm_rows(up_direction, alpha=1 / rsi_length, min_periods=rsi_length)
+        emadn = _ewm_rows(down_direction, alpha=1 / rsi_length, min_periods=rsi_length)
+        rsi = np.where(emadn == 0, 100, 100 - (100 / (1 + emaup / emadn)))
+
+        # MACD
+        ema_fast = _ewm_rows(close, span=params["macd_fast"], min_periods=params["macd_fast"])
+        ema_slow = _ewm_rows(close, span=params["macd_slow"], min_periods=params["macd_slow"])
+        macd = ema_fast - ema_slow
+        macd_signal = _ewm_rows(macd, span=params["macd_signal"], min_periods=params["macd_signal"])
+
+        # ATR (Wilder) + dinamik Supertrend yönü
+        prev_close = _shift_rows(close)
+        true_range = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+        atr = np.zeros((n_symbols, n_bars))
+        for row in range(n_symbols):
+            atr[row, atr_period - 1] = true_range[row, 0:atr_period].mean()
+        for i in range(atr_period, n_bars):
+            atr[:, i] = (atr[:, i - 1] * (atr_period - 1) + true_range[:, i]) / float(atr_period)
+        atr_dynamic = _rolling_rows(atr, 5, "mean")
+        multiplier = atr_dynamic / params["supertrend_divisor"]
+        hl2 = (high + low) / 2
+        upperband = hl2 + multiplier
+        lowerband = hl2 - multiplier
+        supertrend_dir = np.ones((n_symbols, n_bars), dtype=np.int8)
+        for i in range(1, n_bars):
+            supertrend_dir[:, i] = np.where(
+                close[:, i] > upperband[:, i - 1], 1,
+                np.where(close[:, i] < lowerband[:, i - 1], -1, supertrend_dir[:, i - 1])
+            )
+
+        # Hareketli ortalamalar ve hacim
+        short_ma = _ewm_rows(close, span=params["short_ma_period"], min_periods=params["short_ma_period"])
+        long_ma = _ewm_rows(close, span=params["long_ma_period"], min_periods=params["long_ma_period"])
+        ma_bullish = short_ma > long_ma
+        ma_bearish = short_ma < long_ma
+        volume_ma = _rolling_rows(volume, 20, "mean")
+        enough_volume = volume > volume_ma * params["volume_multiplier"]
+
+        # MFI
+        typical_price = (high + low + close) / 3
+        money_flow = typical_price * volume
+        positive_flow = np.zeros((n_symbols, n_bars))
+        negative_flow = np.zeros((n_symbols, n_bars))
+        rising = typical_price[:, 1:] > typical_price[:, :-1]
+        falling = typical_price[:, 1:] < typical_price[:, :-1]
+        positive_flow[:, 1:] = np.where(rising, money_flow[:, 1:], 0)
+        negative_flow[:, 1:] = np.where(falling, money_flow[:, 1:], 0)
+        positive_flow_sum = _rolling_rows(positive_flow, params["mfi_length"], "sum")
+        negative_flow_sum = _rolling_rows(negative_flow, params["mfi_length"], "sum")
+        money_ratio = positive_flow_sum / (negative_flow_sum + 1e-10)
+        mfi = 100 - (100 / (1 + money_ratio))
+        mfi_bullish = mfi < 65
+        mfi_bearish = mfi > 35
+
+        # Fibonacci aralığı
+        highest_high = _rolling_rows(high, params["fib_lookback"], "max")
+        lowest_low = _rolling_rows(low, params["fib_lookback"], "min")
+        fib_in_range = (close > highest_high * 0.618) & (close < lowest_low * 1.382)
+
+        prev_macd = _shift_rows(macd)
+        prev_macd_signal = _shift_rows(macd_signal)
+        crossover = (prev_macd < prev_macd_signal) & (macd > macd_signal)
+        crossunder = (prev_macd > prev_macd_signal) & (macd < macd_signal)
+
+        buy_signal = (
+            crossover |
+            (
+                (rsi < params["rsi_oversold"]) &
+                (supertrend_dir == 1) &
+                ma_bullish &
+                enough_volume &
+                mfi_bullish &
+                trend_bullish
+            )
+        ) & fib_in_range
+
+        sell_signal = (
+            crossunder |
+            (
+                (rsi > params["rsi_overbought"]) &
+                (supertrend_dir == -1) &
+                ma_bearish &
+                enough_volume &
+                mfi_bearish &
+                trend_bearish
+            )
+        ) & fib_in_range
+
+    raw_signal = np.zeros((n_symbols, n_bars), dtype=np.int8)
+    raw_signal[buy_signal] = 1
+    raw_signal[sell_signal] = -1
+
+    # İleri doldurma: ilk mum sinyalsizse MACD yönü kullanılır (referansla aynı)
+    signal = raw_signal.copy()
+    first_empty = signal[:, 0] == 0
+    signal[first_empty, 0] = np.where(macd[first_empty, 0] > macd_signal[first_empty, 0], 1, -1)
+    fill_idx = np.where(signal != 0, np.arange(n_bars), 0)
+    np.maximum.accumulate(fill_idx, axis=1, out=fill_idx)
+    signal = np.take_along_axis(signal, fill_idx, axis=1)
+    return signal, raw_signal
+
+OHLCV_COLUMNS = ('high', 'low', 'close', 'volume')
+
+def _group_frames_by_length(frames):
+    """Sembolleri mum sayısına göre gruplar; boş veriler için None sonuç döndürür"""
+    results = {}
+    groups = {}
+    for symbol, df in frames.items():
+        if df is None or df.empty:
+            results[symbol] = None
+            continue
+        groups.setdefault(len(df), []).append(symbol)
+    return results, groups
+
+def _stack_ohlcv(frames, group_symbols, out=None):
+    """Grup sembollerini (4, n_symbols, n_bars) high/low/close/volume dizisine yığar"""
+    n_bars = len(frames[group_symbols[0]])
+    if out is None:
+        out = np.empty((len(OHLCV_COLUMNS), len(group_symbols), n_bars), dtype=np.float64)
+    for column_idx, column in enumerate(OHLCV_COLUMNS):
+        for row, symbol in enumerate(group_symbols):
+            out[column_idx, row] = frames[symbol][column].to_numpy(dtype=float)
+    return out
+
+def evaluate_last_signals(ohlcv, timeframe, warmup=None):
+    """
+    (4, n_symbols, n_bars) dizisi için her sembolün son mum sinyalini döndürür.
+    warmup verilirse, son sinyali ısınma bölgesinden gelen semboller için None döner.
+    """
+    signal, raw_signal = calculate_batch_pine_matrix(ohlcv[0], ohlcv[1], ohlcv[2], ohlcv[3], timeframe)
+    last_signals = []
+    for row in range(signal.shape[0]):
+        if warmup is not None and not is_planned_signal_settled(raw_signal[row], warmup):
+            last_signals.append(None)
+        else:
+            last_signals.append(int(signal[row, -1]))
+    return last_signals
+
+def calculate_batch_pine_signals(frames, timeframe, warmup=None):
+    """
+    Aynı timeframe'deki sembollerin mum verilerini (n_symbols, n_bars) matrislerine yığar
+    ve her sembol için son mum sinyalini döndürür: {symbol: 1/-1 veya None}
+    Farklı uzunluktaki pencereler ayrı gruplar halinde hesaplanır (sonuçların değişmemesi için).
+    warmup verilirse, son sinyali ısınma bölgesinden gelen semboller için None döner.
+    """
+    results, groups = _group_frames_by_length(frames)
+    for n_bars, group_symbols in groups.items():
+        try:
+            last_signals = evaluate_last_signals(_stack_ohlcv(frames, group_symbols), timeframe, warmup)
+            results.update(zip(group_symbols, last_signals))
+        except Exception as e:
+            print(f"❌ {timeframe} toplu sinyal hesaplama hatası ({len(group_symbols)} sembol, {n_bars} mum): {e}")
+            for symbol in group_symbols:
+                results[symbol] = None
+    return results
+
+async def calculate_batch_pine_signals_offloaded(frames, timeframe, warmup=None):
+    """calculate_batch_pine_signals'ın process havuzunda çalışan sürümü (event loop'u bloklamaz)"""
+    results, groups = _group_frames_by_length(frames)
+    for n_bars, group_symbols in groups.items():
+        try:
+            last_signals = await run_indicator_job(frames, group_symbols, timeframe, warmup)
+            results.update(zip(group_symbols, last_signals))
+        except Exception as e:
+            print(f"❌ {timeframe} toplu sinyal hesaplama hatası ({len(group_symbols)} sembol, {n_bars} mum): {e}")
+            for symbol in group_symbols:
+                results[symbol] = None
+    return results
+
+def _indicator_pool_worker(shm_name, shape, timeframe, warmup):
+    """Process havuzu worker'ı: OHLCV dizisini paylaşımlı bellekten kopyalamadan okur"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        ohlcv = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        try:
+            return evaluate_last_signals(ohlcv, timeframe, warmup)
+        finally:
+            del ohlcv
+    finally:
+        shm.close()
+
+def _indicator_pool_warmup():
+    """Worker ısınması: modül importu ve küçük bir sentetik hesaplama"""
+    bars = np.linspace(100.0, 110.0, 300)
+    ohlcv = np.stack([bars * 1.01, bars * 0.99, bars, np.full_like(bars, 1000.0)])[:, None, :]
+    evaluate_last_signals(ohlcv, "1h")
+    return os.getpid()
+
+async def start_indicator_pool():
+    """İndikatör process havuzunu başlatır ve worker'ları ısıtır"""
+    global indicator_pool
+    if INDICATOR_POOL_WORKERS <= 0:
+        print("ℹ️ İndikatör process havuzu devre dışı, hesaplamalar inline yapılacak")
+        return None
+    try:
+        context = multiprocessing.get_context(INDICATOR_POOL_START_METHOD)
+        indicator_pool = ProcessPoolExecutor(max_workers=INDICATOR_POOL_WORKERS, mp_context=context)
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*(
+            loop.run_in_executor(indicator_pool, _indicator_pool_warmup)
+            for _ in range(INDICATOR_POOL_WORKERS)
+        ))
+        print(f"✅ İndikatör process havuzu hazır: {len(set(pids))} worker ısındı ({INDICATOR_POOL_START_METHOD})")
+    except Exception as e:
+        print(f"⚠️ İndikatör process havuzu başlatılamadı, inline hesaplamaya geçiliyor: {e}")
+        shutdown_indicator_pool()
+    return indicator_pool
+
+def shutdown_indicator_pool():
+    """İndikatör process havuzunu kapatır"""
+    global indicator_pool
+    if indicator_pool is not None:
+        try:
+            indicator_pool.shutdown(wait=False, cancel_futures=True)
+            print("✅ İndikatör process havuzu kapatıldı")
+        except Exception as e:
+            print(f"⚠️ İndikatör process havuzu kapatılırken hata: {e}")
+        indicator_pool = None
+
+async def run_indicator_job(frames, group_symbols, timeframe, warmup=None):
+    """
+    Bir sembol grubunun son mum sinyallerini hesaplar. Küçük işler (INDICATOR_INLINE_MAX_CELLS altı)
+    ve havuz yoksa inline; aksi halde OHLCV doğrudan paylaşımlı belleğe yığılır ve worker'a
+    sadece blok adı gönderilir.
+    """
+    n_bars = len(frames[group_symbols[0]])
+    if indicator_pool is None or len(group_symbols) * n_bars <= INDICATOR_INLINE_MAX_CELLS:
+        return evaluate_last_signals(_stack_ohlcv(frames, group_symbols), timeframe, warmup)
 
-    df['signal'] = 0
-    df.loc[buy_signal, 'signal'] = 1
-    df.loc[sell_signal, 'signal'] = -1
+    shape = (len(OHLCV_COLUMNS), len(group_symbols), n_bars)
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    try:
+        shared = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        _stack_ohlcv(frames, group_symbols, out=shared)
+        del shared
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(indicator_pool, _indicator_pool_worker, shm.name, shape, timeframe, warmup)
+    except BrokenProcessPool as e:
+        print(f"⚠️ İndikatör process havuzu bozuldu, inline hesaplamaya geçiliyor: {e}")
+        shutdown_indicator_pool()
+        return evaluate_last_signals(_stack_ohlcv(frames, group_symbols), timeframe, warmup)
+    finally:
+        shm.close()
+        shm.unlink()
 
-    for i in range(len(df)):
-        if df['signal'].iloc[i] == 0:
-            if i > 0:
-                df.at[df.index[i], 'signal'] = df['signal'].iloc[i-1]
-            else:
-                if df['macd'].iloc[i] > df['macd_signal'].iloc[i]:
-                    df.at[df.index[i], 'signal'] = 1
-                else:
-                    df.at[df.index[i], 'signal'] = -1
-    return df
+async def compute_pine_frame(df, timeframe):
+    """calculate_full_pine_signals'ı havuz varsa ayrı process'te çalıştırır (referans pandas yolu)"""
+    if indicator_pool is None:
+        return calculate_full_pine_signals(df, timeframe)
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(indicator_pool, calculate_full_pine_signals, df, timeframe)
+    except BrokenProcessPool as e:
+        print(f"⚠️ İndikatör process havuzu bozuldu, inline hesaplamaya geçiliyor: {e}")
+        shutdown_indicator_pool()
+        return calculate_full_pine_signals(df, timeframe)
+
+def _ewm_convergence_bars(alpha, tolerance):
+    """Üstel ortalamanın başlangıç etkisinin tolerans altına inmesi için gereken mum sayısı"""
+    return int(math.ceil(math.log(tolerance) / math.log(1 - alpha)))
+
+def get_signal_warmup_bars(timeframe, tolerance=None):
+    """
+    Timeframe parametre setindeki tüm indikatörlerin yakınsaması için gereken ısınma mumu sayısı.
+    EMA/Wilder ortalamalarında başlangıç hatası (1 - alpha)^n ile söner; pencereli indikatörler
+    (fib, MFI, hacim ortalaması) ise sadece pencere uzunluğu kadar geçmiş ister.
+    """
+    if tolerance is None:
+        tolerance = LOOKBACK_TOLERANCE
+    params = get_pine_parameters(timeframe)
+
+    def ema_bars(span):
+        return max(span, _ewm_convergence_bars(2 / (span + 1), tolerance))
+
+    def wilder_bars(window):
+        return max(window, _ewm_convergence_bars(1 / window, tolerance))
+
+    warmup = max(
+        ema_bars(200),
+        ema_bars(params["long_ma_period"]),
+        ema_bars(params["short_ma_period"]),
+        ema_bars(params["macd_slow"]),
+        params["macd_slow"] - 1 + ema_bars(params["macd_signal"]),
+        wilder_bars(params["rsi_length"]) + 1,
+        wilder_bars(params["atr_period"]) + 5,  # ATR + SMA(ATR, 5)
+        params["fib_lookback"],
+        params["mfi_length"] + 1,
+        20,  # Hacim ortalaması
+    )
+    return warmup + 1  # Crossover bir önceki mumu kullanır
+
+def plan_signal_lookback(timeframe, tolerance=None):
+    """Son mum sinyalini tam geçmişle aynı bırakan en küçük mum sayısını döndürür"""
+    warmup = get_signal_warmup_bars(timeframe, tolerance)
+    return min(FULL_SIGNAL_LOOKBACK, warmup + LOOKBACK_EVENT_WINDOW)
+
+def is_planned_signal_settled(raw_signal, warmup):
+    """
+    Kısaltılmış pencerede son sinyal, ısınma bölgesinden sonraki bir ham sinyalden geliyorsa
+    tam geçmişle aynıdır. Aksi halde (sinyal ısınma içinde ya da hiç yok) tam geçmiş gerekir.
+    """
+    nonzero = np.flatnonzero(np.asarray(raw_signal) != 0)
+    return len(nonzero) > 0 and nonzero[-1] >= warmup
+
+lookback_verification_stats = {"checked": 0, "mismatched": 0}
+
+def record_lookback_verification(symbol, timeframe, lookback, planned_signal, full_signal):
+    """Planlanan lookback sonucunu tam geçmiş sonucu ile karşılaştırır ve kaydeder"""
+    lookback_verification_stats["checked"] += 1
+    if planned_signal != full_signal:
+        lookback_verification_stats["mismatched"] += 1
+        print(f"⚠️ {symbol} {timeframe} lookback doğrulama farkı: {lookback} mum={planned_signal}, {FULL_SIGNAL_LOOKBACK} mum={full_signal}")
+        return False
+    return True
+
+def get_entry_timestamp_ms(record):
+    """Pozisyon/aktif sinyal giriş zamanını epoch ms olarak döndürür (entry_timestamp, yoksa signal_time/entry_time)"""
+    value = record.get("entry_timestamp")
+    if isinstance(value, datetime):
+        return datetime_to_ms(value)
+    if isinstance(value, (int, float)) and value > 0:
+        return int(value)
+    for key in ("signal_time", "entry_time"):
+        try:
+            return int(datetime.fromisoformat(str(record.get(key, ''))).timestamp() * 1000)
+        except (ValueError, TypeError):
+            continue
+    return None
+
+def plan_trigger_kline_start(signal, now_ms=None):
+    """
+    TP/SL kontrolü için çekilecek ilk 1m mumun açılış zamanını (ms) döndürür:
+    watermark'tan (son değerlendirilen kapanmış mum) sonraki mum, watermark yoksa giriş mumu.
+    Giriş zamanı da bilinmiyorsa son TRIGGER_KLINE_LIMIT mum taranır.
+    """
+    if signal.last_checked_candle:
+        return signal.last_checked_candle + KLINE_INTERVAL_MS
+    entry_ms = signal.entry_timestamp
+    if entry_ms is None:
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        entry_ms = now_ms - TRIGGER_KLINE_LIMIT * KLINE_INTERVAL_MS
+    return entry_ms - entry_ms % KLINE_INTERVAL_MS
+
+def is_trigger_watermark_current(signal, now_ms=None):
+    """Watermark son kapanmış mumu kapsıyorsa True (yakalanacak geçmiş mum yok)"""
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+    current_candle = now_ms - now_ms % KLINE_INTERVAL_MS
+    return plan_trigger_kline_start(signal, now_ms) >= current_candle - KLINE_INTERVAL_MS
+
+def trigger_watermark_lag_seconds(signal, now_ms=None):
+    """Watermark'ın son kapanmış mumun ne kadar gerisinde olduğu (sn; güncelse 0)"""
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+    current_candle = now_ms - now_ms % KLINE_INTERVAL_MS
+    return max(current_candle - KLINE_INTERVAL_MS - plan_trigger_kline_start(signal, now_ms), 0) / 1000
+
+def last_closed_kline_open_time(klines, now_ms=None):
+    """Kline listesindeki son kapanmış mumun açılış zamanı (ms); kapanmış mum yoksa None"""
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+    for kline in reversed(klines):
+        if int(kline[6]) < now_ms:
+            return int(kline[0])
+    return None
 
 async def get_active_high_volume_usdt_pairs(top_n=20, stop_cooldown=None):
     """
@@ -2247,7 +3822,7 @@ async def get_active_high_volume_usdt_pairs(top_n=20, stop_cooldown=None):
     uygun_pairs = []
     for symbol in target_symbols:
         # COOLDOWN KONTROLÜ: Eğer stop_cooldown verilmişse, cooldown'daki sembolleri filtrele
-        if stop_cooldown and check_cooldown(symbol, stop_cooldown, 2):  # COOLDOWN_HOURS
+        if stop_cooldown and check_cooldown(symbol, stop_cooldown):
             print(f"⏰ {symbol} → Cooldown'da olduğu için sinyal arama listesine eklenmedi")
             continue
 
@@ -2273,13 +3848,32 @@ async def get_active_high_volume_usdt_pairs(top_n=20, stop_cooldown=None):
 
     return uygun_pairs
 
-async def check_signal_potential(symbol, positions, stop_cooldown, timeframes, tf_names, previous_signals):
+async def fetch_ticker_snapshot(symbols):
+    """
+    Sinyal taramasının fiyat/hacim kaynağı: tur başına tek /fapi/v1/ticker/24hr isteği (tek sembolde
+    symbol parametresiyle). {symbol: ticker} döner; alınamazsa boş sözlük (fiyatı olmayan sinyal iptal edilir).
+    """
+    if not symbols:
+        return {}
+    query = f"?symbol={symbols[0]}" if len(symbols) == 1 else ""
+    try:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=10)) as session:
+            tickers = await api_request_with_retry(session, f"{BINANCE_FUTURES_URL}/fapi/v1/ticker/24hr{query}", ssl=False)
+    except Exception as e:
+        print(f"⚠️ Toplu ticker verisi alınamadı: {e}")
+        return {}
+    if isinstance(tickers, dict):
+        tickers = [tickers]
+    wanted = set(symbols)
+    return {ticker["symbol"]: ticker for ticker in tickers or [] if isinstance(ticker, dict) and ticker.get("symbol") in wanted}
+
+async def check_signal_potential(symbol, positions, stop_cooldown, timeframes, tf_names, previous_signals, precomputed_signals=None, tickers=None):
     if symbol in positions:
         print(f"⏸️ {symbol} → Zaten aktif pozisyon var, yeni sinyal aranmıyor")
         return None
     
     # Stop cooldown kontrolü (2 saat)
-    if check_cooldown(symbol, stop_cooldown, 2):
+    if check_cooldown(symbol, stop_cooldown):
         # check_cooldown fonksiyonu zaten detaylı mesaj yazdırıyor
         return None
 
@@ -2297,7 +3891,11 @@ async def check_signal_potential(symbol, positions, stop_cooldown, timeframes, t
         crypto_config = CRYPTO_SETTINGS[symbol]
         symbol_timeframes = crypto_config["timeframes"]
         
-        current_signals = await calculate_signals_for_symbol(symbol, {tf: tf for tf in symbol_timeframes}, symbol_timeframes)
+        # Toplu hesaplanmış sinyaller varsa onları kullan, yoksa tek sembol hesapla
+        if precomputed_signals is not None:
+            current_signals = precomputed_signals
+        else:
+            current_signals = await calculate_signals_for_symbol(symbol, {tf: tf for tf in symbol_timeframes}, symbol_timeframes)
         if current_signals is None:
             return None
         
@@ -2327,18 +3925,11 @@ async def check_signal_potential(symbol, positions, stop_cooldown, timeframes, t
             print(f"❌ {symbol} → Beklenmeyen durum: ALIŞ={buy_count}, SATIŞ={sell_count}")
             return None
         
-        # Fiyat ve hacim bilgilerini al
+        # Fiyat ve hacim bilgilerini al (turun toplu ticker snapshot'ından; verilmediyse yalnızca bu sembol için)
         try:
-            ticker_data = client.futures_ticker(symbol=symbol)
-            
-            # API bazen liste döndürüyor, bazen dict
-            if isinstance(ticker_data, list):
-                if len(ticker_data) == 0:
-                    print(f"❌ {symbol} → Ticker verisi boş liste, sinyal iptal edildi")
-                    return None
-                ticker = ticker_data[0]  # İlk elementi al
-            else:
-                ticker = ticker_data
+            if tickers is None:
+                tickers = await fetch_ticker_snapshot([symbol])
+            ticker = tickers.get(symbol)
             
             if not ticker or not isinstance(ticker, dict):
                 print(f"❌ {symbol} → Ticker verisi eksik veya hatalı format, sinyal iptal edildi")
@@ -2379,8 +3970,8 @@ async def check_signal_potential(symbol, positions, stop_cooldown, timeframes, t
         print(f"❌ {symbol} sinyal potansiyeli kontrol hatası: {e}")
         return None
 
-async def process_selected_signal(signal_data, positions, active_signals, stats):
-    """Seçilen sinyali işler ve gönderir."""
+async def process_selected_signal(signal_data, positions, active_signals, stats, unit_of_work=None):
+    """Seçilen sinyali işler ve gönderir; istatistikler unit_of_work verilirse turun commit'inde yazılır."""
     symbol = signal_data['symbol']
     current_signals = signal_data['signals']
     price = signal_data['price']
@@ -2415,34 +4006,30 @@ async def process_selected_signal(signal_data, positions, active_signals, stats)
                 return
             
             # Pozisyonu kaydet - DOMINANT_SIGNAL KULLAN VE TÜM DEĞERLER FLOAT OLARAK
-            position = {
-                "type": str(dominant_signal),  # dominant_signal kullan, sinyal_tipi değil!
-                "target": target_price_float,  # Float olarak kaydet
-                "stop": stop_loss_float,       # Float olarak kaydet
-                "open_price": entry_price_float,  # Float olarak kaydet
-                "stop_str": str(stop_loss_str),
-                "signals": current_signals,
-                "leverage": leverage_int,      # Int olarak kaydet
-                "entry_time": str(datetime.now()),
-                "entry_timestamp": datetime.now(),
-            }
+            entry_time = datetime.now()
+            position = Position(
+                symbol=symbol,
+                side=Side.parse(dominant_signal),  # dominant_signal kullan, sinyal_tipi değil!
+                open_price=entry_price_float,
+                target=target_price_float,
+                stop=stop_loss_float,
+                leverage=leverage_int,
+                signals=current_signals,
+                entry_time=str(entry_time),
+                entry_timestamp=datetime_to_ms(entry_time),
+            )
             
-            # Pozisyonu dictionary'ye ekle
+            # Pozisyonu dictionary'ye ekle (aynı turda tekrar sinyal verilmesin)
             positions[symbol] = position
             
-            # Pozisyonu MongoDB'ye kaydet
-            save_positions_to_db({symbol: position})
-            
-            # Aktif sinyale ekle - Artık save_positions_to_db tarafından yapılıyor
-            # active_signals[symbol] = {...}  # Bu kısım kaldırıldı
+            # Kaydetme ve TP/SL izleme pozisyon motorunda yapılır
+            submit_position(symbol, position)
             
-            # save_active_signals_to_db(active_signals)  # Artık save_positions_to_db tarafından yapılıyor
-            
-            # İstatistikleri güncelle
-            stats["total_signals"] += 1
+            # İstatistikleri güncelle (sayaç $inc ile: eşzamanlı kapanış sayaçlarını ezmez)
+            update_stats_atomic({"total_signals": 1}, unit_of_work=unit_of_work)
             stats["active_signals_count"] = len(positions)  # positions kullan
             
-            save_stats_to_db(stats)
+            save_stats(unit_of_work)
             
             await send_signal_to_all_users(message)
             
@@ -2452,360 +4039,94 @@ async def process_selected_signal(signal_data, positions, active_signals, stats)
     except Exception as e:
         print(f"❌ {symbol} sinyal gönderme hatası: {e}")
 
-async def check_existing_positions_and_cooldowns(positions, active_signals, stats, stop_cooldown):
-    """Bot başlangıcında mevcut pozisyonları ve cooldown'ları kontrol eder"""
-    print(f"🔍 [{datetime.now()}] Mevcut pozisyonlar ve cooldown'lar kontrol ediliyor... ({len(positions)} pozisyon)")
-    for symbol in positions.keys():
-        print(f"   📊 Kontrol edilecek pozisyon: {symbol}")
-
-    # MongoDB'den mevcut pozisyonları yükle
-    mongo_positions = load_positions_from_db()
-    
-    # 1. Aktif pozisyonları kontrol et
-    for symbol in list(mongo_positions.keys()):
-        try:
-            # Pozisyon verilerinin geçerliliğini kontrol et
-            position = mongo_positions[symbol]
-            if not position or not isinstance(position, dict):
-                print(f"⚠️ {symbol} - Geçersiz pozisyon verisi formatı, pozisyon temizleniyor")
-                # MongoDB'den sil ama dictionary'den silme
-                mongo_collection.delete_one({"_id": f"position_{symbol}"})
-                mongo_collection.delete_one({"_id": f"active_signal_{symbol}"})
-                continue
-            
-            # Veriyi hem yeni (data anahtarı) hem de eski yapıdan (doğrudan doküman) almaya çalış
-            position_data = position.get('data', position)
-            
-            # Kritik alanların varlığını kontrol et
-            required_fields = ['open_price', 'target', 'stop', 'type']
-            missing_fields = [field for field in required_fields if field not in position_data]
-            
-            if missing_fields:
-                print(f"⚠️ {symbol} - Eksik alanlar: {missing_fields}, pozisyon temizleniyor")
-                # MongoDB'den sil ama dictionary'den silme
-                mongo_collection.delete_one({"_id": f"position_{symbol}"})
-                mongo_collection.delete_one({"_id": f"active_signal_{symbol}"})
-                continue
-            
-            # Fiyat değerlerinin geçerliliğini kontrol et
-            try:
-                entry_price = float(position_data["open_price"])
-                target_price = float(position_data["target"])
-                stop_loss = float(position_data["stop"])
-                signal_type = position_data["type"]
-                
-                if entry_price <= 0 or target_price <= 0 or stop_loss <= 0:
-                    print(f"⚠️ {symbol} - Geçersiz pozisyon verileri, pozisyon temizleniyor")
-                    print(f"   Giriş: {entry_price}, Hedef: {target_price}, Stop: {stop_loss}")
-                    # MongoDB'den sil ama dictionary'den silme
-                    mongo_collection.delete_one({"_id": f"position_{symbol}"})
-                    mongo_collection.delete_one({"_id": f"active_signal_{symbol}"})
-                    continue
-                    
-            except (ValueError, TypeError) as e:
-                print(f"⚠️ {symbol} - Fiyat dönüşüm hatası: {e}, pozisyon temizleniyor")
-                # MongoDB'den sil ama dictionary'den silme
-                mongo_collection.delete_one({"_id": f"position_{symbol}"})
-                mongo_collection.delete_one({"_id": f"active_signal_{symbol}"})
-                continue
-            
-            # Güncel fiyat bilgisini al
-            df1m = await async_get_historical_data(symbol, '1m', 1)
-            if df1m is None or df1m.empty:
-                continue
-            
-            close_price = float(df1m['close'].iloc[-1])
-            
-            if signal_type == "ALIŞ" or signal_type == "ALIS":
-                # ALIŞ pozisyonu için tek TP/SL kontrolü
-                min_diff = 0.001  # %0.1 minimum fark
-                
-                # Kripto özel ayarlarından TP/SL değerlerini al
-                crypto_config = CRYPTO_SETTINGS.get(symbol, CRYPTO_SETTINGS["SOLUSDT"])  # Varsayılan SOLUSDT
-                tp_percent = crypto_config["tp_percent"]
-                sl_percent = crypto_config["sl_percent"]
-                leverage = crypto_config["leverage"]
-                
-                # Hedef fiyat kontrolü
-                target_price = entry_price * (1 + tp_percent / 100)
-                print(f"🔍 {symbol} TP DEBUG: Giriş: ${entry_price:.6f}, Hedef: ${target_price:.6f} (%{tp_percent}), Güncel: ${close_price:.6f}")
-                
-                if close_price >= target_price and (close_price - target_price) >= (target_price * min_diff):
-                    print(f"🎯 {symbol} TP (%{tp_percent}) GERÇEKLEŞTİ!")
-                    
-                    profit_percentage = ((target_price - entry_price) / entry_price) * 100
-                    profit_usd = (100 * (profit_percentage / 100)) * leverage
-                    
-                    target_message = f"""🎯 TP GERÇEKLEŞTİ! 🎯
-
-🔹 Kripto Çifti: {symbol}
-💰 Kar: %{profit_percentage:.2f} (${profit_usd:.2f})
-📈 Giriş: ${entry_price:.6f}
-💵 Çıkış: ${target_price:.6f}
-🎯 Hedef Seviyesi: TP (%{tp_percent})
-🏁 Hedef gerçekleşti! Pozisyon kapatılıyor..."""
-                    
-                    await send_signal_to_all_users(target_message)
-                    
-                    # Başarılı sinyal olarak işaretle
-                    stats["successful_signals"] += 1
-                    print(f"🎯 {symbol} TP başarılı sinyal olarak işaretlendi")
-                    
-                    await process_position_close(symbol, "take_profit", target_price, positions, active_signals, stats, stop_cooldown, "TP")
-                    continue
-                
-                # Stop loss kontrolü
-                stop_loss = entry_price * (1 - sl_percent / 100)
-                if close_price <= stop_loss and (stop_loss - close_price) >= (stop_loss * min_diff):
-                    print(f"🛑 {symbol} SL (%{sl_percent}) GERÇEKLEŞTİ!")
-                    
-                    loss_percentage = ((entry_price - stop_loss) / entry_price) * 100
-                    loss_usd = (100 * (loss_percentage / 100)) * leverage
-                    
-                    stop_message = f"""🛑 SL GERÇEKLEŞTİ! 🛑
-
-🔹 Kripto Çifti: {symbol}
-💸 Zarar: %{loss_percentage:.2f} (${loss_usd:.2f})
-📈 Giriş: ${entry_price:.6f}
-💵 Çıkış: ${stop_loss:.6f}
-🛑 Stop Seviyesi: SL (%{sl_percent})
-🏁 Stop tetiklendi! Pozisyon kapatılıyor..."""
-                    
-                    await send_signal_to_all_users(stop_message)
-                    
-                    # Başarısız sinyal olarak işaretle
-                    stats["failed_signals"] += 1
-                    print(f"🛑 {symbol} SL başarısız sinyal olarak işaretlendi")
-                    
-                    await process_position_close(symbol, "stop_loss", stop_loss, positions, active_signals, stats, stop_cooldown, "SL")
-                    continue
-
-                
-
-                    
-            # SATIŞ sinyali için hedef/stop kontrolü
-            elif signal_type == "SATIŞ" or signal_type == "SATIS":
-                # SATIŞ pozisyonu için tek TP/SL kontrolü
-                min_diff = 0.001  # %0.1 minimum fark
-                
-                # Kripto özel ayarlarından TP/SL değerlerini al
-                crypto_config = CRYPTO_SETTINGS.get(symbol, CRYPTO_SETTINGS["SOLUSDT"])  # Varsayılan SOLUSDT
-                tp_percent = crypto_config["tp_percent"]
-                sl_percent = crypto_config["sl_percent"]
-                leverage = crypto_config["leverage"]
-                
-                # Hedef fiyat kontrolü (SATIŞ için fiyat düşmeli)
-                target_price = entry_price * (1 - tp_percent / 100)
-                print(f"🔍 {symbol} SATIŞ TP DEBUG: Giriş: ${entry_price:.6f}, Hedef: ${target_price:.6f} (%{tp_percent}), Güncel: ${close_price:.6f}")
-                
-                if close_price <= target_price and (target_price - close_price) >= (target_price * min_diff):
-                    print(f"🎯 {symbol} SATIŞ TP (%{tp_percent}) GERÇEKLEŞTİ!")
-                    
-                    profit_percentage = ((entry_price - target_price) / entry_price) * 100
-                    profit_usd = (100 * (profit_percentage / 100)) * leverage
-                    
-                    target_message = f"""🎯 SATIŞ TP GERÇEKLEŞTİ! 🎯
-
-🔹 Kripto Çifti: {symbol}
-💰 Kar: %{profit_percentage:.2f} (${profit_usd:.2f})
-📈 Giriş: ${entry_price:.6f}
-💵 Çıkış: ${target_price:.6f}
-🎯 Hedef Seviyesi: TP (%{tp_percent})
-🏁 Hedef gerçekleşti! Pozisyon kapatılıyor..."""
-                    
-                    await send_signal_to_all_users(target_message)
-                    
-                    # Başarılı sinyal olarak işaretle
-                    stats["successful_signals"] += 1
-                    print(f"🎯 {symbol} SATIŞ TP başarılı sinyal olarak işaretlendi")
-                    
-                    await process_position_close(symbol, "take_profit", target_price, positions, active_signals, stats, stop_cooldown, "TP")
-                    continue
-                
-                # Stop loss kontrolü (SATIŞ için fiyat yükselmeli)
-                stop_loss = entry_price * (1 + sl_percent / 100)
-                if close_price >= stop_loss and (close_price - stop_loss) >= (stop_loss * min_diff):
-                    print(f"🛑 {symbol} SATIŞ SL (%{sl_percent}) GERÇEKLEŞTİ!")
-                    
-                    loss_percentage = ((stop_loss - entry_price) / entry_price) * 100
-                    loss_usd = (100 * (loss_percentage / 100)) * leverage
-                    
-                    stop_message = f"""🛑 SATIŞ SL GERÇEKLEŞTİ! 🛑
-
-🔹 Kripto Çifti: {symbol}
-💸 Zarar: %{loss_percentage:.2f} (${loss_usd:.2f})
-📈 Giriş: ${entry_price:.6f}
-💵 Çıkış: ${stop_loss:.6f}
-🛑 Stop Seviyesi: SL (%{sl_percent})
-🏁 Stop tetiklendi! Pozisyon kapatılıyor..."""
-                    
-                    await send_signal_to_all_users(stop_message)
-                    
-                    # Başarısız sinyal olarak işaretle
-                    stats["failed_signals"] += 1
-                    print(f"🛑 {symbol} SATIŞ SL başarısız sinyal olarak işaretlendi")
-                    
-                    await process_position_close(symbol, "stop_loss", stop_loss, positions, active_signals, stats, stop_cooldown, "SL")
-                    continue
-                    
-        except Exception as e:
-            print(f"⚠️ {symbol} pozisyon kontrolü sırasında hata: {e}")
-            continue
-    
-    expired_cooldowns = []
-    for symbol, cooldown_time in list(stop_cooldown.items()):
-        if isinstance(cooldown_time, str):
-            cooldown_time = datetime.fromisoformat(cooldown_time)
-        
-        time_diff = (datetime.now() - cooldown_time).total_seconds() / 3600
-        if time_diff >= 2:  # 2 saat geçmişse
-            expired_cooldowns.append(symbol)
-            print(f"✅ {symbol} cooldown süresi doldu, yeni sinyal aranabilir")
-    
-    # Süresi dolan cooldown'ları kaldır
+def clear_expired_stop_cooldowns(stop_cooldown):
+    """Süresi dolan (2 saat) stop cooldown'ları bellekten kaldırır (heap başından); DB dokümanlarını TTL indeksi siler"""
+    expired_cooldowns = stop_cooldown.pop_expired()
     for symbol in expired_cooldowns:
-        del stop_cooldown[symbol]
+        print(f"✅ {symbol} cooldown süresi doldu, yeni sinyal aranabilir")
     if expired_cooldowns:
-        save_stop_cooldown_to_db(stop_cooldown)
         print(f"🧹 {len(expired_cooldowns)} cooldown temizlendi")
-    
-    stats["active_signals_count"] = len(active_signals)
-    save_stats_to_db(stats)
-    
-    print(f"✅ Bot başlangıcı kontrolü tamamlandı: {len(positions)} pozisyon, {len(active_signals)} aktif sinyal, {len(stop_cooldown)} cooldown")
-    print("✅ Bot başlangıcı kontrolü tamamlandı")
+    return expired_cooldowns
 
 async def signal_processing_loop():
     """Sinyal arama ve işleme döngüsü"""
     # Global değişkenleri tanımla
-    global global_stats, global_active_signals, global_successful_signals, global_failed_signals, global_allowed_users, global_admin_users, global_positions, global_stop_cooldown
+    global global_successful_signals, global_failed_signals, global_allowed_users, global_admin_users
 
+    global previous_signals_initialized
     positions = dict()  # {symbol: position_info}
-    stop_cooldown = dict()  # {symbol: datetime}
-    previous_signals = dict()  # {symbol: {tf: signal}} - İlk çalıştığında kaydedilen sinyaller
+    previous_signals = global_previous_signals  # {symbol: {tf: signal}} - anlık görüntüye de yazılır
     active_signals = dict()  # {symbol: {...}} - Aktif sinyaller
     successful_signals = dict()  # {symbol: {...}} - Başarılı sinyaller (hedefe ulaşan)
     failed_signals = dict()  # {symbol: {...}} - Başarısız sinyaller (stop olan)
     tracked_coins = set()  # Takip edilen tüm coinlerin listesi
     
-    stats = {
-        "total_signals": 0,
-        "successful_signals": 0,
-        "failed_signals": 0,
-        "total_profit_loss": 0.0,  # 100$ yatırım için
-        "active_signals_count": 0,
-        "tracked_coins_count": 0
-    }
-    
-    # DB'de kayıtlı stats varsa yükle
-    db_stats = load_stats_from_db()
-    if db_stats:
-        stats.update(db_stats)
+    # İstatistikler ve cooldown'lar repository'de (main() içinde reload_repository ile yüklenir)
+    stats = global_stats
+    stop_cooldown = global_stop_cooldown
     
     # Kripto özel timeframe'ler - Her kripto için farklı kombinasyon
     print("🚀 Bot başlatıldı! (Kripto özel timeframe kombinasyonları ile)")
     
-    # İlk çalıştırma kontrolü
-    is_first = is_first_run()
+    # Durum bir kez yüklenmeden taranmaz: eksik cooldown/pozisyonla aynı sinyal tekrar verilmesin
+    while not (repository_loaded and position_engine_loaded):
+        ready = await run_db(mongodb_ready)  # İstemci kurulmadıysa bağlantı denemesi loop dışında
+        if ready and not repository_loaded:
+            await reload_repository_async()
+        if ready and not position_engine_loaded and not any(event == "reload" for event, _, _ in global_position_events):
+            request_position_engine_reload()
+        if not (repository_loaded and position_engine_loaded):
+            print(f"⏳ Durum henüz yüklenmedi (MongoDB son hata: {mongo_health['last_error']}), tarama 10 saniye sonra tekrar denenecek...")
+            await asyncio.sleep(10)
+    
+    # İlk çalıştırma kontrolü (anlık görüntüden açıldıysa önceki sinyaller ve bayrak oradan gelir)
+    is_first = await run_db(is_first_run) if previous_signals_initialized is None else not previous_signals_initialized
     if is_first:
         print("⏰ İlk çalıştırma: Kripto özel timeframe'ler ile mevcut sinyaller kaydediliyor, değişiklik bekleniyor...")
     else:
-        print("🔄 Yeniden başlatma: Kripto özel timeframe'ler ile veritabanından pozisyonlar ve sinyaller yükleniyor...")
-        # Pozisyonları yükle
-        positions = load_positions_from_db()
-        # Önceki sinyalleri yükle
-        previous_signals = load_previous_signals_from_db()
-        
-        # Aktif sinyalleri DB'den yükle
-        active_signals = load_active_signals_from_db()
-        
-        # Eğer DB'de aktif sinyal yoksa, pozisyonlardan oluştur
-        if not active_signals:
-            print("ℹ️ DB'de aktif sinyal bulunamadı, pozisyonlardan oluşturuluyor...")
-            for symbol, pos in positions.items():
-                active_signals[symbol] = {
-                    "symbol": symbol,
-                    "type": pos["type"],
-                    "entry_price": format_price(pos["open_price"], pos["open_price"]),
-                    "entry_price_float": pos["open_price"],
-                    "target_price": format_price(pos["target"], pos["open_price"]),
-                    "stop_loss": format_price(pos["stop"], pos["open_price"]),
-                    "signals": pos["signals"],
-                    "leverage": pos.get("leverage", 10),
-                    "signal_time": pos.get("entry_time", datetime.now().strftime('%Y-%m-%d %H:%M')),
-                    "current_price": format_price(pos["open_price"], pos["open_price"]),
-                    "current_price_float": pos["open_price"],
-                    "last_update": datetime.now().strftime('%Y-%m-%d %H:%M'),
-                    "max_price": pos["open_price"],  # Başlangıçta max = giriş fiyatı
-                    "min_price": pos["open_price"]   # Başlangıçta min = giriş fiyatı
-                }
-            
-            # Yeni oluşturulan aktif sinyalleri DB'ye kaydet
-            save_active_signals_to_db(active_signals)
-        
-        # İstatistikleri güncelle
-        stats["active_signals_count"] = len(active_signals)
-        save_stats_to_db(stats)
+        if previous_signals_initialized is None:
+            print("🔄 Yeniden başlatma: Kripto özel timeframe'ler ile veritabanından sinyaller yükleniyor (pozisyonlar motorda)...")
+            # Önceki sinyalleri yükle
+            previous_signals.clear()
+            previous_signals.update(await run_db(load_previous_signals_from_db))
+        else:
+            print(f"⚡ Yeniden başlatma: {len(previous_signals)} önceki sinyal anlık görüntüden yüklendi (pozisyonlar motorda)...")
+        previous_signals_initialized = True
         
-        # Bot başlangıcında mevcut durumları kontrol et
-        await check_existing_positions_and_cooldowns(positions, active_signals, stats, stop_cooldown)
+        # İstatistikleri güncelle (başlangıç değişiklikleri tek iş biriminde yazılır)
+        startup_writes = MongoUnitOfWork("Başlangıç kaydı")
+        stats["active_signals_count"] = len(global_active_signals)
+        save_stats(startup_writes)
         
-        # Global stop_cooldown değişkenini güncelle
-        global_stop_cooldown = stop_cooldown.copy()
+        # Süresi dolan stop cooldown'ları temizle
+        clear_expired_stop_cooldowns(stop_cooldown)
         
         # Bot başlangıcında eski sinyal cooldown'ları temizle
         print("🧹 Bot başlangıcında eski sinyal cooldown'ları temizleniyor...")
-        await clear_cooldown_status()
-    
-    # Periyodik pozisyon kontrolü için sayaç
-    position_check_counter = 0
+        await clear_cooldown_status(startup_writes)
+        await startup_writes.commit_async()
     
     while True:
         try:
-            if not ensure_mongodb_connection():
-                print("⚠️ MongoDB bağlantısı kurulamadı, 30 saniye bekleniyor...")
-                await asyncio.sleep(30)
-                continue
+            if not await run_db(ensure_mongodb_connection):
+                # Okumalar bellekten (repository, cooldown'lar, pozisyon motoru): tarama sürer, yazımlar tampon + journal'da bekler
+                print(f"⚠️ MongoDB erişilemiyor (son hata: {mongo_health['last_error']}), tarama bellekteki durumla sürüyor (tamponda {len(mongo_write_buffer)} yazım)")
             
-            positions = load_positions_from_db()
-            active_signals = load_active_signals_from_db()
-            stats = load_stats_from_db()
-            stop_cooldown = load_stop_cooldown_from_db()
+            # Açık pozisyonların sahibi pozisyon motoru, istatistik ve cooldown'ların sahibi repository:
+            # tarama döngüsü bellekten okur (DB okuması yok)
+            positions = dict(global_positions)
+            active_signals = dict(global_active_signals)
+            stats = global_stats
+            stop_cooldown = global_stop_cooldown
+            # Turun DB değişiklikleri (cooldown'lar, istatistikler) toplanır, koleksiyon başına tek bulk_write ile yazılır
+            cycle_writes = MongoUnitOfWork("Tarama turu kaydı")
             
-            # Her 3 döngüde bir pozisyon kontrolü yap (yaklaşık 45 saniyede bir - TP mesajları için)
-            position_check_counter += 1
-            if position_check_counter >= 3:
-                print(f"🔄 [{datetime.now()}] Periyodik pozisyon kontrolü yapılıyor... (Counter: {position_check_counter})")
-                await check_existing_positions_and_cooldowns(positions, active_signals, stats, stop_cooldown)
-                position_check_counter = 0
-                print(f"✅ [{datetime.now()}] Periyodik pozisyon kontrolü tamamlandı")
-                
-                # Global stop_cooldown değişkenini güncelle
-                global_stop_cooldown = stop_cooldown.copy()
-            
-            # Aktif sinyalleri positions ile senkronize et (her döngüde)
-            for symbol in list(active_signals.keys()):
-                if symbol not in positions:
-                    # Sadece ilk kez mesaj yazdır
-                    attr_name7 = f'_first_position_missing_{symbol}'
-                    if not hasattr(signal_processing_loop, attr_name7):
-                        print(f"⚠️ {symbol} → Positions'da yok, aktif sinyallerden kaldırılıyor")
-                        setattr(signal_processing_loop, attr_name7, False)
-                    del active_signals[symbol]
-                    save_active_signals_to_db(active_signals)
-                else:
-                    # Positions'daki güncel verileri active_signals'a yansıt
-                    position = positions[symbol]
-                    if "entry_price_float" in active_signals[symbol]:
-                        active_signals[symbol].update({
-                            "target_price": format_price(position["target"], active_signals[symbol]["entry_price_float"]),
-                            "stop_loss": format_price(position["stop"], active_signals[symbol]["entry_price_float"]),
-                            "leverage": position.get("leverage", 10)
-                        })
+            # Süresi dolan stop cooldown'ları temizle
+            clear_expired_stop_cooldowns(stop_cooldown)
             
             # Stats'ı güncelle
             stats["active_signals_count"] = len(active_signals)
-            save_stats_to_db(stats)
+            save_stats(cycle_writes)
             
             # Her döngüde güncel durumu yazdır (senkronizasyon kontrolü için)
             print(f"📊 Güncel durum: {len(positions)} pozisyon, {len(active_signals)} aktif sinyal, {len(stop_cooldown)} cooldown")
@@ -2825,6 +4146,7 @@ async def signal_processing_loop():
                 if not hasattr(signal_processing_loop, '_first_all_protected'):
                     print("⚠️ Tüm coinler korumalı (aktif pozisyon veya cooldown)")
                     signal_processing_loop._first_all_protected = False
+                await cycle_writes.commit_async()
                 await asyncio.sleep(60)
                 continue
             
@@ -2835,6 +4157,7 @@ async def signal_processing_loop():
                 remaining_minutes = int(remaining_time.total_seconds() / 60)
                 print(f"⏳ Sinyal cooldown modunda, {remaining_minutes} dakika sonra tekrar sinyal aranacak.")
                 print(f"   (Önceki döngüde çok fazla sinyal bulunduğu için)")
+                await cycle_writes.commit_async()
                 await asyncio.sleep(60)  # 1 dakika bekle
                 continue
             
@@ -2842,43 +4165,12 @@ async def signal_processing_loop():
             if stop_cooldown:
                 print(f"⏳ Cooldown'daki kriptolar ({len(stop_cooldown)} adet):")
                 current_time = datetime.now()
-                for symbol, cooldown_info in stop_cooldown.items():
-                    # Debug: Cooldown bilgisini yazdır
-                    print(f"🔍 DEBUG {symbol}: {type(cooldown_info)} = {cooldown_info}")
-                    
-                    if isinstance(cooldown_info, dict) and 'until' in cooldown_info:
-                        cooldown_until = cooldown_info['until']
-                        if isinstance(cooldown_until, str):
-                            try:
-                                cooldown_until = datetime.fromisoformat(cooldown_until.replace('Z', '+00:00'))
-                            except:
-                                cooldown_until = current_time
-                        elif not isinstance(cooldown_until, datetime):
-                            cooldown_until = current_time
-                        
-                        remaining_time = cooldown_until - current_time
-                        if remaining_time.total_seconds() > 0:
-                            remaining_minutes = int(remaining_time.total_seconds() / 60)
-                            remaining_seconds = int(remaining_time.total_seconds() % 60)
-                            print(f"   🔴 {symbol}: {remaining_minutes}dk {remaining_seconds}sn kaldı")
-                        else:
-                            print(f"   🟢 {symbol}: Cooldown süresi bitti")
+                for symbol in stop_cooldown.keys():
+                    remaining_seconds = int(stop_cooldown.remaining(symbol, current_time).total_seconds())
+                    if remaining_seconds > 0:
+                        print(f"   🔴 {symbol}: {remaining_seconds // 60}dk {remaining_seconds % 60}sn kaldı")
                     else:
-                        # Farklı format kontrolü - datetime objesi olabilir
-                        if isinstance(cooldown_info, datetime):
-                            # Correctly calculate the difference from the start time
-                            time_diff_seconds = (current_time - cooldown_info).total_seconds()
-                            cooldown_duration_seconds = 2 * 3600  # COOLDOWN_HOURS
-
-                            if time_diff_seconds < cooldown_duration_seconds:
-                                remaining_seconds = cooldown_duration_seconds - time_diff_seconds
-                                remaining_minutes = int(remaining_seconds / 60)
-                                remaining_seconds = int(remaining_seconds % 60)
-                                print(f"   🔴 {symbol}: {remaining_minutes}dk {remaining_seconds}sn kaldı")
-                            else:
-                                print(f"   🟢 {symbol}: Cooldown süresi bitti")
-                        else:
-                            print(f"   ⚠️ {symbol}: Cooldown bilgisi eksik - Format: {type(cooldown_info)}")
+                        print(f"   🟢 {symbol}: Cooldown süresi bitti")
                 print()  # Boş satır ekle
 
             if not hasattr(signal_processing_loop, '_first_signal_search'):
@@ -2917,34 +4209,42 @@ async def signal_processing_loop():
             processed_signals_in_loop = 0  # Bu döngüde işlenen sinyal sayacı
             
             # Cooldown süresi biten sinyalleri kontrol et ve aktif hale getir
-            expired_cooldown_signals = await get_expired_cooldown_signals()
+            expired_cooldown_signals = get_expired_cooldown_signals()
             if expired_cooldown_signals:
                 print(f"🔄 Cooldown süresi biten {len(expired_cooldown_signals)} sinyal tekrar değerlendirilecek")
             
-            # Tüm semboller için kripto özel timeframe'ler ile sinyal potansiyelini kontrol et ve topla
-            for i, symbol in enumerate(symbols):
-                # Her 20 sembolde bir ilerleme göster
-                if (i + 1) % 20 == 0:  
-                    print(f"⏳ {i+1}/{len(symbols)} sembol kripto özel timeframe'ler ile kontrol edildi...")
-
-                # Halihazırda pozisyon varsa veya stop cooldown'daysa atla
+            # Halihazırda pozisyon varsa, stop cooldown'daysa veya sinyal cooldown'daysa atla
+            # (toplu hesaplamaya girmeden önce: reddedilecek semboller için veri çekilmez)
+            candidates = []
+            for symbol in symbols:
                 if symbol in positions:
                     continue
-                if check_cooldown(symbol, stop_cooldown, 2):  # COOLDOWN_HOURS
+                if check_cooldown(symbol, stop_cooldown):
                     continue
                 
-                # Sinyal cooldown kontrolü - süresi bitenler hariç
-                if await check_signal_cooldown(symbol):
-                    # Cooldown süresi biten sinyaller tekrar değerlendirilecek
-                    if symbol in expired_cooldown_signals:
-                        print(f"🔄 {symbol} cooldown süresi bitti, tekrar değerlendiriliyor")
-                    else:
-                        print(f"⏳ {symbol} sinyal cooldown'da, atlanıyor")
-                        continue
+                # Sinyal cooldown kontrolü (bellekten); süresi bitenler yukarıda çıkarıldı, tekrar değerlendirilir
+                if check_signal_cooldown(symbol):
+                    print(f"⏳ {symbol} sinyal cooldown'da, atlanıyor")
+                    continue
+                if symbol in expired_cooldown_signals:
+                    print(f"🔄 {symbol} cooldown süresi bitti, tekrar değerlendiriliyor")
+                candidates.append(symbol)
+            
+            # Aynı timeframe'i paylaşan sembollerin sinyallerini tek geçişte hesapla
+            batch_signals = await calculate_signals_for_symbols_batch(candidates)
+            # Fiyat/hacim: tüm adaylar için tek toplu ticker isteği (sembol başına bloklayan istek yok)
+            tickers = await fetch_ticker_snapshot(candidates)
+            
+            # Uygun semboller için kripto özel timeframe'ler ile sinyal potansiyelini kontrol et ve topla
+            for i, symbol in enumerate(candidates):
+                # Her 20 sembolde bir ilerleme göster
+                if (i + 1) % 20 == 0:  
+                    print(f"⏳ {i+1}/{len(candidates)} sembol kripto özel timeframe'ler ile kontrol edildi...")
                 
                 # Sinyal potansiyelini kontrol et
                 signal_result = await check_signal_potential(
-                    symbol, positions, stop_cooldown, None, None, previous_signals
+                    symbol, positions, stop_cooldown, None, None, previous_signals,
+                    precomputed_signals=batch_signals.get(symbol), tickers=tickers
                 )
                 
                 # EĞER SİNYAL BULUNDUYSA, found_signals'a ekle
@@ -2956,21 +4256,18 @@ async def signal_processing_loop():
             if not found_signals:
                 print("🔍 Kripto özel timeframe'ler ile yeni sinyal bulunamadı.")
                 # Sinyal bulunamadığında cooldown'ı temizle (normal çalışma modunda)
-                await clear_cooldown_status()
+                await clear_cooldown_status(cycle_writes)
+                await cycle_writes.commit_async()
                 continue
 
             # Debug: Cooldown durumunu kontrol et
-            cooldown_count = 0
-            for symbol in symbols:
-                if await check_signal_cooldown(symbol):
-                    cooldown_count += 1
+            cooldown_count = sum(1 for symbol in symbols if check_signal_cooldown(symbol))
             print(f"📊 Cooldown durumu: {cooldown_count}/{len(symbols)} sembol cooldown'da")
 
             print(f"🎯 Kripto özel timeframe'ler ile toplam {len(found_signals)} sinyal bulundu!")
             
-            # Hacim verilerini çekme ve sinyalleri filtreleme
-            print("📊 Kripto özel timeframe'ler ile bulunan sinyallerin hacim verileri alınıyor...")
-            volumes = await get_volumes_for_symbols(list(found_signals.keys()))
+            # Hacim verileri (check_signal_potential'da toplu ticker snapshot'ından alındı) ile sinyalleri filtreleme
+            volumes = {symbol: signal_result['volume_usd'] for symbol, signal_result in found_signals.items()}
 
             # Hacim verisine göre sinyalleri sıralama
             sorted_signals = sorted(
@@ -2991,7 +4288,7 @@ async def signal_processing_loop():
                 # Kalan sinyalleri cooldown'a ekle
                 remaining_signals = [symbol for symbol, _ in sorted_signals[5:]]  # MAX_SIGNALS_PER_RUN
                 if remaining_signals:
-                    await set_signal_cooldown_to_db(remaining_signals, timedelta(minutes=30))  # COOLDOWN_MINUTES
+                    await set_signal_cooldown_to_db(remaining_signals, SIGNAL_COOLDOWN_DURATION, cycle_writes)
                 
             else:
                 # Normal durum: 5 veya daha az sinyal varsa hepsini işle
@@ -3010,7 +4307,7 @@ async def signal_processing_loop():
                 crypto_config = CRYPTO_SETTINGS.get(symbol, {})
                 symbol_timeframes = crypto_config.get("timeframes", ["N/A"])
                 print(f"🚀 {symbol} {' + '.join(symbol_timeframes)} kombinasyonu sinyali işleniyor (Hacim: ${volumes.get(symbol, 0):,.0f})")
-                await process_selected_signal(signal_result, positions, active_signals, stats)
+                await process_selected_signal(signal_result, positions, active_signals, stats, cycle_writes)
                 processed_signals_in_loop += 1
             
             print(f"✅ Kripto özel timeframe'ler ile tarama döngüsü tamamlandı. Bu turda {processed_signals_in_loop} yeni sinyal işlendi.")
@@ -3018,32 +4315,40 @@ async def signal_processing_loop():
             if is_first:
                 print(f"💾 İlk çalıştırma: {len(previous_signals)} sinyal kaydediliyor...")
                 if len(previous_signals) > 0:
-                    save_previous_signals_to_db(previous_signals)
+                    await run_db(save_previous_signals_to_db, previous_signals)
                     print("✅ İlk çalıştırma sinyalleri kaydedildi!")
                 else:
                     print("ℹ️ İlk çalıştırmada kayıt edilecek sinyal bulunamadı")
                 is_first = False  # Artık ilk çalıştırma değil
+                previous_signals_initialized = True
 
             if not hasattr(signal_processing_loop, '_first_loop'):
                 print("🚀 Kripto özel timeframe'ler ile yeni sinyal aramaya devam ediliyor...")
                 signal_processing_loop._first_loop = False
         
-            # Kripto özel timeframe'ler ile aktif sinyallerin fiyatlarını güncelle ve hedef/stop kontrolü yap
+            # Aktif sinyallerin özeti (TP/SL kontrolü ve fiyat güncellemesi pozisyon motorunda)
+            active_signals = dict(global_active_signals)
+            
+            # İstatistikleri güncelle ve turun tüm değişikliklerini yaz
+            stats["active_signals_count"] = len(active_signals)
+            stats["tracked_coins_count"] = len(tracked_coins)
+            save_stats(cycle_writes)
+            await cycle_writes.commit_async()
+            
             if active_signals:
                 # Sadece ilk kez mesaj yazdır
                 if not hasattr(signal_processing_loop, '_first_active_check'):
-                    print(f"🔍 KRİPTO ÖZEL TIMEFRAME'LER İLE AKTİF SİNYAL KONTROLÜ BAŞLATILIYOR... ({len(active_signals)} aktif sinyal)")
-                    for symbol in list(active_signals.keys()):
-                        crypto_config = CRYPTO_SETTINGS.get(symbol, {})
-                        symbol_timeframes = crypto_config.get("timeframes", ["N/A"])
-                        print(f"   📊 {symbol} ({' + '.join(symbol_timeframes)}): {active_signals[symbol].get('type', 'N/A')} - Giriş: ${active_signals[symbol].get('entry_price_float', 0):.6f}")
+                    print(f"🔍 KRİPTO ÖZEL TIMEFRAME'LER İLE AKTİF SİNYALLER POZİSYON MOTORUNDA İZLENİYOR... ({len(active_signals)} aktif sinyal)")
                     signal_processing_loop._first_active_check = False
                 
-                print(f"🔍 DEBUG: {len(active_signals)} aktif sinyal kontrol edilecek")
-                for symbol in list(active_signals.keys()):
-                    crypto_config = CRYPTO_SETTINGS.get(symbol, {})
-                    symbol_timeframes = crypto_config.get("timeframes", ["N/A"])
-                    print(f"   🔍 {symbol} ({' + '.join(symbol_timeframes)}): {active_signals[symbol].get('type', 'N/A')} - Giriş: ${active_signals[symbol].get('entry_price_float', 0):.6f}")
+                print(f"✅ AKTİF SİNYAL ÖZETİ ({len(active_signals)} sinyal)")
+                for symbol, signal in active_signals.items():
+                    entry_price = signal.entry_price
+                    current_price = signal.current_price
+                    if current_price > 0 and entry_price > 0:
+                        # Pozisyon tipine göre kâr/zarar hesaplama
+                        change_percent = signal.side.change_percent(entry_price, current_price)
+                        print(f"   📊 {symbol}: Giriş: ${entry_price:.6f} → Güncel: ${current_price:.6f} (%{change_percent:+.2f})")
             else:
                 # Sadece ilk kez mesaj yazdır
                 if not hasattr(signal_processing_loop, '_first_no_active'):
@@ -3051,358 +4356,19 @@ async def signal_processing_loop():
                     signal_processing_loop._first_no_active = False
                 continue
             
-            for symbol in list(active_signals.keys()):
-                print(f"🔍 DEBUG: {symbol} pozisyon kontrolü yapılıyor...")
-                if symbol not in positions:  # Pozisyon kapandıysa aktif sinyalden kaldır
-                    print(f"⚠️ {symbol} → Positions'da yok, aktif sinyallerden kaldırılıyor")
-                    del active_signals[symbol]
-                    continue
-                
-                try:
-                    # Sadece ilk kez mesaj yazdır
-                    attr_name = f'_first_active_check_{symbol}'
-                    if not hasattr(signal_processing_loop, attr_name):
-                        print(f"🔍 {symbol} 15m+30m kombinasyonu aktif sinyal kontrolü başlatılıyor...")
-                        setattr(signal_processing_loop, attr_name, False)
-                    
-                    # Güncel fiyat bilgisini al
-                    df1m = await async_get_historical_data(symbol, '1m', 1)
-                    if df1m is None or df1m.empty:
-                        print(f"⚠️ {symbol} → 1m veri alınamadı")
-                        continue
-                    
-                    # Güncel fiyat
-                    last_price = float(df1m['close'].iloc[-1])
-                    print(f"🔍 DEBUG: {symbol} → Giriş: ${active_signals[symbol]['entry_price_float']:.6f}, Güncel: ${last_price:.6f}")
-                    active_signals[symbol]["current_price"] = format_price(last_price, active_signals[symbol]["entry_price_float"])
-                    active_signals[symbol]["current_price_float"] = last_price
-                    active_signals[symbol]["last_update"] = str(datetime.now())
-                    
-                    # Max/Min değerleri güncelle
-                    if "max_price" not in active_signals[symbol] or last_price > active_signals[symbol]["max_price"]:
-                        active_signals[symbol]["max_price"] = last_price
-                    if "min_price" not in active_signals[symbol] or last_price < active_signals[symbol]["min_price"]:
-                        active_signals[symbol]["min_price"] = last_price
-                    
-                    # Aktif sinyalleri veritabanına kaydet
-                    save_active_signals_to_db(active_signals)
-                    
-                    # Hedef ve stop kontrolü
-                    entry_price = active_signals[symbol]["entry_price_float"]
-                    target_price = float(active_signals[symbol]["target_price"].replace('$', '').replace(',', ''))
-                    stop_loss = float(active_signals[symbol]["stop_loss"].replace('$', '').replace(',', ''))
-                    signal_type = active_signals[symbol]["type"]
-                    
-                    print(f"🔍 DEBUG: {symbol} → Sinyal tipi: {signal_type}, Hedef: ${target_price:.6f}, Stop: ${stop_loss:.6f}")
-                    
-                    # Sadece ilk kez mesaj yazdır
-                    attr_name2 = f'_first_control_values_{symbol}'
-                    if not hasattr(signal_processing_loop, attr_name2):
-                        print(f"   📊 {symbol} 15m+30m kombinasyonu kontrol değerleri:")
-                        print(f"      Giriş: ${entry_price:.6f}")
-                        print(f"      Hedef: ${target_price:.6f}")
-                        print(f"      Stop: ${stop_loss:.6f}")
-                        print(f"      Güncel: ${last_price:.6f}")
-                        print(f"      Güncel: ${last_price:.6f}")
-                        print(f"      Sinyal: {signal_type}")
-                        setattr(signal_processing_loop, attr_name2, False)
-                    
-                    # 15m+30m kombinasyonu ALIŞ sinyali için hedef/stop kontrolü
-                    if signal_type == "ALIŞ" or signal_type == "ALIS":
-                        print(f"🔍 DEBUG: {symbol} → ALIŞ sinyali kontrol ediliyor...")
-                        # Sadece ilk kez mesaj yazdır
-                        attr_name3 = f'_first_alish_check_{symbol}'
-                        if not hasattr(signal_processing_loop, attr_name3):
-                            print(f"   🔍 {symbol} 15m+30m kombinasyonu ALIŞ sinyali kontrol ediliyor...")
-                            setattr(signal_processing_loop, attr_name3, False)
-                        
-                        # 15m+30m kombinasyonu hedef kontrolü: Güncel fiyat hedefi geçti mi? (ALIŞ: yukarı çıkması gerekir)
-                        # GÜVENLİK KONTROLÜ: Fiyat gerçekten hedefi geçti mi?
-                        # Minimum fark kontrolü: Fiyat hedefi en az 0.1% geçmeli (daha güvenli)
-                        min_target_diff = target_price * 0.001  # %0.1 minimum fark
-                        print(f"🔍 DEBUG: {symbol} → ALIŞ hedef kontrolü: Güncel: ${last_price:.6f}, Hedef: ${target_price:.6f}, Min fark: ${min_target_diff:.6f}")
-                        if last_price >= target_price and (last_price - target_price) >= min_target_diff:
-                            print(f"🎯 DEBUG: {symbol} → ALIŞ hedefi gerçekleşti! Güncel: ${last_price:.6f}, Hedef: ${target_price:.6f}")
-                            # Kripto özel timeframe'ler ile HEDEF OLDU! 🎯
-                            # Güvenli kâr hesaplaması
-                            if entry_price > 0:
-                                profit_percentage = ((target_price - entry_price) / entry_price) * 100
-                                leverage = active_signals[symbol].get('leverage', 10)
-                                profit_usd = (100 * (profit_percentage / 100)) * leverage
-                            else:
-                                profit_percentage = 0
-                                profit_usd = 0
-                            
-                            print(f"🎯 HEDEF OLDU! {symbol} - Giriş: ${entry_price:.4f}, Hedef: ${target_price:.4f}, Çıkış: ${last_price:.4f}")
-                            print(f"💰 Kar: %{profit_percentage:.2f} (${profit_usd:.2f})")
-                            
-                            # Başarılı sinyali kaydet
-                            successful_signals[symbol] = {
-                                "symbol": symbol,
-                                "type": signal_type,
-                                "entry_price": entry_price,
-                                "target_price": target_price,
-                                "exit_price": last_price,
-                                "profit_percentage": profit_percentage,
-                                "profit_usd": profit_usd,
-                                "entry_time": active_signals[symbol]["signal_time"],
-                                "exit_time": datetime.now().strftime('%Y-%m-%d %H:%M'),
-                                "duration": "Hedef"
-                            }
-                            
-                            # İstatistikleri güncelle
-                            stats["successful_signals"] += 1
-                            stats["total_profit_loss"] += profit_usd
-                            
-                            # Stop cooldown'a ekle
-                            stop_cooldown[symbol] = datetime.now()
-                            
-                            # Cooldown'ı veritabanına kaydet
-                            save_stop_cooldown_to_db(stop_cooldown)
-                            
-                            # Pozisyonu ve aktif sinyali kaldır
-                            if symbol in positions:
-                                del positions[symbol]
-                            del active_signals[symbol]
-                            
-                            # Global değişkenleri hemen güncelle (hızlı kontrol için)
-                            global_active_signals = active_signals.copy()
-                            global_positions = positions.copy()
-                            global_stats = stats.copy()
-                            global_stop_cooldown = stop_cooldown.copy()
-                            global_successful_signals = successful_signals.copy()
-                            global_failed_signals = failed_signals.copy()
-                            
-                            # MESAJ GÖNDERİMİ KALDIRILDI - monitor_signals() fonksiyonu mesaj gönderecek
-                            print(f"📢 Hedef mesajı monitor_signals() tarafından gönderilecek")
-                            
-                        # Kripto özel timeframe'ler stop kontrolü: Güncel fiyat stop'u geçti mi? (ALIŞ: aşağı düşmesi zarar)
-                        # GÜVENLİK KONTROLÜ: Fiyat gerçekten stop'u geçti mi?
-                        # Minimum fark kontrolü: Fiyat stop'u en az 0.1% geçmeli (daha güvenli)
-                        min_stop_diff = stop_loss * 0.001  # %0.1 minimum fark
-                        if last_price <= stop_loss and (stop_loss - last_price) >= min_stop_diff:
-                            
-                            # Kripto özel timeframe'ler ile STOP OLDU! 🛑
-                            # Güvenli zarar hesaplaması
-                            if entry_price > 0:
-                                loss_percentage = ((entry_price - stop_loss) / entry_price) * 100
-                                leverage = active_signals[symbol].get('leverage', 10)
-                                loss_usd = (100 * (loss_percentage / 100)) * leverage
-                            else:
-                                loss_percentage = 0
-                                loss_usd = 0
-                            
-                            print(f"🛑 STOP OLDU! {symbol} - Giriş: ${entry_price:.4f}, Stop: ${stop_loss:.4f}, Çıkış: ${last_price:.4f}")
-                            print(f"💸 Zarar: %{loss_percentage:.2f} (${loss_usd:.2f})")
-                            
-                            # Başarısız sinyali kaydet
-                            failed_signals[symbol] = {
-                                "symbol": symbol,
-                                "type": signal_type,
-                                "entry_price": entry_price,
-                                "stop_loss": stop_loss,
-                                "exit_price": last_price,
-                                "loss_percentage": loss_percentage,
-                                "loss_usd": loss_usd,
-                                "entry_time": active_signals[symbol]["signal_time"],
-                                "exit_time": datetime.now().strftime('%Y-%m-%d %H:%M'),
-                                "duration": "Stop"
-                            }
-                            
-                            # İstatistikleri güncelle
-                            stats["failed_signals"] += 1
-                            stats["total_profit_loss"] -= loss_usd
-                            
-                            # Stop cooldown'a ekle
-                            stop_cooldown[symbol] = datetime.now()
-                            
-                            # Cooldown'ı veritabanına kaydet
-                            save_stop_cooldown_to_db(stop_cooldown)
-                            
-                            # Pozisyonu ve aktif sinyali kaldır
-                            if symbol in positions:
-                                del positions[symbol]
-                            del active_signals[symbol]
-                            
-                            # MESAJ GÖNDERİMİ KALDIRILDI - monitor_signals() fonksiyonu mesaj gönderecek
-                            print(f"📢 Stop mesajı monitor_signals() tarafından gönderilecek")
-                    
-                    # 15m+30m kombinasyonu SATIŞ sinyali için hedef/stop kontrolü
-                    elif signal_type == "SATIŞ" or signal_type == "SATIS":
-                        print(f"🔍 DEBUG: {symbol} → SATIŞ sinyali kontrol ediliyor...")
-                        # Sadece ilk kez mesaj yazdır
-                        attr_name4 = f'_first_satish_check_{symbol}'
-                        if not hasattr(signal_processing_loop, attr_name4):
-                            print(f"🔍 {symbol} 15m+30m kombinasyonu SATIŞ sinyali kontrol ediliyor...")
-                            setattr(signal_processing_loop, attr_name4, False)
-                        # 15m+30m kombinasyonu hedef kontrolü: Güncel fiyat hedefi geçti mi? (SATIŞ: aşağı düşmesi gerekir)
-                        # GÜVENLİK KONTROLÜ: Fiyat gerçekten hedefi geçti mi?
-                        # Minimum fark kontrolü: Fiyat hedefi en az 0.1% geçmeli (daha güvenli)
-                        min_target_diff = target_price * 0.001  # %0.1 minimum fark
-                        print(f"🔍 DEBUG: {symbol} → SATIŞ hedef kontrolü: Güncel: ${last_price:.6f}, Hedef: ${target_price:.6f}, Min fark: ${min_target_diff:.6f}")
-                        if last_price <= target_price and (target_price - last_price) >= min_target_diff:
-                            print(f"🎯 DEBUG: {symbol} → SATIŞ hedefi gerçekleşti! Güncel: ${last_price:.6f}, Hedef: ${target_price:.6f}")
-                            # Kripto özel timeframe'ler ile HEDEF OLDU! 🎯
-                            # Güvenli kâr hesaplaması
-                            if entry_price > 0:
-                                profit_percentage = ((entry_price - target_price) / entry_price) * 100
-                                # Kripto özel leverage ile hesapla
-                                crypto_config = CRYPTO_SETTINGS.get(symbol, {})
-                                leverage = crypto_config.get("leverage", 10)
-                                profit_usd = 100 * (profit_percentage / 100) * leverage  # 100$ yatırım için
-                            else:
-                                profit_percentage = 0
-                                profit_usd = 0
-                            
-                            print(f"🎯 HEDEF OLDU! {symbol} - Giriş: ${entry_price:.4f}, Hedef: ${target_price:.4f}, Çıkış: ${last_price:.4f}")
-                            print(f"💰 Kar: %{profit_percentage:.2f} (${profit_usd:.2f})")
-                            
-                            # Başarılı sinyali kaydet
-                            successful_signals[symbol] = {
-                                "symbol": symbol,
-                                "type": signal_type,
-                                "entry_price": entry_price,
-                                "target_price": target_price,
-                                "exit_price": last_price,
-                                "profit_percentage": profit_percentage,
-                                "profit_usd": profit_usd,
-                                "entry_time": active_signals[symbol]["signal_time"],
-                                "exit_time": datetime.now().strftime('%Y-%m-%d %H:%M'),
-                                "duration": "Hedef"
-                            }
-                            
-                            # İstatistikleri güncelle
-                            stats["successful_signals"] += 1
-                            stats["total_profit_loss"] += profit_usd
-                            
-                            # Stop cooldown'a ekle
-                            stop_cooldown[symbol] = datetime.now()
-                            
-                            # Cooldown'ı veritabanına kaydet
-                            save_stop_cooldown_to_db(stop_cooldown)
-                            
-                            # Pozisyonu ve aktif sinyali kaldır
-                            if symbol in positions:
-                                del positions[symbol]
-                            del active_signals[symbol]
-                            
-                            # Global değişkenleri hemen güncelle (hızlı kontrol için)
-                            global_active_signals = active_signals.copy()
-                            global_positions = positions.copy()
-                            global_stats = stats.copy()
-                            global_stop_cooldown = stop_cooldown.copy()
-                            global_successful_signals = successful_signals.copy()
-                            global_failed_signals = failed_signals.copy()
-
-                            print(f"📢 Hedef mesajı monitor_signals() tarafından gönderilecek")
-                            
-                        # Kripto özel timeframe'ler stop kontrolü: Güncel fiyat stop'u geçti mi? (SATIŞ: yukarı çıkması zarar)
-                        # GÜVENLİK KONTROLÜ: Fiyat gerçekten stop'u geçti mi?
-                        # Minimum fark kontrolü: Fiyat stop'u en az 0.1% geçmeli (daha güvenli)
-                        min_stop_diff = stop_loss * 0.001  # %0.1 minimum fark
-                        if last_price >= stop_loss and (last_price - stop_loss) >= min_stop_diff:
-                            
-                            # Kripto özel timeframe'ler ile STOP OLDU! 🛑
-                            # Güvenli zarar hesaplaması
-                            if entry_price > 0:
-                                loss_percentage = ((stop_loss - entry_price) / entry_price) * 100
-                                # Kripto özel leverage ile hesapla
-                                crypto_config = CRYPTO_SETTINGS.get(symbol, {})
-                                leverage = crypto_config.get("leverage", 10)
-                                loss_usd = 100 * (loss_percentage / 100) * leverage  # 100$ yatırım için
-                            else:
-                                loss_percentage = 0
-                                loss_usd = 0
-                            
-                            print(f"🛑 STOP OLDU! {symbol} - Giriş: ${entry_price:.4f}, Stop: ${stop_loss:.4f}, Çıkış: ${last_price:.4f}")
-                            print(f"💸 Zarar: %{loss_percentage:.2f} (${loss_usd:.2f})")
-                            
-                            # Başarısız sinyali kaydet
-                            failed_signals[symbol] = {
-                                "symbol": symbol,
-                                "type": signal_type,
-                                "entry_price": entry_price,
-                                "stop_loss": stop_loss,
-                                "exit_price": last_price,
-                                "loss_percentage": loss_percentage,
-                                "loss_usd": loss_usd,
-                                "entry_time": active_signals[symbol]["signal_time"],
-                                "exit_time": datetime.now().strftime('%Y-%m-%d %H:%M'),
-                                "duration": "Stop"
-                            }
-                            
-                            # İstatistikleri güncelle
-                            stats["failed_signals"] += 1
-                            stats["total_profit_loss"] -= loss_usd
-                            
-                            # Stop cooldown'a ekle
-                            stop_cooldown[symbol] = datetime.now()
-                            
-                            # Cooldown'ı veritabanına kaydet
-                            save_stop_cooldown_to_db(stop_cooldown)
-                            
-                            # Pozisyonu ve aktif sinyali kaldır
-                            if symbol in positions:
-                                del positions[symbol]
-                            del active_signals[symbol]
-                            
-                            # MESAJ GÖNDERİMİ KALDIRILDI - monitor_signals() fonksiyonu mesaj gönderecek
-                            print(f"📢 Stop mesajı monitor_signals() tarafından gönderilecek")
-                    
-                except Exception as e:
-                    print(f"Aktif sinyal güncelleme hatası: {symbol} - {str(e)}")
-                    continue
-            
-            # Aktif sinyal kontrolü özeti
-            if active_signals:
-                print(f"✅ AKTİF SİNYAL KONTROLÜ TAMAMLANDI ({len(active_signals)} sinyal)")
-                for symbol in list(active_signals.keys()):
-                    if symbol in active_signals:
-                        entry_price = active_signals[symbol].get("entry_price_float", 0)
-                        
-                        try:
-                            ticker = client.futures_ticker(symbol=symbol)
-                            current_price = float(ticker['lastPrice'])
-                        except Exception as e:
-                            current_price = active_signals[symbol].get("current_price_float", 0)
-                            print(f"   ⚠️ {symbol}: İstatistik için gerçek zamanlı fiyat alınamadı, kayıtlı değer kullanılıyor: ${current_price:.6f} (Hata: {e})")
-                        
-                        if current_price > 0 and entry_price > 0:
-                            # Pozisyon tipine göre kâr/zarar hesaplama
-                            signal_type = active_signals[symbol].get('type', 'ALIŞ')
-                            if signal_type == "ALIŞ" or signal_type == "ALIS":
-                                change_percent = ((current_price - entry_price) / entry_price) * 100
-                            else:  # SATIŞ
-                                change_percent = ((entry_price - current_price) / entry_price) * 100
-                            print(f"   📊 {symbol}: Giriş: ${entry_price:.6f} → Güncel: ${current_price:.6f} (%{change_percent:+.2f})")
-            else:
-                print("ℹ️ Aktif sinyal kalmadı")
-            
             # Aktif sinyalleri dosyaya kaydet
             with open('active_signals.json', 'w', encoding='utf-8') as f:
                 json.dump({
-                    "active_signals": active_signals,
+                    "active_signals": {symbol: signal.to_doc() for symbol, signal in active_signals.items()},
                     "count": len(active_signals),
                     "last_update": str(datetime.now())
                 }, f, ensure_ascii=False, indent=2)
             
-            # İstatistikleri güncelle
-            stats["active_signals_count"] = len(active_signals)
-            stats["tracked_coins_count"] = len(tracked_coins)
-            
-            # Global değişkenleri güncelle (bot komutları için)
-            global_stats = stats.copy()
-            global_active_signals = active_signals.copy()
+            # Global değişkenleri güncelle (bot komutları için; pozisyonlar motorda, istatistik ve cooldown'lar repository'de)
             global_successful_signals = successful_signals.copy()
             global_failed_signals = failed_signals.copy()
-            global_positions = positions.copy()
-            global_stop_cooldown = stop_cooldown.copy()
             global_allowed_users = ALLOWED_USERS.copy()
             global_admin_users = ADMIN_USERS.copy()
-            
-            save_stats_to_db(stats)
-            save_active_signals_to_db(active_signals)
-            save_positions_to_db(positions)  # ✅ POZİSYONLARI DA KAYDET
 
             # İstatistik özeti yazdır
             print(f"📊 İSTATİSTİK ÖZETİ:")
@@ -3436,251 +4402,611 @@ async def signal_processing_loop():
             print(f"Genel hata: {e}")
             await asyncio.sleep(30)  # 30 saniye (çok daha hızlı)
 
-async def monitor_signals():
-    print("🚀 Sinyal izleme sistemi başlatıldı! (Veri Karışıklığı Düzeltildi)")
-    
-    while True:
+def submit_position(symbol, position):
+    """Yeni pozisyonu pozisyon motoruna bırakır; kaydetme ve izleme motorun bir sonraki turunda yapılır"""
+    global_position_events.append(("open", symbol, position))
+    position_engine_wakeup.set()
+
+def request_position_close(symbol, trigger_type, final_price, trigger_time=None):
+    """Motor dışından (ör. migration, aggTrade akışı) gelen kapatma isteği; kapanışı yine motor yazar"""
+    global_position_events.append(("close", symbol, {"trigger_type": trigger_type, "final_price": final_price, "trigger_time": trigger_time}))
+    position_engine_wakeup.set()
+
+def request_position_engine_reload():
+    """DB dışarıdan değiştirildiğinde (ör. /clearall) motor durumunu DB'den yeniden yükletir"""
+    global_position_events.append(("reload", None, None))
+    position_engine_wakeup.set()
+
+async def wait_for_position_events(timeout):
+    """Motor turu arası bekleme; yeni olay (ör. aggTrade tetiklemesi) gelirse hemen uyanır"""
+    try:
+        await asyncio.wait_for(position_engine_wakeup.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    position_engine_wakeup.clear()
+
+def load_position_engine_state():
+    """
+    Pozisyonları ve aktif sinyalleri DB'den okur; yetim aktif sinyalleri siler, eksikleri oluşturur (DB thread
+    havuzunda çalışabilir). DB erişilemiyorsa veya aktarılmamış yazım varsa None döner.
+    """
+    if not mongodb_state_current():
+        return None
+    positions = load_positions_from_db()
+    active_signals = load_active_signals_from_db()
+
+    orphan_removals = MongoUnitOfWork("Yetim aktif sinyal silme")
+    for symbol in list(active_signals.keys()):
+        if symbol not in positions:
+            print(f"⚠️ {symbol} → Positions'da yok, aktif sinyallerden kaldırılıyor")
+            del active_signals[symbol]
+            orphan_removals.delete(active_signals_collection, symbol)
+    orphan_removals.commit()
+
+    # DB'de aktif sinyali olmayan pozisyonlar için oluştur
+    missing_signals = {symbol: ActiveSignal.from_position(position) for symbol, position in positions.items() if symbol not in active_signals}
+    if missing_signals:
+        print(f"ℹ️ {len(missing_signals)} pozisyon için aktif sinyal bulunamadı, pozisyonlardan oluşturuluyor...")
+        active_signals.update(missing_signals)
+        save_active_signals_to_db(missing_signals)
+    return positions, active_signals
+
+def apply_position_engine_state(state):
+    """Okunan pozisyonları ve aktif sinyalleri motor durumuna yazar (event loop üzerinde); state None ise motor durumu korunur"""
+    global position_engine_loaded
+    if state is None:
+        print(f"⚠️ MongoDB erişilemiyor veya aktarılmamış yazım var, pozisyon motoru bellekteki {len(global_positions)} pozisyonla devam ediyor")
+        return False
+    positions, active_signals = state
+    global_positions.clear()
+    global_positions.update(positions)
+    global_active_signals.clear()
+    global_active_signals.update(active_signals)
+    global_trigger_index.sync_signals(global_active_signals)
+    position_engine_loaded = True
+    print(f"📂 Pozisyon motoru durumu yüklendi: {len(global_positions)} pozisyon, {len(global_active_signals)} aktif sinyal")
+    return True
+
+def reload_position_engine_state():
+    """Pozisyonları ve aktif sinyalleri DB'den motor durumuna yükler; yetim aktif sinyalleri siler, eksikleri oluşturur"""
+    flush_active_signal_updates(force=True)  # Bekleyen değişiklikler DB'den okunan eski değerlerle ezilmesin
+    return apply_position_engine_state(load_position_engine_state())
+
+async def reload_position_engine_state_async():
+    """reload_position_engine_state'in event loop'u bloklamayan hali (DB okuma/yazmaları thread havuzunda)"""
+    await flush_active_signal_updates_async(force=True)
+    return apply_position_engine_state(await run_db(load_position_engine_state))
+
+async def reconcile_position_engine_state_async():
+    """
+    Anlık görüntüden yüklenen motor durumunu DB ile uzlaştırır (motor olayı olarak çalışır, açılış/kapanışla
+    yarışmaz). Hangi pozisyonların açık olduğunda DB esastır: DB'de olmayanlar çıkarılır, bellekte olmayanlar
+    eklenir. İkisinde de olan aktif sinyallerde mum watermark'ı ileride olan kopya korunur.
+    """
+    await flush_active_signal_updates_async(force=True)
+    state = await run_db(load_position_engine_state)
+    if state is None:
+        return False  # DB henüz güncel değil: reconcile_runtime_snapshot tekrar ister
+    positions, active_signals = state
+    removed = [symbol for symbol in global_positions if symbol not in positions and symbol not in unsaved_positions]
+    added = [symbol for symbol in positions if symbol not in global_positions]
+    for symbol in removed:
+        global_positions.pop(symbol, None)
+        global_active_signals.pop(symbol, None)
+        discard_active_signal_updates(symbol)
+        position_poll_schedule.pop(symbol, None)
+    for symbol in added:
+        global_positions[symbol] = positions[symbol]
+        global_active_signals[symbol] = active_signals[symbol]
+    for symbol, signal in active_signals.items():
+        current = global_active_signals.get(symbol)
+        if current is not None and signal.last_checked_candle > current.last_checked_candle:
+            global_active_signals[symbol] = signal
+    global_trigger_index.sync_signals(global_active_signals)
+    snapshot_reconcile_pending["positions"] = False
+    print(f"🔄 Pozisyon motoru MongoDB ile uzlaştırıldı: {len(added)} pozisyon eklendi, {len(removed)} çıkarıldı ({len(global_positions)} açık)")
+    return True
+
+async def apply_position_events():
+    """Kuyruktaki açma/kapatma/yeniden yükleme olaylarını sırayla uygular"""
+    while global_position_events:
+        event, symbol, data = global_position_events.pop(0)
+        if event == "reload":
+            await reload_position_engine_state_async()
+        elif event == "reconcile":
+            await reconcile_position_engine_state_async()
+        elif event == "open":
+            if symbol in global_positions:
+                print(f"⏸️ {symbol} → Zaten aktif pozisyon var, yeni pozisyon eklenmedi")
+                continue
+            # Sinyal zaten gönderildi: pozisyon DB yazımından bağımsız olarak izlenir (kesintide yazım tampona alınır)
+            global_positions[symbol] = data
+            global_active_signals[symbol] = ActiveSignal.from_position(data)
+            request_runtime_snapshot()
+            print(f"📥 {symbol} pozisyonu motora eklendi")
+            if not await run_db(save_positions_to_db, {symbol: data}):
+                unsaved_positions.add(symbol)
+                print(f"❌ {symbol} pozisyonu MongoDB'ye yazılamadı! Motorda izleniyor, kayıt her turda tekrar denenecek")
+                await send_admin_message(f"❌ {symbol} pozisyonu MongoDB'ye yazılamadı; motorda izleniyor, kayıt tekrar denenecek.")
+        elif event == "close":
+            await finalize_position(symbol, data["trigger_type"], data["final_price"], data.get("trigger_time"))
+
+async def retry_unsaved_positions():
+    """DB'ye yazılamamış pozisyonların kaydını tekrar dener (motor turu başında)"""
+    for symbol in list(unsaved_positions):
+        position = global_positions.get(symbol)
+        if position is None:
+            unsaved_positions.discard(symbol)
+        elif await run_db(save_positions_to_db, {symbol: position}):
+            unsaved_positions.discard(symbol)
+            print(f"✅ {symbol} pozisyonu MongoDB'ye tekrar denemede yazıldı")
+
+async def finalize_position(symbol, trigger_type, final_price, trigger_time=None):
+    """Pozisyonu motor durumundan çıkarır ve kapanışı yazar; çıkarılmış bir pozisyon ikinci kez kapatılamaz"""
+    position = global_positions.pop(symbol, None)
+    signal = global_active_signals.pop(symbol, None)
+    global_trigger_index.remove(symbol, symbol)
+    discard_active_signal_updates(symbol)
+    position_poll_schedule.pop(symbol, None)
+    aggtrade_pending_closes.discard(symbol)
+    if position is None:
+        print(f"⚠️ {symbol} pozisyonu motorda yok (zaten kapatılmış). Yinelenen işlem engellendi.")
+        return False
+    # Hiç yazılamamış pozisyonun DB'de sahiplenilecek dokümanı yoktur; kapanış yine de yazılır
+    claim = symbol not in unsaved_positions or await run_db(save_positions_to_db, {symbol: position})
+    unsaved_positions.discard(symbol)
+    await close_position(symbol, trigger_type, final_price, position, signal, trigger_time=trigger_time, claim=claim)
+    request_runtime_snapshot()
+    return True
+
+# ============================================================================
+# AGGTRADE AKIŞI (opsiyonel): tetiği ilk geçen işlemin tam zamanı ve fiyatı
+# ============================================================================
+
+position_engine_wakeup = asyncio.Event()  # Yeni olay geldiğinde motor turunu beklemeden uyandırır
+aggtrade_buffers = {}  # {symbol: deque((agg_id, price, trade_time_ms))} - son AGGTRADE_BUFFER_SIZE işlem
+aggtrade_pending_closes = set()  # Akışın kapatma isteği gönderdiği, motorun henüz kapatmadığı semboller
+
+def record_aggtrade(symbol, agg_id, price, trade_time):
+    """İşlemi sembolün sınırlı tamponuna ekler; daha önce görülmüş işlemse (akış/REST çakışması) False döner"""
+    buffer = aggtrade_buffers.get(symbol)
+    if buffer is None:
+        buffer = aggtrade_buffers[symbol] = deque(maxlen=AGGTRADE_BUFFER_SIZE)
+    if buffer and agg_id <= buffer[-1][0]:
+        return False
+    buffer.append((agg_id, price, trade_time))
+    return True
+
+def check_aggtrade_trigger(symbol, price, trade_time):
+    """
+    İşlem fiyatını seviye indeksinde eşler; tetiklerse kapatmayı işlemin fiyatı ve zamanıyla motora bildirir.
+    Geçmiş mumları yakalanan pozisyonlar atlanır (ilk dokunuş mum taramasıyla bulunmalı).
+    """
+    signal = global_active_signals.get(symbol)
+    if signal is None or symbol in aggtrade_pending_closes or signal.status != "active":
+        return False
+    if not is_trigger_watermark_current(signal) or trade_time < (signal.entry_timestamp or 0):
+        return False
+    update_position_excursion(symbol, signal, price, price)
+    for event in global_trigger_index.match_price(symbol, price):
+        if event["key"] != symbol:
+            continue
+        label = "TP" if event["trigger_type"] == "take_profit" else "SL"
+        trade_clock = datetime.fromtimestamp(trade_time / 1000).strftime('%H:%M:%S.%f')[:-3]
+        print(f"⚡ AGGTRADE TETİKLEDİ: {symbol}, {label}: ${event['level']:.6f}, İşlem: ${price:.6f} ({trade_clock})")
+        aggtrade_pending_closes.add(symbol)
+        request_position_close(symbol, event["trigger_type"], price, trigger_time=trade_time)
+        return True
+    return False
+
+def handle_aggtrade_message(data):
+    """Binance aggTrade olayını ({"s", "a", "p", "T"}) tampona yazar ve tetik kontrolü yapar"""
+    try:
+        symbol = data["s"]
+        agg_id, price, trade_time = int(data["a"]), float(data["p"]), int(data["T"])
+    except (KeyError, ValueError, TypeError):
+        return
+    if record_aggtrade(symbol, agg_id, price, trade_time):
+        check_aggtrade_trigger(symbol, price, trade_time)
+
+def find_trigger_trade(symbol, trigger_type, start_ms, end_ms):
+    """
+    Tampondaki işlemlerden [start_ms, end_ms) aralığında trigger_type'ı ilk tetikleyeni döndürür:
+    (fiyat, zaman_ms) veya tampon aralığı kapsamıyorsa None. Mum taramasının high/low fiyatını düzeltmek için.
+    """
+    buffer = aggtrade_buffers.get(symbol)
+    if not buffer or buffer[0][2] > start_ms:
+        return None
+    for _, price, trade_time in buffer:
+        if trade_time < start_ms:
+            continue
+        if trade_time >= end_ms:
+            break
+        for event in global_trigger_index.match_price(symbol, price):
+            if event["key"] == symbol and event["trigger_type"] == trigger_type:
+                return price, trade_time
+    return None
+
+async def fill_aggtrade_gap(session, symbols):
+    """
+    Yeniden bağlanmada, tamponda son görülen işlemden sonraki işlemleri REST ile çeker ve tetik
+    kontrolünden geçirir; bağlantı kopukken olan tetiklemeler de tam işlemiyle bulunur.
+    """
+    for symbol in symbols:
+        buffer = aggtrade_buffers.get(symbol)
+        if not buffer:
+            continue  # Henüz işlem görülmedi: boşluk yok, mum taraması yedek olarak kalır
+        url = f"{BINANCE_FUTURES_URL}/fapi/v1/aggTrades?symbol={symbol}&fromId={buffer[-1][0] + 1}&limit={AGGTRADE_GAP_FILL_LIMIT}"
+        try:
+            trades = await api_request_with_retry(session, url, ssl=False)
+        except Exception as e:
+            print(f"⚠️ {symbol} - aggTrade boşluğu doldurulamadı: {e}")
+            continue
+        for trade in trades or []:
+            handle_aggtrade_message({"s": symbol, **trade})
+        if trades and len(trades) >= AGGTRADE_GAP_FILL_LIMIT:
+            print(f"⏩ {symbol} - aggTrade boşluğu {AGGTRADE_GAP_FILL_LIMIT} işlemden uzun, kalanı mum taramasıyla kontrol edilecek")
+
+async def aggtrade_stream():
+    """
+    Açık pozisyonların sembolleri için Binance aggTrade combined stream'i dinler. Sembol kümesi
+    değiştiğinde veya bağlantı koptuğunda yeniden bağlanır ve aradaki işlemleri REST ile doğrular.
+    Anlık fiyat ve mum kontrolü pozisyon motorunda yedek olarak çalışmaya devam eder.
+    """
+    print("🚀 aggTrade akışı başlatıldı!")
+    while True:
+        symbols = sorted(global_active_signals)
+        if not symbols:
+            await asyncio.sleep(POSITION_ENGINE_IDLE_SECONDS)
+            continue
+        streams = "/".join(f"{symbol.lower()}@aggTrade" for symbol in symbols)
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.ws_connect(f"{BINANCE_FUTURES_WS_URL}/stream?streams={streams}", heartbeat=30) as ws:
+                    print(f"🔌 aggTrade akışına bağlanıldı: {', '.join(symbols)}")
+                    await fill_aggtrade_gap(session, symbols)
+                    while sorted(global_active_signals) == symbols:
+                        try:
+                            msg = await ws.receive(timeout=POSITION_ENGINE_INTERVAL_SECONDS)
+                        except asyncio.TimeoutError:
+                            continue
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            handle_aggtrade_message(json.loads(msg.data).get("data", {}))
+                        elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            print("⚠️ aggTrade bağlantısı kapandı, yeniden bağlanılıyor...")
+                            break
+            # Kapanan pozisyonların tamponlarını bırak
+            for symbol in list(aggtrade_buffers):
+                if symbol not in global_active_signals:
+                    del aggtrade_buffers[symbol]
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ aggTrade akışı hatası: {e}")
+            await asyncio.sleep(5)
+
+async def fetch_position_prices(session, symbols):
+    """
+    Pozisyon motorunun tek piyasa verisi kaynağı: tüm semboller için tek /fapi/v1/ticker/price isteği.
+    İstek sayısı açık pozisyon sayısından bağımsızdır. {symbol: son fiyat} döner; alınamayanlar dahil edilmez.
+    """
+    if not symbols:
+        return {}
+    try:
+        tickers = await api_request_with_retry(session, f"{BINANCE_FUTURES_URL}/fapi/v1/ticker/price", ssl=False)
+    except Exception as e:
+        print(f"⚠️ Toplu fiyat verisi alınamadı, bu turda kayıtlı fiyatlar kullanılacak: {e}")
+        return {}
+
+    wanted = set(symbols)
+    prices = {}
+    for ticker in tickers or []:
+        symbol = ticker.get('symbol')
+        if symbol in wanted:
+            try:
+                prices[symbol] = float(ticker['price'])
+            except (KeyError, ValueError, TypeError):
+                continue
+    missing = wanted - prices.keys()
+    if missing:
+        print(f"   ⚠️ Fiyat snapshot'ında bulunamayan semboller: {', '.join(sorted(missing))}")
+    return prices
+
+position_poll_schedule = {}  # {symbol: {"last_poll", "interval", "atr", "atr_candle"}} - mum tarama önceliği
+position_poll_budget = {"tokens": 0.0, "refilled_at": None}  # Token bucket: dakikada POSITION_POLL_BUDGET_PER_MINUTE
+
+def update_position_atr(symbol, klines):
+    """Kapanmış yeni 1m mumlarla pozisyonun Wilder ATR tahminini günceller"""
+    schedule = position_poll_schedule.setdefault(symbol, {})
+    last_closed = last_closed_kline_open_time(klines)
+    previous_close = None
+    for kline in klines:
+        open_time = int(kline[0])
+        high, low, close = float(kline[2]), float(kline[3]), float(kline[4])
+        if last_closed is not None and open_time <= last_closed and open_time > schedule.get("atr_candle", 0):
+            true_range = high - low if previous_close is None else max(high - low, abs(high - previous_close), abs(low - previous_close))
+            atr = schedule.get("atr")
+            schedule["atr"] = true_range if atr is None else atr + (true_range - atr) / POSITION_ATR_PERIOD
+            schedule["atr_candle"] = open_time
+        previous_close = close
+
+def position_trigger_distance(symbol, signal, price):
+    """En yakın TP/SL seviyesine uzaklık, ATR cinsinden (ATR yoksa fiyatın POSITION_DEFAULT_ATR_PCT'si); fiyat yoksa 0"""
+    if price is None:
+        return 0.0
+    distance = min(abs(price - signal.target_price), abs(price - signal.stop_loss))
+    atr = position_poll_schedule.get(symbol, {}).get("atr") or price * POSITION_DEFAULT_ATR_PCT
+    return distance / atr if atr > 0 else 1.0
+
+def plan_position_poll_interval(symbol, signal, price):
+    """
+    Mum tarama aralığı: tetiğe ATR cinsinden uzaklıkla orantılı; 1 ATR uzaklık = POSITION_POLL_MIN_SECONDS,
+    en fazla POSITION_POLL_MAX_SECONDS. Fiyatı bilinmeyen pozisyon en sık taranır.
+    """
+    interval = POSITION_POLL_MIN_SECONDS * position_trigger_distance(symbol, signal, price)
+    return min(max(interval, POSITION_POLL_MIN_SECONDS), POSITION_POLL_MAX_SECONDS)
+
+def select_positions_to_poll(prices, now=None, now_ms=None):
+    """
+    Bu turda mum taraması yapılacak semboller. Aralıklar her fiyat snapshot'ında yeniden hesaplanır;
+    vadesi gelenler tetiğe (ATR cinsinden) en yakından başlayarak istek bütçesi kadar seçilir.
+    Watermark'ı POSITION_POLL_MAX_SECONDS'tan fazla geride kalanlar (kesinti, yeniden başlatma veya
+    bütçeye sığmayan uzak pozisyonlar) bu sıralamadan ayrı, en eski watermark'tan başlayarak bütçenin
+    POSITION_CATCHUP_BUDGET_SHARE payıyla yakalanır. Anlık fiyat kontrolü her pozisyonda her turda sürer.
+    """
+    now = time.monotonic() if now is None else now
+    budget = position_poll_budget
+    if budget["refilled_at"] is not None:
+        budget["tokens"] += (now - budget["refilled_at"]) * POSITION_POLL_BUDGET_PER_MINUTE / 60
+    else:
+        budget["tokens"] = POSITION_POLL_BUDGET_PER_MINUTE / 6
+    budget["tokens"] = min(budget["tokens"], max(1.0, POSITION_POLL_BUDGET_PER_MINUTE / 6))  # En fazla 10 sn'lik birikim
+    budget["refilled_at"] = now
+
+    due = []
+    lagging = []
+    for symbol, signal in global_active_signals.items():
+        schedule = position_poll_schedule.setdefault(symbol, {})
         try:
-            active_signals = load_active_signals_from_db()
+            distance = position_trigger_distance(symbol, signal, prices.get(symbol))
+            schedule["interval"] = plan_position_poll_interval(symbol, signal, prices.get(symbol))
+        except (ValueError, TypeError):
+            distance, schedule["interval"] = 0.0, POSITION_POLL_MIN_SECONDS
+        due_at = schedule.get("last_poll", float("-inf")) + schedule["interval"]
+        if due_at <= now:
+            due.append((distance, due_at, symbol))
+        if trigger_watermark_lag_seconds(signal, now_ms) > POSITION_POLL_MAX_SECONDS:
+            lagging.append((signal.last_checked_candle, symbol))
+
+    selected = set()
+    reserved = math.ceil(budget["tokens"] * POSITION_CATCHUP_BUDGET_SHARE) if lagging else 0
+    for _, _, symbol in sorted(due):
+        if budget["tokens"] - reserved < 1:
+            break
+        budget["tokens"] -= 1
+        selected.add(symbol)
+    for _, symbol in sorted(lagging):
+        if budget["tokens"] < 1:
+            break
+        if symbol not in selected:
+            budget["tokens"] -= 1
+            selected.add(symbol)
+    return selected
+
+def calculate_excursion_percents(side, entry_price, max_price, min_price):
+    """Giriş fiyatına göre (MFE, MAE) yüzdeleri: ALIŞ'ta lehte yön max, SATIŞ'ta min fiyattır"""
+    if not entry_price:
+        return 0.0, 0.0
+    if side is Side.SHORT:
+        mfe = (entry_price - min_price) / entry_price * 100
+        mae = (max_price - entry_price) / entry_price * 100
+    else:
+        mfe = (max_price - entry_price) / entry_price * 100
+        mae = (entry_price - min_price) / entry_price * 100
+    return max(mfe, 0.0), max(mae, 0.0)
 
-            if not active_signals:
-                await asyncio.sleep(5)  # MONITOR_SLEEP_EMPTY 
-                continue
+def update_position_excursion(symbol, signal, high, low):
+    """
+    Pozisyonun bellekteki max/min fiyatını ve MFE/MAE yüzdelerini bir mum high/low değeriyle (veya
+    anlık fiyat/işlem için high = low) genişletir. Değişiklik yazma kuyruğuna eklenir; DB'ye
+    ACTIVE_SIGNAL_FLUSH_SECONDS aralığında ve kapanışta kapanış kaydıyla yazılır.
+    """
+    max_price = signal.max_price or signal.entry_price or high
+    min_price = signal.min_price or signal.entry_price or low
+    if high <= max_price and low >= min_price:
+        return False
+    signal.max_price = max(max_price, high)
+    signal.min_price = min(min_price, low)
+    signal.mfe_percent, signal.mae_percent = calculate_excursion_percents(
+        signal.side, signal.entry_price, signal.max_price, signal.min_price
+    )
+    mark_active_signal_dirty(
+        symbol,
+        max_fields={"max_price": signal.max_price, "mfe_percent": signal.mfe_percent, "mae_percent": signal.mae_percent},
+        min_fields={"min_price": signal.min_price},
+    )
+    return True
+
+def update_position_excursion_from_klines(symbol, signal, klines):
+    """Kline listesinin high/low uçlarıyla MFE/MAE günceller"""
+    if klines:
+        update_position_excursion(symbol, signal, max(float(kline[2]) for kline in klines), min(float(kline[3]) for kline in klines))
+
+def print_position_status(symbol, signal, current_price):
+    """Pozisyonun giriş → güncel fiyat değişimini yazdırır"""
+    entry_price = signal.entry_price
+    if entry_price <= 0 or not current_price or current_price <= 0:
+        return
+    change_percent = signal.side.change_percent(entry_price, current_price)
+    icon = "🟢" if change_percent >= 0 else "🔴"
+    print(f"   {icon} {symbol} ({signal.side.value}): Giriş: ${entry_price:.6f} → Güncel: ${current_price:.6f} ({change_percent:+.2f}%)")
 
-            positions = load_positions_from_db()
-            orphaned_signals = []
-            for symbol in list(active_signals.keys()):
-                if symbol not in positions:
-                    print(f"⚠️ {symbol} → Positions'da yok, aktif sinyallerden kaldırılıyor")
-                    orphaned_signals.append(symbol)
-                    del active_signals[symbol]
-            
-            # Orphaned sinyalleri veritabanından da sil
-            if orphaned_signals:
-                for symbol in orphaned_signals:
-                    try:
-                        mongo_collection.delete_one({"_id": f"active_signal_{symbol}"})
-                        print(f"✅ {symbol} aktif sinyali veritabanından silindi")
-                    except Exception as e:
-                        print(f"❌ {symbol} aktif sinyali silinirken hata: {e}")
-                
-                # Güncellenmiş aktif sinyalleri kaydet
-                save_active_signals_to_db(active_signals)
-                print(f"✅ {len(orphaned_signals)} tutarsız sinyal temizlendi")
-            
-            # Eğer temizlik sonrası aktif sinyal kalmadıysa bekle
-            if not active_signals:
-                await asyncio.sleep(5)  # MONITOR_SLEEP_EMPTY 
+def set_active_signal_price(symbol, signal, price):
+    """Aktif sinyalin güncel fiyatını günceller; DB'ye toplu ve aralıklı yazılır"""
+    signal.current_price = price
+    signal.last_update = str(datetime.now())
+    mark_active_signal_dirty(symbol, set_fields={"current_price": price, "last_update": signal.last_update})
+
+async def evaluate_position(session, symbol, signal, last_price, scan_klines=True):
+    """
+    Tek pozisyon için TP/SL kontrolü: her turda anlık fiyat (seviye indeksi), sıra geldiyse watermark
+    sonrası 1m mumlar. Anlık fiyat tetiklediğinde watermark gerideyse önce geçmiş mumlar taranır:
+    seviyeye daha önce dokunulduysa kapanış o mumdan yazılır.
+    """
+    print_position_status(symbol, signal, last_price if last_price is not None else signal.current_price)
+
+    if signal.status != "active":
+        print(f"ℹ️ {symbol} sinyali henüz aktif değil (durum: {signal.status}), atlanıyor.")
+        return
+
+    # Güncel fiyat her turda toplu fiyat snapshot'ından (mum taraması bu turda atlansa da /active güncel kalır)
+    if last_price is not None:
+        set_active_signal_price(symbol, signal, last_price)
+
+    # 1. ANLIK FİYAT KONTROLÜ
+    if last_price is not None:
+        update_position_excursion(symbol, signal, last_price, last_price)
+        for event in global_trigger_index.match_price(symbol, last_price):
+            if event["key"] != symbol:
                 continue
+            label = "TP" if event["trigger_type"] == "take_profit" else "SL"
+            # İlk dokunuş yakalanmamış mumlarda olabilir: watermark güncellenene kadar mumlar taranır
+            while not is_trigger_watermark_current(signal):
+                checked = signal.last_checked_candle
+                if await scan_position_klines(session, symbol, signal, last_price) or signal.last_checked_candle <= checked:
+                    break
+            if symbol not in global_positions:
+                return  # Mumlarda daha erken tetik bulundu ve kapatıldı
+            print(f"💥 ANLIK TETİKLENDİ: {symbol}, {label}: ${event['level']:.6f}, Fiyat: ${last_price:.6f}")
+            await finalize_position(symbol, event["trigger_type"], last_price)
+            return
 
-            print(f"🔍 {len(active_signals)} aktif sinyal izleniyor...")
-            print(f"🚨 MONITOR DEBUG: Bu fonksiyon çalışıyor!")
-            
-            # Aktif sinyallerin detaylı durumunu yazdır
-            for symbol, signal in active_signals.items():
-                try:
-                    symbol_entry_price_raw = signal.get('entry_price_float', signal.get('entry_price', 0))
-                    symbol_entry_price = float(str(symbol_entry_price_raw).replace('$', '').replace(',', '')) if symbol_entry_price_raw is not None else 0.0
-                    
-                    if symbol_entry_price <= 0:
-                        print(f"⚠️ {symbol}: Geçersiz giriş fiyatı ({symbol_entry_price}), sinyal atlanıyor")
-                        continue
+    if not scan_klines:
+        return  # Mum taraması önceliğe göre daha sonraki bir turda (watermark sayesinde mum kaçmaz)
+    await scan_position_klines(session, symbol, signal, last_price)
 
-                    try:
-                        ticker = client.futures_ticker(symbol=symbol)
-                        current_price = float(ticker['lastPrice'])
-                    except Exception as e:
-                        current_price_raw = signal.get('current_price_float', symbol_entry_price)
-                        current_price = float(str(current_price_raw).replace('$', '').replace(',', '')) if current_price_raw is not None else symbol_entry_price
-                        print(f"   ⚠️ {symbol}: Gerçek zamanlı fiyat alınamadı, kayıtlı değer kullanılıyor: ${current_price:.6f} (Hata: {e})")
-                    
-                    target_price_raw = signal.get('target_price', 0)
-                    stop_price_raw = signal.get('stop_loss', 0)
-                    
-                    target_price = float(str(target_price_raw).replace('$', '').replace(',', '')) if target_price_raw is not None else 0.0
-                    stop_price = float(str(stop_price_raw).replace('$', '').replace(',', '')) if stop_price_raw is not None else 0.0
-                    
-                    if target_price <= 0 or stop_price <= 0:
-                        print(f"⚠️ {symbol}: Geçersiz hedef/stop fiyatları (T:{target_price}, S:{stop_price}), sinyal atlanıyor")
-                        continue
-                    
-                    signal_type = str(signal.get('type', 'ALIŞ'))
-                    
-                    if symbol_entry_price > 0 and current_price > 0:
-                        leverage = signal.get('leverage', 10)  # Varsayılan 10x
+async def scan_position_klines(session, symbol, signal, last_price=None):
+    """
+    Watermark'tan (yoksa pozisyon açılışından) sonraki 1m mumlarda TP/SL arar; uzun kesintilerde çağrı
+    başına bir sayfa ilerlenir. Tetik bulunup pozisyon kapatıldıysa True döner.
+    """
+    start_time = plan_trigger_kline_start(signal)
+    url = f"{BINANCE_FUTURES_URL}/fapi/v1/klines?symbol={symbol}&interval=1m&startTime={start_time}&limit={TRIGGER_KLINE_PAGE_LIMIT}"
+    position_poll_schedule.setdefault(symbol, {})["last_poll"] = time.monotonic()
+    try:
+        klines = await api_request_with_retry(session, url, ssl=False)
+    except Exception as e:
+        print(f"⚠️ {symbol} - Mum verisi alınamadı (retry sonrası): {e}")
+        return False
+
+    if not klines:
+        return False
+    update_position_atr(symbol, klines)
+
+    if len(klines) >= TRIGGER_KLINE_PAGE_LIMIT:
+        print(f"⏩ {symbol} - Kaçırılan mumlar taranıyor: {len(klines)} mum ({datetime.fromtimestamp(start_time / 1000).strftime('%Y-%m-%d %H:%M')} itibarıyla)")
+
+    is_triggered, trigger_type, final_price, candle_index, trigger_open_time = check_klines_for_trigger(signal, klines)
+
+    if is_triggered:
+        candle_time = datetime.fromtimestamp(trigger_open_time / 1000).strftime('%Y-%m-%d %H:%M')
+        print(f"💥 MUM TETİKLEDİ: {symbol}, Tip: {trigger_type}, Fiyat: {final_price}, Mum: #{candle_index}/{len(klines)} ({candle_time})")
+        # aggTrade tamponu mumu kapsıyorsa high/low yerine tetiği ilk geçen işlemin fiyatı ve zamanı
+        trigger_time = None
+        trade = find_trigger_trade(symbol, trigger_type, trigger_open_time, trigger_open_time + KLINE_INTERVAL_MS)
+        if trade:
+            final_price, trigger_time = trade
+            print(f"⚡ {symbol} - Tetikleyen işlem bulundu: ${final_price:.6f} ({datetime.fromtimestamp(trigger_time / 1000).strftime('%H:%M:%S.%f')[:-3]})")
+        # MFE/MAE tetik mumuna kadar high/low, tetik mumunda çıkış fiyatı ile (seviye sonrası hareket sayılmaz)
+        update_position_excursion_from_klines(symbol, signal, klines[:candle_index])
+        update_position_excursion(symbol, signal, final_price, final_price)
+        await finalize_position(symbol, trigger_type, final_price, trigger_time)
+        return True
+
+    update_position_excursion_from_klines(symbol, signal, klines)
+
+    # Kapanmış mumlar değerlendirildi: watermark'ı ilerlet (açık mum bir sonraki turda tekrar taranır)
+    checked_candle = last_closed_kline_open_time(klines)
+    if checked_candle and checked_candle > signal.last_checked_candle:
+        signal.last_checked_candle = checked_candle
+        mark_active_signal_dirty(symbol, max_fields={"last_checked_candle": checked_candle})
+
+    # Tetikleme yoksa ve snapshot'ta fiyat yoksa güncel fiyatı son mumdan al (max/min yukarıda mum uçlarından)
+    if final_price and last_price is None:
+        set_active_signal_price(symbol, signal, final_price)
+    return False
+
+async def position_engine():
+    """
+    Açık pozisyonların tek sahibi. Tarama döngüsü yeni pozisyonları submit_position ile bırakır;
+    motor her turda olayları uygular, fiyatları tek kaynaktan alır, TP/SL kontrolünü yapar ve
+    kapanışları yazan tek yerdir. Durum main() içinde reload_position_engine_state ile yüklenir.
+    """
+    print("🚀 Pozisyon motoru başlatıldı!")
     
-                        if signal_type == "ALIŞ" or signal_type == "ALIS":
-                            change_percent = ((current_price - symbol_entry_price) / symbol_entry_price) * 100
-                            target_distance = ((target_price - current_price) / current_price) * 100
-                            stop_distance = ((current_price - stop_price) / current_price) * 100
-
-                        else:  # SATIŞ veya SATIS
-                            change_percent = ((symbol_entry_price - current_price) / symbol_entry_price) * 100
-                            target_distance = ((current_price - target_price) / current_price) * 100
-                            stop_distance = ((stop_price - current_price) / current_price) * 100
-                        
-                        investment_amount = 100 
-                        actual_investment = investment_amount * leverage 
-                        profit_loss_usd = (actual_investment * change_percent) / 100
-
-                        if signal_type == "ALIŞ" or signal_type == "ALIS":
-                            if change_percent >= 0:
-                                print(f"   🟢 {symbol} (ALIŞ): Giriş: ${symbol_entry_price:.6f} → Güncel: ${current_price:.6f} (+{change_percent:.2f}%)")
-                            else:
-                                print(f"   🔴 {symbol} (ALIŞ): Giriş: ${symbol_entry_price:.6f} → Güncel: ${current_price:.6f} ({change_percent:.2f}%)")
-                            
-                        else:  # SATIŞ veya SATIS
-                            if change_percent >= 0:
-                                print(f"   🟢 {symbol} (SATIŞ): Giriş: ${symbol_entry_price:.6f} → Güncel: ${current_price:.6f} (+{change_percent:.2f}%)")
-                            else:
-                                print(f"   🔴 {symbol} (SATIŞ): Giriş: ${symbol_entry_price:.6f} → Güncel: ${current_price:.6f} ({change_percent:.2f}%)")
-                        
-                except Exception as e:
-                    print(f"   ⚪ {symbol}: Durum hesaplanamadı - Hata: {e}")
-            
-            for symbol, signal in list(active_signals.items()):
-                try:
-                    if not mongo_collection.find_one({"_id": f"active_signal_{symbol}"}):
-                        print(f"ℹ️ {symbol} sinyali DB'de bulunamadı, bellekten kaldırılıyor.")
-                        del active_signals[symbol]
-                        continue
+    try:
+        await _position_engine_loop()
+    finally:
+        # Kapanışta bekleyen aktif sinyal değişikliklerini kaybetme
+        await flush_active_signal_updates_async(force=True)
 
-                    signal_status = signal.get("status", "pending")
-                    if signal_status != "active":
-                        print(f"ℹ️ {symbol} sinyali henüz aktif değil (durum: {signal_status}), atlanıyor.")
-                        continue
+async def _position_engine_loop():
+    while True:
+        try:
+            await apply_position_events()
+            if unsaved_positions:
+                await retry_unsaved_positions()
 
-                    symbol_entry_price_raw = signal.get('entry_price_float', signal.get('entry_price', 0))
-                    symbol_entry_price = float(str(symbol_entry_price_raw).replace('$', '').replace(',', '')) if symbol_entry_price_raw is not None else 0.0
-                    symbol_target_price = float(str(signal.get('target_price', 0)).replace('$', '').replace(',', ''))
-                    symbol_stop_loss_price = float(str(signal.get('stop_loss', 0)).replace('$', '').replace(',', ''))
-                    symbol_signal_type = signal.get('type', 'ALIŞ')
-                                            
-                    # 3. ANLIK FİYAT KONTROLÜ
-                    try:
-                        ticker = client.futures_ticker(symbol=symbol)
-                        last_price = float(ticker['lastPrice'])
-                        is_triggered_realtime = False
-                        trigger_type_realtime = None
-                        final_price_realtime = None
-                        min_trigger_diff = 0.001  # %0.1 minimum fark
-
-                        if symbol_signal_type == "ALIŞ" or symbol_signal_type == "ALIS":
-                            # ALIŞ pozisyonu için kapanış koşulları
-                            if last_price >= symbol_target_price and (last_price - symbol_target_price) >= (symbol_target_price * min_trigger_diff):
-                                is_triggered_realtime = True
-                                trigger_type_realtime = "take_profit"
-                                final_price_realtime = last_price
-                                print(f"✅ {symbol} - TP tetiklendi: ${last_price:.6f} >= ${symbol_target_price:.6f}")
-                            elif last_price <= symbol_stop_loss_price and (symbol_stop_loss_price - last_price) >= (symbol_stop_loss_price * min_trigger_diff):
-                                is_triggered_realtime = True
-                                trigger_type_realtime = "stop_loss"
-                                final_price_realtime = last_price
-                                print(f"❌ {symbol} - SL tetiklendi: ${last_price:.6f} <= ${symbol_stop_loss_price:.6f}")
-                        elif symbol_signal_type == "SATIŞ" or symbol_signal_type == "SATIS":
-                            # SATIŞ pozisyonu için kapanış koşulları
-                            if last_price <= symbol_target_price and (symbol_target_price - last_price) >= (symbol_target_price * min_trigger_diff):
-                                is_triggered_realtime = True
-                                trigger_type_realtime = "take_profit"
-                                final_price_realtime = last_price
-                                print(f"✅ {symbol} - TP tetiklendi: ${last_price:.6f} <= ${symbol_target_price:.6f}")
-                            elif last_price >= symbol_stop_loss_price and (last_price - symbol_stop_loss_price) >= (symbol_stop_loss_price * min_trigger_diff):
-                                is_triggered_realtime = True
-                                trigger_type_realtime = "stop_loss"
-                                final_price_realtime = last_price
-                                print(f"❌ {symbol} - SL tetiklendi: ${last_price:.6f} >= ${symbol_stop_loss_price:.6f}")
-                        
-                        # 4. POZİSYON KAPATMA İŞLEMİ
-                        if is_triggered_realtime:
-                            print(f"💥 ANLIK TETİKLENDİ: {symbol}, Tip: {trigger_type_realtime}, Fiyat: {final_price_realtime}")
-                            update_position_status_atomic(symbol, "closing", {"trigger_type": trigger_type_realtime, "final_price": final_price_realtime})
-                            
-                            position_data = load_position_from_db(symbol)
-                            if position_data:
-                                if position_data.get('open_price', 0) <= 0:
-                                    print(f"⚠️ {symbol} - Geçersiz pozisyon verileri, pozisyon temizleniyor")
-                                    mongo_collection.delete_one({"_id": f"position_{symbol}"})
-                                    mongo_collection.delete_one({"_id": f"active_signal_{symbol}"})
-                                    active_signals.pop(symbol, None)
-                                    continue
-                            else:
-                                print(f"❌ {symbol} pozisyon verisi yüklenemedi!")
-                                continue
-                            
-                            await close_position(symbol, trigger_type_realtime, final_price_realtime, signal, position_data)
-                            active_signals.pop(symbol, None) # Bellekten de sil
-                            continue # Bu sembol bitti, sonraki sinyale geç.
-                            
-                    except Exception as e:
-                        print(f"⚠️ {symbol} - Anlık ticker fiyatı alınamadı: {e}")
-                    
+            if not global_active_signals:
+                await wait_for_position_events(POSITION_ENGINE_IDLE_SECONDS)
+                continue
+
+            global_trigger_index.sync_signals(global_active_signals)
+
+            # Tur başına tek oturum ve tek fiyat snapshot'ı: durum yazdırma ve TP/SL kontrolü aynı fiyatı kullanır
+            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=10)) as session:
+                prices = await fetch_position_prices(session, list(global_active_signals.keys()))
+                # Mum taraması tetiğe uzaklığa göre önceliklendirilir (anlık fiyat kontrolü her turda)
+                poll_symbols = select_positions_to_poll(prices)
+                print(f"🔍 {len(global_active_signals)} aktif sinyal izleniyor... (mum taraması: {len(poll_symbols)})")
+                for symbol in list(global_active_signals.keys()):
+                    signal = global_active_signals.get(symbol)
+                    if signal is None:  # Bu turda kapatıldı
+                        continue
                     try:
-                        url = f"https://fapi.binance.com/fapi/v1/klines?symbol={symbol}&interval=1m&limit=100"
-                        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=10)) as session:
-                            klines = await api_request_with_retry(session, url, ssl=False)
-                        
+                        await evaluate_position(session, symbol, signal, prices.get(symbol), scan_klines=symbol in poll_symbols)
                     except Exception as e:
-                        print(f"⚠️ {symbol} - Mum verisi alınamadı (retry sonrası): {e}")
-                        continue
+                        print(f"❌ {symbol} sinyali işlenirken döngü içinde hata oluştu: {e}")
 
-                    if not klines:
-                        continue
-                    
-                    is_triggered, trigger_type, final_price = check_klines_for_trigger(signal, klines)
-                    
-                    if is_triggered:
-                        print(f"💥 MUM TETİKLEDİ: {symbol}, Tip: {trigger_type}, Fiyat: {final_price}")
-                        update_position_status_atomic(symbol, "closing", {"trigger_type": trigger_type, "final_price": final_price})
-                        position_data = load_position_from_db(symbol)
-
-                        if position_data:
-                            if position_data.get('open_price', 0) <= 0:
-                                print(f"⚠️ {symbol} - Geçersiz pozisyon verileri, pozisyon temizleniyor")
-                                # Geçersiz pozisyonu temizle
-                                mongo_collection.delete_one({"_id": f"position_{symbol}"})
-                                mongo_collection.delete_one({"_id": f"active_signal_{symbol}"})
-                                del active_signals[symbol]
-                                continue
-                        else:
-                            print(f"❌ {symbol} pozisyon verisi yüklenemedi!")
-                            continue
-                        
-                        await close_position(symbol, trigger_type, final_price, signal, position_data)
-                        del active_signals[symbol]
-                        
-                        print(f"✅ {symbol} izleme listesinden kaldırıldı. Bir sonraki sinyale geçiliyor.")
-                        continue # Bir sonraki sinyale geç
-                    else:
-                        # Tetikleme yoksa, anlık fiyatı güncelle
-                        if final_price:
-                            active_signals[symbol]['current_price'] = format_price(final_price, signal.get('entry_price_float'))
-                            active_signals[symbol]['current_price_float'] = final_price
-                            active_signals[symbol]['last_update'] = str(datetime.now())
-                            
-                            # Max/Min değerleri güncelle
-                            if "max_price" not in active_signals[symbol] or final_price > active_signals[symbol]["max_price"]:
-                                active_signals[symbol]["max_price"] = final_price
-                            if "min_price" not in active_signals[symbol] or final_price < active_signals[symbol]["min_price"]:
-                                active_signals[symbol]["min_price"] = final_price
-                            
-                            # Aktif sinyalleri veritabanına kaydet
-                            save_active_signals_to_db(active_signals)
-                        else:
-                            # Tetikleme yoksa pozisyon hala aktif
-                            print(f"🔍 {symbol} - Mum verisi ile pozisyon hala aktif")
-                    
-                except Exception as e:
-                    print(f"❌ {symbol} sinyali işlenirken döngü içinde hata oluştu: {e}")
-                    if symbol in active_signals:
-                        del active_signals[symbol]
-                    continue
+            # Değişen alanlar aralık dolduğunda tek bulk_write ile yazılır (DB thread havuzunda)
+            await flush_active_signal_updates_async()
 
-            await asyncio.sleep(3) # MONITOR_LOOP_SLEEP_SECONDS - Daha hızlı kontrol için 3 saniye
+            await wait_for_position_events(POSITION_ENGINE_INTERVAL_SECONDS)
         
         except Exception as e:
-            print(f"❌ Ana sinyal izleme döngüsü hatası: {e}")
-            await asyncio.sleep(10)  # MONITOR_SLEEP_ERROR - Hata durumunda bekle
-            active_signals = load_active_signals_from_db()
+            print(f"❌ Pozisyon motoru döngüsü hatası: {e}")
+            await asyncio.sleep(10)  # Hata durumunda bekle
+
+def record_loop_lag(lag_ms):
+    """Bir event loop gecikmesi ölçümünü kaydeder; eşik üstü gecikmeler loglanır"""
+    loop_lag_samples.append(lag_ms)
+    loop_lag_stats["samples"] += 1
+    loop_lag_stats["max_ms"] = max(loop_lag_stats["max_ms"], lag_ms)
+    if lag_ms >= LOOP_LAG_WARN_MS:
+        loop_lag_stats["over_threshold"] += 1
+        print(f"⚠️ Event loop {lag_ms:.0f} ms gecikti (eşik {LOOP_LAG_WARN_MS:.0f} ms)")
+
+async def event_loop_lag_monitor(interval=None):
+    """
+    Event loop gecikmesi: interval kadar uyuyan görevin ne kadar geç uyandığı. Loop'u bloklayan her
+    senkron iş (ör. loop üzerinde yapılan bir Mongo gidiş-dönüşü) bu gecikmeye doğrudan yansır.
+    """
+    interval = LOOP_LAG_INTERVAL_SECONDS if interval is None else interval
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        record_loop_lag(max(0.0, (loop.time() - started - interval) * 1000))
 
 async def web_server():
     """Render için basit web sunucusu"""
@@ -3701,14 +5027,197 @@ async def web_server():
     
     return runner
 
+# ============================================================================
+# ÇALIŞMA ZAMANI ANLIK GÖRÜNTÜSÜ: yeniden başlatmada DB'yi beklemeden açılış
+# ============================================================================
+# Pozisyonlar, aktif sinyaller (mum watermark'larıyla), istatistikler, cooldown'lar, önceki sinyaller ve
+# pozisyon ATR'leri periyodik olarak (ve pozisyon açılış/kapanışında) yerel bir dosyaya yazılır. Açılışta
+# dosya güncelse durum oradan yüklenir ve tarama hemen başlar; MongoDB ile uzlaştırma arka planda yapılır.
+# DB yine esastır: anlık görüntü yalnızca açılışı hızlandırır.
+
+global_previous_signals = {}  # {symbol: {tf: signal}} - sinyal döngüsünün önceki sinyalleri
+previous_signals_initialized = None  # None: DB'den okunur (is_first_run); True/False: anlık görüntüden geldi
+runtime_snapshot_requested = asyncio.Event()  # Pozisyon açılış/kapanışında periyodu beklemeden yazdırır
+snapshot_reconcile_pending = {"repository": False, "positions": False}  # Anlık görüntüden yüklenen, henüz DB ile uzlaştırılmamış kısımlar
+
+def request_runtime_snapshot():
+    """Anlık görüntünün bir sonraki fırsatta yazılmasını ister"""
+    runtime_snapshot_requested.set()
+
+def build_runtime_snapshot():
+    """Bellekteki durumun anlık görüntüsü (event loop üzerinde alınır; değerler kopyalanır)"""
+    active_signals = {}
+    for symbol, signal in global_active_signals.items():
+        doc = signal.to_doc()
+        doc["last_checked_candle"] = signal.last_checked_candle
+        active_signals[symbol] = doc
+    return {
+        "version": RUNTIME_SNAPSHOT_VERSION,
+        "saved_at": datetime.now(timezone.utc),
+        "positions": {symbol: position.to_doc() for symbol, position in global_positions.items()},
+        "active_signals": active_signals,
+        "stats": dict(global_stats),
+        "stop_cooldowns": dict(global_stop_cooldown.items()),
+        "signal_cooldowns": dict(global_signal_cooldown.items()),
+        "previous_signals": {symbol: dict(signals) for symbol, signals in global_previous_signals.items()},
+        "previous_signals_initialized": previous_signals_initialized,
+        "position_atr": {
+            symbol: {"atr": schedule["atr"], "atr_candle": schedule.get("atr_candle", 0)}
+            for symbol, schedule in position_poll_schedule.items()
+            if symbol in global_positions and schedule.get("atr") is not None
+        },
+    }
+
+def write_runtime_snapshot(payload, path=None):
+    """Serileştirilmiş anlık görüntüyü geçici dosyaya yazıp yerine taşır (yarım dosya kalmaz)"""
+    path = path or RUNTIME_SNAPSHOT_PATH
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def save_runtime_snapshot():
+    """Anlık görüntüyü eşzamanlı yazar (kapanışta); durum henüz yüklenmediyse eski dosya korunur"""
+    if not RUNTIME_SNAPSHOT_PATH or not (repository_loaded and position_engine_loaded):
+        return False
+    try:
+        write_runtime_snapshot(json_util.dumps(build_runtime_snapshot()))
+        return True
+    except Exception as e:
+        print(f"⚠️ Anlık görüntü yazılamadı: {e}")
+        return False
+
+async def runtime_snapshot_loop(interval=None):
+    """Anlık görüntüyü periyodik olarak ve istendiğinde yazar; dosya yazımı thread'de yapılır"""
+    interval = interval or RUNTIME_SNAPSHOT_SECONDS
+    while True:
+        try:
+            await asyncio.wait_for(runtime_snapshot_requested.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+        runtime_snapshot_requested.clear()
+        if not RUNTIME_SNAPSHOT_PATH or not (repository_loaded and position_engine_loaded):
+            continue
+        try:
+            payload = json_util.dumps(build_runtime_snapshot())
+            await asyncio.to_thread(write_runtime_snapshot, payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Anlık görüntü yazılamadı: {e}")
+
+def load_runtime_snapshot(path=None, max_age=None):
+    """Anlık görüntüyü okur; dosya yoksa, okunamıyorsa, sürümü farklıysa veya çok eskiyse None"""
+    path = path or RUNTIME_SNAPSHOT_PATH
+    max_age = RUNTIME_SNAPSHOT_MAX_AGE_SECONDS if max_age is None else max_age
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            snapshot = json_util.loads(f.read())
+    except Exception as e:
+        print(f"⚠️ Anlık görüntü okunamadı, DB'den yüklenecek: {e}")
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("version") != RUNTIME_SNAPSHOT_VERSION:
+        print("ℹ️ Anlık görüntü sürümü uyumsuz, DB'den yüklenecek")
+        return None
+    saved_at = snapshot.get("saved_at")
+    if saved_at is not None and saved_at.tzinfo is None:
+        saved_at = saved_at.replace(tzinfo=timezone.utc)
+    age = (datetime.now(timezone.utc) - saved_at).total_seconds() if saved_at else None
+    if age is None or age > max_age:
+        print(f"ℹ️ Anlık görüntü çok eski ({age if age is None else int(age)} sn), DB'den yüklenecek")
+        return None
+    snapshot["age_seconds"] = age
+    return snapshot
+
+def apply_runtime_snapshot(snapshot):
+    """
+    Anlık görüntüyü pozisyon motoruna, repository'ye ve sinyal döngüsüne yükler; bozuk kayıtlar atlanır.
+    DB ile uzlaştırma bekleyen kısımlar snapshot_reconcile_pending'de işaretlenir.
+    """
+    global previous_signals_initialized
+    positions = {}
+    for symbol, data in (snapshot.get("positions") or {}).items():
+        try:
+            positions[symbol] = Position.from_doc(symbol, data)
+        except (ValueError, TypeError, KeyError) as e:
+            print(f"⚠️ {symbol} anlık görüntü pozisyonu atlandı: {e}")
+    active_signals = {}
+    for symbol, doc in (snapshot.get("active_signals") or {}).items():
+        if symbol not in positions:
+            continue
+        try:
+            active_signals[symbol] = ActiveSignal.from_doc(doc)
+        except (ValueError, TypeError, KeyError) as e:
+            print(f"⚠️ {symbol} anlık görüntü aktif sinyali atlandı: {e}")
+    for symbol, position in positions.items():
+        if symbol not in active_signals:
+            active_signals[symbol] = ActiveSignal.from_position(position)
+    apply_position_engine_state((positions, active_signals))
+
+    stats = dict(DEFAULT_STATS)
+    stats.update(snapshot.get("stats") or {})
+    apply_repository_state((stats, snapshot.get("stop_cooldowns") or {}, snapshot.get("signal_cooldowns") or {}))
+
+    if snapshot.get("previous_signals_initialized") is not None:
+        global_previous_signals.clear()
+        global_previous_signals.update(snapshot.get("previous_signals") or {})
+        previous_signals_initialized = snapshot["previous_signals_initialized"]
+    for symbol, atr in (snapshot.get("position_atr") or {}).items():
+        if symbol in positions:
+            position_poll_schedule.setdefault(symbol, {}).update(atr=float(atr["atr"]), atr_candle=int(atr.get("atr_candle") or 0))
+
+    snapshot_reconcile_pending.update(repository=True, positions=True)
+    print(f"⚡ Anlık görüntüden açıldı ({int(snapshot.get('age_seconds') or 0)} sn önce kaydedilmiş): {len(positions)} pozisyon, DB ile uzlaştırma arka planda yapılacak")
+
+async def reconcile_runtime_snapshot(interval=None):
+    """
+    Anlık görüntüden açıldıktan sonra DB erişilebilir ve güncel olunca bozuk kayıtları temizler, repository'yi
+    DB'den yeniden yükler ve pozisyon motoruna uzlaştırma olayı gönderir; hepsi bitene kadar tekrar dener.
+    """
+    interval = interval or MONGODB_HEARTBEAT_SECONDS
+    cleaned = False
+    while any(snapshot_reconcile_pending.values()):
+        try:
+            if await run_db(mongodb_ready):
+                if not cleaned:
+                    await run_db(cleanup_corrupted_positions)
+                    cleaned = True
+                if snapshot_reconcile_pending["repository"] and await reload_repository_async():
+                    snapshot_reconcile_pending["repository"] = False
+                if snapshot_reconcile_pending["positions"] and ("reconcile", None, None) not in global_position_events:
+                    global_position_events.append(("reconcile", None, None))
+                    position_engine_wakeup.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Anlık görüntü uzlaştırma hatası: {e}")
+        await asyncio.sleep(interval)
+
 async def main():
     load_allowed_users()
     await setup_bot()
     await app.initialize()
     await app.start()
     
-    # MongoDB'deki bozuk pozisyon verilerini temizle
-    cleanup_corrupted_positions()
+    # Önceki süreçten kalan aktarılmamış yazımlar (journal) durum okunmadan önce yüklenir ve aktarılır
+    open_write_journal()
+    
+    # Güncel anlık görüntü varsa durum oradan yüklenir ve DB ile uzlaştırma arka planda yapılır
+    snapshot = load_runtime_snapshot()
+    if snapshot is not None:
+        apply_runtime_snapshot(snapshot)
+    else:
+        # MongoDB'deki bozuk pozisyon verilerini temizle
+        cleanup_corrupted_positions()
+        
+        # Açık pozisyonları pozisyon motoruna, istatistik ve cooldown'ları repository'ye yükle
+        # (sonrasında okumalar bellekten; DB'ye yalnızca yazılır)
+        reload_position_engine_state()
+        reload_repository()
     
     try:
         await app.bot.delete_webhook(drop_pending_updates=True)
@@ -3726,8 +5235,17 @@ async def main():
     except Exception as e:
         print(f"Bot polling hatası: {e}")
 
+    # İndikatör hesaplama havuzunu başlat ve worker'ları ısıt
+    await start_indicator_pool()
+
     signal_task = asyncio.create_task(signal_processing_loop())
-    monitor_task = asyncio.create_task(monitor_signals())
+    monitor_task = asyncio.create_task(position_engine())
+    aggtrade_task = asyncio.create_task(aggtrade_stream()) if AGGTRADE_STREAM_ENABLED else None
+    lag_task = asyncio.create_task(event_loop_lag_monitor())
+    heartbeat_task = asyncio.create_task(mongodb_heartbeat())
+    journal_task = asyncio.create_task(write_journal_sync_loop())
+    snapshot_task = asyncio.create_task(runtime_snapshot_loop())
+    reconcile_task = asyncio.create_task(reconcile_runtime_snapshot()) if snapshot is not None else None
     try:
         # Tüm task'ları bekle
         await asyncio.gather(signal_task, monitor_task)
@@ -3741,9 +5259,18 @@ async def main():
             signal_task.cancel()
         if not monitor_task.done():
             monitor_task.cancel()
+        if aggtrade_task is not None and not aggtrade_task.done():
+            aggtrade_task.cancel()
+        lag_task.cancel()
+        heartbeat_task.cancel()
+        journal_task.cancel()
+        snapshot_task.cancel()
+        if reconcile_task is not None:
+            reconcile_task.cancel()
         
         try:
-            await asyncio.gather(signal_task, monitor_task, return_exceptions=True)
+            await asyncio.gather(signal_task, monitor_task, lag_task, heartbeat_task, journal_task, snapshot_task,
+                                 *(task for task in (aggtrade_task, reconcile_task) if task is not None), return_exceptions=True)
         except Exception:
             pass
 
@@ -3764,13 +5291,22 @@ async def main():
         await web_runner.cleanup()
         print("✅ Web sunucusu kapatıldı")
         
+        shutdown_indicator_pool()
+        save_runtime_snapshot()  # Sonraki başlatma DB'yi beklemeden buradan açılır
+        shutdown_db_executor()  # Bekleyen commit'ler biter; hâlâ tamponda olan yazımlar son kez denenir
+        if mongo_write_buffer and mongodb_ready():
+            replay_buffered_writes()
+        if mongo_write_buffer:
+            print(f"⚠️ {len(mongo_write_buffer)} MongoDB yazımı aktarılamadan kapatılıyor (journal'da, sonraki başlatmada aktarılacak)")
+        close_write_journal()
+        
         close_mongodb()
         print("✅ MongoDB bağlantısı kapatıldı")
 
 def clear_previous_signals_from_db():
     """MongoDB'deki tüm önceki sinyal kayıtlarını ve işaret dokümanını siler."""
     try:
-        deleted_count = clear_data_by_pattern("^previous_signal_", "önceki sinyal")
+        deleted_count = clear_collection_data(previous_signals_collection, "önceki sinyal")
         init_deleted = clear_specific_document("previous_signals_initialized", "initialized bayrağı")
         
         print(f"🧹 MongoDB'den {deleted_count} önceki sinyal silindi; initialized={init_deleted}")
@@ -3780,14 +5316,47 @@ def clear_previous_signals_from_db():
         return 0, False
 
 def clear_position_data_from_db():
-    """MongoDB'deki position_ ile başlayan tüm kayıtları siler (clear_positions.py'den uyarlandı)."""
+    """MongoDB'deki tüm pozisyon kayıtlarını siler (clear_positions.py'den uyarlandı)."""
     try:
-        deleted_count = clear_data_by_pattern("^position_", "pozisyon")
+        deleted_count = clear_collection_data(positions_collection, "pozisyon")
         return deleted_count
     except Exception as e:
         print(f"❌ MongoDB'den pozisyonlar silinirken hata: {e}")
         return 0
 
+def clear_all_data_from_db():
+    """/clearall'un DB kısmı: tüm varlık koleksiyonlarını temizler, istatistikleri sıfırlar ve kalanları sayar"""
+    pos_deleted = clear_position_data_from_db()
+    active_deleted = clear_collection_data(active_signals_collection, "aktif sinyal")
+    cooldown_deleted = clear_collection_data(stop_cooldowns_collection, "stop cooldown")
+    signal_cooldown_deleted = clear_collection_data(signal_cooldowns_collection, "sinyal cooldown")
+    prev_deleted, init_deleted = clear_previous_signals_from_db()
+    save_stats_to_db(dict(DEFAULT_STATS))
+    # İşlem geçmişi silinmez (yalnızca ekleme); /stats bu andan sonraki kapanışları sayar
+    bot_state_collection.update_one(
+        {"_id": "trade_history"},
+        {"$set": {"baseline": {"successful_signals": 0, "failed_signals": 0, "total_profit_loss": 0.0}, "reset_at": datetime.now()}},
+        upsert=True
+    )
+    trade_stats_cache.clear()
+    
+    # Son kontrol - kalan dokümanları say
+    try:
+        final_positions = positions_collection.count_documents({})
+        final_active = active_signals_collection.count_documents({})
+        final_cooldown = stop_cooldowns_collection.count_documents({})
+        final_signal_cooldown = signal_cooldowns_collection.count_documents({})
+        
+        print(f"🔍 Temizleme sonrası kontrol:")
+        print(f"   Kalan pozisyon: {final_positions}")
+        print(f"   Kalan aktif sinyal: {final_active}")
+        print(f"   Kalan stop cooldown: {final_cooldown}")
+        print(f"   Kalan sinyal cooldown: {final_signal_cooldown}")
+        
+    except Exception as e:
+        print(f"⚠️ Son kontrol hatası: {e}")
+    return pos_deleted, active_deleted, cooldown_deleted, signal_cooldown_deleted, prev_deleted, init_deleted
+
 async def clear_all_command(update, context):
     """Tüm verileri temizler: pozisyonlar, aktif sinyaller, önceki sinyaller, bekleyen kuyruklar, istatistikler (sadece bot sahibi)"""
     user_id, is_authorized = validate_user_command(update, require_owner=True)
@@ -3796,36 +5365,11 @@ async def clear_all_command(update, context):
     
     await send_command_response(update, "🧹 Tüm veriler temizleniyor...")
     try:
-        # 1) Pozisyonları temizle
-        pos_deleted = clear_position_data_from_db()
-        
-        # 2) Aktif sinyalleri temizle - daha güçlü temizleme
-        active_deleted = clear_data_by_pattern("^active_signal_", "aktif sinyal")
-        
-        # 3) Kalan aktif sinyalleri manuel olarak kontrol et ve sil
-        try:
-            remaining_active = mongo_collection.find({"_id": {"$regex": "^active_signal_"}})
-            remaining_count = 0
-            for doc in remaining_active:
-                mongo_collection.delete_one({"_id": doc["_id"]})
-                remaining_count += 1
-            if remaining_count > 0:
-                print(f"🧹 Manuel olarak {remaining_count} kalan aktif sinyal silindi")
-                active_deleted += remaining_count
-        except Exception as e:
-            print(f"⚠️ Manuel aktif sinyal temizleme hatası: {e}")
-        
-        # 4) Global değişkenleri temizle
-        global global_active_signals
-        global_active_signals = {}
+        # 1-5) Pozisyonlar, aktif sinyaller, cooldown'lar, önceki sinyaller ve istatistikler (DB thread havuzunda)
+        pos_deleted, active_deleted, cooldown_deleted, signal_cooldown_deleted, prev_deleted, init_deleted = await run_db(clear_all_data_from_db)
         
-        # Boş aktif sinyal listesi kaydet - bu artık tüm dokümanları silecek
-        save_active_signals_to_db({})
-        
-        cooldown_deleted = clear_data_by_pattern("^stop_cooldown_", "stop cooldown")
-        
-        # 5.5) Sinyal cooldown'ları temizle
-        signal_cooldown_deleted = clear_data_by_pattern("^signal_cooldown_", "sinyal cooldown")
+        # Pozisyon motoru durumunu DB'den yeniden yüklet (temizlenmiş pozisyonlar izlenmesin)
+        request_position_engine_reload()
         
         # 6) JSON dosyasını da temizle
         try:
@@ -3838,7 +5382,6 @@ async def clear_all_command(update, context):
         except Exception:
             pass
         
-        prev_deleted, init_deleted = clear_previous_signals_from_db()
         global global_waiting_signals
 
         try:
@@ -3846,37 +5389,13 @@ async def clear_all_command(update, context):
         except NameError:
             pass
         
-        new_stats = {
-            "total_signals": 0,
-            "successful_signals": 0,
-            "failed_signals": 0,
-            "total_profit_loss": 0.0,
-            "active_signals_count": 0,
-            "tracked_coins_count": 0,
-        }
-        save_stats_to_db(new_stats)
-        global global_stats
-        if isinstance(global_stats, dict):
-            global_stats.clear()
-            global_stats.update(new_stats)
-        else:
-            global_stats = new_stats
+        # İstatistik ve cooldown'ları temizlenmiş DB'den yeniden yükle
+        await reload_repository_async()
         
-        # Son kontrol - kalan dokümanları say
-        try:
-            final_positions = mongo_collection.count_documents({"_id": {"$regex": "^position_"}})
-            final_active = mongo_collection.count_documents({"_id": {"$regex": "^active_signal_"}})
-            final_cooldown = mongo_collection.count_documents({"_id": {"$regex": "^stop_cooldown_"}})
-            final_signal_cooldown = mongo_collection.count_documents({"_id": {"$regex": "^signal_cooldown_"}})
-            
-            print(f"🔍 Temizleme sonrası kontrol:")
-            print(f"   Kalan pozisyon: {final_positions}")
-            print(f"   Kalan aktif sinyal: {final_active}")
-            print(f"   Kalan stop cooldown: {final_cooldown}")
-            print(f"   Kalan sinyal cooldown: {final_signal_cooldown}")
-            
-        except Exception as e:
-            print(f"⚠️ Son kontrol hatası: {e}")
+        # Önceki sinyal işareti silindi; sonraki başlatmada DB'den (ilk çalıştırma olarak) belirlensin
+        global previous_signals_initialized
+        previous_signals_initialized = None
+        request_runtime_snapshot()
         
         # Özet mesaj
         summary = (
@@ -3893,6 +5412,19 @@ async def clear_all_command(update, context):
     except Exception as e:
         await send_command_response(update, f"❌ ClearAll hatası: {e}")
 
+async def reload_command(update, context):
+    """Bellekteki durumu (istatistikler, cooldown'lar, pozisyon motoru) DB'den yeniden yükler (sadece bot sahibi)"""
+    user_id, is_authorized = validate_user_command(update, require_owner=True)
+    if not is_authorized:
+        return
+    
+    try:
+        await reload_repository_async()
+        request_position_engine_reload()
+        await send_command_response(update, f"✅ Durum DB'den yeniden yüklendi: {len(global_stop_cooldown)} stop cooldown, pozisyonlar motorun bir sonraki turunda yüklenecek.")
+    except Exception as e:
+        await send_command_response(update, f"❌ Reload hatası: {e}")
+
 async def migrate_command(update, context):
     """Eski pozisyonları yeni TP/SL sistemine uyarlama komutu (sadece bot sahibi)"""
     user_id, is_authorized = validate_user_command(update, require_owner=True)
@@ -3913,8 +5445,8 @@ async def migrate_old_positions_to_new_tp_sl_system():
     try:
         print("🔄 Eski pozisyonlar yeni TP/SL sistemine uyarlanıyor...")
         
-        # Aktif sinyalleri yükle
-        active_signals = load_active_signals_from_db()
+        # Aktif sinyaller pozisyon motorunda
+        active_signals = dict(global_active_signals)
         if not active_signals:
             print("ℹ️ Aktif sinyal bulunamadı")
             return
@@ -3923,8 +5455,8 @@ async def migrate_old_positions_to_new_tp_sl_system():
         for symbol, signal in active_signals.items():
             try:
                 # Pozisyon tipini kontrol et
-                signal_type = signal.get('type', 'ALIŞ')
-                entry_price = float(signal.get('entry_price_float', 0))
+                side = signal.side
+                entry_price = signal.entry_price
                 
                 if entry_price <= 0:
                     print(f"⚠️ {symbol} - Geçersiz giriş fiyatı, atlanıyor")
@@ -3940,30 +5472,22 @@ async def migrate_old_positions_to_new_tp_sl_system():
                 crypto_config = CRYPTO_SETTINGS[symbol]
                 tp_percent = crypto_config["tp_percent"]
                 sl_percent = crypto_config["sl_percent"]
-                leverage = crypto_config["leverage"]
                 
                 # Yeni tek TP/SL hesaplamaları
-                if signal_type == "ALIŞ" or signal_type == "ALIS":
+                if side is Side.LONG:
                     # ALIŞ pozisyonu için
                     target_price = entry_price * (1 + tp_percent / 100)
                     stop_loss = entry_price * (1 - sl_percent / 100)
-                    
-                    print(f"   Hedef: ${target_price:.6f} (%{tp_percent}), Stop: ${stop_loss:.6f} (%{sl_percent})")
-                    
-                elif signal_type == "SATIŞ" or signal_type == "SATIS":
+                else:
                     # SATIŞ pozisyonu için
                     target_price = entry_price * (1 - tp_percent / 100)
                     stop_loss = entry_price * (1 + sl_percent / 100)
-                    
-                    print(f"   Hedef: ${target_price:.6f} (%{tp_percent}), Stop: ${stop_loss:.6f} (%{sl_percent})")
                 
-                else:
-                    print(f"⚠️ {symbol} - Bilinmeyen pozisyon tipi: {signal_type}")
-                    continue
+                print(f"   Hedef: ${target_price:.6f} (%{tp_percent}), Stop: ${stop_loss:.6f} (%{sl_percent})")
                 
                 # Güncel fiyatı al
                 try:
-                    ticker = client.futures_ticker(symbol=symbol)
+                    ticker = get_binance_client().futures_ticker(symbol=symbol)
                     current_price = float(ticker['lastPrice'])
                     print(f"   Güncel fiyat: ${current_price:.6f}")
                 except Exception as e:
@@ -3971,97 +5495,35 @@ async def migrate_old_positions_to_new_tp_sl_system():
                     continue
                 
                 # Hedef veya stop kontrolü
-                if signal_type == "ALIŞ" or signal_type == "ALIS":
+                if side is Side.LONG:
                     # ALIŞ pozisyonu kontrolü
                     if current_price >= target_price:
                         print(f"🎯 {symbol} HEDEF (%{tp_percent}) GERÇEKLEŞTİ!")
-                        
-                        profit_percentage = ((target_price - entry_price) / entry_price) * 100
-                        profit_usd = (100 * (profit_percentage / 100)) * leverage
-                        
-                        target_message = f"""🎯 HEDEF GERÇEKLEŞTİ! 🎯
-
-🔹 Kripto Çifti: {symbol}
-💰 Kar: %{profit_percentage:.2f} (${profit_usd:.2f})
-📈 Giriş: ${entry_price:.6f}
-💵 Çıkış: ${target_price:.6f}
-🎯 Hedef Seviyesi: %{tp_percent}
-🏁 Hedef gerçekleşti! Pozisyon kapatılıyor..."""
-                        
-                        await send_signal_to_all_users(target_message)
-                        print(f"✅ {symbol} - HEDEF mesajı gönderildi, pozisyon kapatılıyor")
-                        
-                        # Pozisyonu kapat
-                        await process_position_close(symbol, "take_profit", target_price, {}, {}, {}, {}, "HEDEF")
+                        # Kapanışı (mesaj ve istatistik dahil) pozisyon motoru yazar
+                        request_position_close(symbol, "take_profit", target_price)
                         continue
                     
 
                     # Stop kontrolü
                     if current_price <= stop_loss:
                         print(f"🛑 {symbol} STOP (%{sl_percent}) GERÇEKLEŞTİ!")
-                        
-                        loss_percentage = ((entry_price - stop_loss) / entry_price) * 100
-                        loss_usd = (100 * (loss_percentage / 100)) * leverage
-                        
-                        stop_message = f"""🛑 STOP GERÇEKLEŞTİ! 🛑
-
-🔹 Kripto Çifti: {symbol}
-💸 Zarar: %{loss_percentage:.2f} (${loss_usd:.2f})
-📈 Giriş: ${entry_price:.6f}
-💵 Çıkış: ${stop_loss:.6f}
-🏁 Stop tetiklendi! Pozisyon kapatılıyor..."""
-                        
-                        await send_signal_to_all_users(stop_message)
-                        print(f"✅ {symbol} - STOP mesajı gönderildi, pozisyon kapatılıyor")
-                        
-                        # Pozisyonu kapat
-                        await process_position_close(symbol, "stop_loss", stop_loss, {}, {}, {}, {}, "STOP")
+                        # Kapanışı (mesaj ve istatistik dahil) pozisyon motoru yazar
+                        request_position_close(symbol, "stop_loss", stop_loss)
                         continue
                 
-                elif signal_type == "SATIŞ" or signal_type == "SATIS":
+                else:
                     # SATIŞ pozisyonu kontrolü
                     if current_price <= target_price:
                         print(f"🎯 {symbol} SATIŞ HEDEF (%{tp_percent}) GERÇEKLEŞTİ!")
-                        
-                        profit_percentage = ((entry_price - target_price) / entry_price) * 100
-                        profit_usd = (100 * (profit_percentage / 100)) * leverage
-                        
-                        target_message = f"""🎯 SATIŞ HEDEF GERÇEKLEŞTİ! 🎯
-
-🔹 Kripto Çifti: {symbol}
-💰 Kar: %{profit_percentage:.2f} (${profit_usd:.2f})
-📈 Giriş: ${entry_price:.6f}
-💵 Çıkış: ${target_price:.6f}
-🎯 Hedef Seviyesi: %{tp_percent}
-🏁 Hedef gerçekleşti! Pozisyon kapatılıyor..."""
-                        
-                        await send_signal_to_all_users(target_message)
-                        print(f"✅ {symbol} - SATIŞ HEDEF mesajı gönderildi, pozisyon kapatılıyor")
-                        
-                        # Pozisyonu kapat
-                        await process_position_close(symbol, "take_profit", target_price, {}, {}, {}, {}, "HEDEF")
+                        # Kapanışı (mesaj ve istatistik dahil) pozisyon motoru yazar
+                        request_position_close(symbol, "take_profit", target_price)
                         continue
                     
                     # Stop kontrolü
                     if current_price >= stop_loss:
                         print(f"🛑 {symbol} SATIŞ STOP (%{sl_percent}) GERÇEKLEŞTİ!")
-                        
-                        loss_percentage = ((stop_loss - entry_price) / entry_price) * 100
-                        loss_usd = (100 * (loss_percentage / 100)) * leverage
-                        
-                        stop_message = f"""🛑 SATIŞ STOP GERÇEKLEŞTİ! 🛑
-
-🔹 Kripto Çifti: {symbol}
-💸 Zarar: %{loss_percentage:.2f} (${loss_usd:.2f})
-📈 Giriş: ${entry_price:.6f}
-💵 Çıkış: ${stop_loss:.6f}
-🏁 Stop tetiklendi! Pozisyon kapatılıyor..."""
-                        
-                        await send_signal_to_all_users(stop_message)
-                        print(f"✅ {symbol} - SATIŞ STOP mesajı gönderildi, pozisyon kapatılıyor")
-                        
-                        # Pozisyonu kapat
-                        await process_position_close(symbol, "stop_loss", stop_loss, {}, {}, {}, {}, "STOP")
+                        # Kapanışı (mesaj ve istatistik dahil) pozisyon motoru yazar
+                        request_position_close(symbol, "stop_loss", stop_loss)
                         continue
                 
                 migrated_count += 1
@@ -4082,11 +5544,23 @@ async def calculate_signals_for_symbol(symbol, timeframes, tf_names):
     
     for tf_name in tf_names:
         try:
-            df = await async_get_historical_data(symbol, timeframes[tf_name], 1000)
+            lookback = plan_signal_lookback(tf_name)
+            df = await async_get_historical_data(symbol, timeframes[tf_name], lookback)
             if df is None or df.empty:
                 return None
             
-            df = calculate_full_pine_signals(df, tf_name)
+            df = await compute_pine_frame(df, tf_name)
+            
+            # Kısaltılmış geçmiş yetersizse (veya doğrulama modunda) tam geçmişle hesapla
+            if lookback < FULL_SIGNAL_LOOKBACK:
+                settled = is_planned_signal_settled(df['raw_signal'].to_numpy(), get_signal_warmup_bars(tf_name))
+                if LOOKBACK_VERIFY or not settled:
+                    full_df = await async_get_historical_data(symbol, timeframes[tf_name], FULL_SIGNAL_LOOKBACK)
+                    full_df = await compute_pine_frame(full_df, tf_name)
+                    if LOOKBACK_VERIFY and settled:
+                        record_lookback_verification(symbol, tf_name, lookback, int(df['signal'].iloc[-1]), int(full_df['signal'].iloc[-1]))
+                    df = full_df
+            
             closest_idx = -1  # Son mum
             signal = int(df.iloc[closest_idx]['signal'])
             
@@ -4104,6 +5578,85 @@ async def calculate_signals_for_symbol(symbol, timeframes, tf_names):
     
     return current_signals
 
+async def _fetch_frames(fetch_keys, lookback_by_tf):
+    """(symbol, tf) çiftleri için mum verilerini paralel çeker: {tf: {symbol: df veya None}}"""
+    fetched = await asyncio.gather(
+        *(async_get_historical_data(symbol, tf, lookback_by_tf[tf]) for symbol, tf in fetch_keys),
+        return_exceptions=True
+    )
+    frames_by_tf = {}
+    for (symbol, tf), df in zip(fetch_keys, fetched):
+        if isinstance(df, Exception):
+            print(f"❌ {symbol} {tf} toplu veri çekme hatası: {df}")
+            df = None
+        frames_by_tf.setdefault(tf, {})[symbol] = df
+    return frames_by_tf
+
+async def calculate_signals_for_symbols_batch(symbols, lookback=None):
+    """
+    Birden çok sembolün sinyallerini toplu hesaplar: aynı timeframe'i paylaşan semboller
+    tek (n_symbols, n_bars) matrisinde işlenir. Dönüş: {symbol: {tf: signal} veya None}
+    lookback verilmezse her timeframe için plan_signal_lookback kullanılır; son sinyali
+    ısınma bölgesinde kalan semboller tam geçmişle yeniden hesaplanır.
+    """
+    requests_by_tf = {}
+    for symbol in symbols:
+        crypto_config = CRYPTO_SETTINGS.get(symbol)
+        if not crypto_config:
+            continue
+        for tf in crypto_config["timeframes"]:
+            requests_by_tf.setdefault(tf, []).append(symbol)
+
+    lookback_by_tf = {
+        tf: lookback if lookback is not None else plan_signal_lookback(tf)
+        for tf in requests_by_tf
+    }
+    fetch_keys = [(symbol, tf) for tf, tf_symbols in requests_by_tf.items() for symbol in tf_symbols]
+    frames_by_tf = await _fetch_frames(fetch_keys, lookback_by_tf)
+
+    signals_by_tf = {}
+    full_keys = []
+    for tf, frames in frames_by_tf.items():
+        planned = lookback_by_tf[tf] < FULL_SIGNAL_LOOKBACK
+        warmup = get_signal_warmup_bars(tf) if planned else None
+        signals_by_tf[tf] = await calculate_batch_pine_signals_offloaded(frames, tf, warmup=warmup)
+        if planned:
+            # Isınma bölgesinde kalanlar (ve doğrulama modunda hepsi) tam geçmişle hesaplanır
+            full_keys.extend(
+                (symbol, tf) for symbol, df in frames.items()
+                if df is not None and (LOOKBACK_VERIFY or signals_by_tf[tf][symbol] is None)
+            )
+
+    if full_keys:
+        full_frames_by_tf = await _fetch_frames(full_keys, {tf: FULL_SIGNAL_LOOKBACK for _, tf in full_keys})
+        for tf, frames in full_frames_by_tf.items():
+            full_signals = await calculate_batch_pine_signals_offloaded(frames, tf)
+            for symbol, full_signal in full_signals.items():
+                planned_signal = signals_by_tf[tf].get(symbol)
+                if LOOKBACK_VERIFY and planned_signal is not None and full_signal is not None:
+                    record_lookback_verification(symbol, tf, lookback_by_tf[tf], planned_signal, full_signal)
+                signals_by_tf[tf][symbol] = full_signal
+        print(f"🔁 {len(full_keys)} sembol/timeframe tam geçmişle ({FULL_SIGNAL_LOOKBACK} mum) hesaplandı")
+
+    results = {}
+    for symbol in symbols:
+        crypto_config = CRYPTO_SETTINGS.get(symbol)
+        if not crypto_config:
+            results[symbol] = None
+            continue
+        current_signals = {}
+        for tf in crypto_config["timeframes"]:
+            signal = signals_by_tf.get(tf, {}).get(symbol)
+            if signal is None:
+                current_signals = None
+                break
+            current_signals[tf] = signal
+        results[symbol] = current_signals
+
+    computed = sum(1 for value in results.values() if value is not None)
+    print(f"📊 Toplu sinyal hesaplama: {computed}/{len(symbols)} sembol, {len(requests_by_tf)} timeframe")
+    return results
+
 def calculate_signal_counts(signals, tf_names):
     """Sinyal sayılarını hesaplar"""
     signal_values = [signals.get(tf, 0) for tf in tf_names]
@@ -4121,43 +5674,25 @@ def check_2_2_rule(buy_count, sell_count):
     print(f"🔍 15m+30m 2/2 kural kontrolü: ALIŞ={buy_count}, SATIŞ={sell_count} → Sonuç: {result}")
     return result
 
-def check_cooldown(symbol, cooldown_dict, hours=4):  # ✅ 4 SAAT COOLDOWN - TÜM SİNYALLER İÇİN
-    """Cooldown kontrolü yapar - tüm sinyaller için 4 saat"""
-    if symbol in cooldown_dict:
-        last_time = cooldown_dict[symbol]
-        if isinstance(last_time, str):
-            last_time = datetime.fromisoformat(last_time)
-        time_diff = (datetime.now() - last_time).total_seconds() / 3600
-        if time_diff < hours:
-            remaining_hours = hours - time_diff
-            remaining_minutes = (remaining_hours - int(remaining_hours)) * 60
-            end_time = (last_time + timedelta(hours=hours)).strftime('%H:%M:%S')
-            print(f"⏰ {symbol} → Cooldown aktif: {int(remaining_hours)}s {int(remaining_minutes)}dk kaldı (bitiş: {end_time})")
-            print(f"   Son hedef zamanı: {last_time.strftime('%H:%M:%S')}")
-            return True  # Cooldown aktif
-        else:
-            del cooldown_dict[symbol]  # Cooldown doldu
-            print(f"✅ {symbol} → Cooldown süresi doldu, yeni sinyal aranabilir")
-    return False  # Cooldown yok
+def check_cooldown(symbol, cooldowns):
+    """Cooldown kontrolü yapar (CooldownSchedule üzerinden, O(1)); bitiş zamanı cooldown eklenirken hesaplanır"""
+    if not cooldowns.is_active(symbol):
+        return False  # Cooldown yok
+    remaining_minutes = int(cooldowns.remaining(symbol).total_seconds() / 60)
+    end_time = cooldowns.until[symbol].strftime('%H:%M:%S')
+    print(f"⏰ {symbol} → Cooldown aktif: {remaining_minutes // 60}s {remaining_minutes % 60}dk kaldı (bitiş: {end_time})")
+    return True  # Cooldown aktif
 
-def clear_data_by_pattern(pattern, description="veri"):
-    """Regex pattern ile eşleşen verileri MongoDB'den siler"""
+def clear_collection_data(collection, description="veri"):
+    """Bir varlık koleksiyonundaki tüm dokümanları siler"""
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print(f"❌ MongoDB bağlantısı kurulamadı, {description} silinemedi")
-                return 0
-        
-        # Önce kaç tane doküman olduğunu kontrol et
-        before_count = mongo_collection.count_documents({"_id": {"$regex": pattern}})
-        print(f"🔍 {description} temizleme öncesi: {before_count} doküman bulundu")
+        if not mongodb_ready():
+            print(f"❌ MongoDB bağlantısı kurulamadı, {description} silinemedi")
+            return 0
         
-        delete_result = mongo_collection.delete_many({"_id": {"$regex": pattern}})
+        delete_result = collection.delete_many({})
         deleted_count = getattr(delete_result, "deleted_count", 0)
-        
-        # Sonra kaç tane kaldığını kontrol et
-        after_count = mongo_collection.count_documents({"_id": {"$regex": pattern}})
-        print(f"🧹 MongoDB'den {deleted_count} {description} silindi, {after_count} kaldı")
+        print(f"🧹 MongoDB'den {deleted_count} {description} silindi")
         
         return deleted_count
     except Exception as e:
@@ -4165,14 +5700,13 @@ def clear_data_by_pattern(pattern, description="veri"):
         return 0
 
 def clear_specific_document(doc_id, description="doküman"):
-    """Belirli bir dokümanı MongoDB'den siler"""
+    """Belirli bir bot_state dokümanını MongoDB'den siler"""
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print(f"❌ MongoDB bağlantısı kurulamadı, {description} silinemedi")
-                return False
+        if not mongodb_ready():
+            print(f"❌ MongoDB bağlantısı kurulamadı, {description} silinemedi")
+            return False
         
-        delete_result = mongo_collection.delete_one({"_id": doc_id})
+        delete_result = bot_state_collection.delete_one({"_id": doc_id})
         deleted_count = getattr(delete_result, "deleted_count", 0)
         
         if deleted_count > 0:
@@ -4185,131 +5719,38 @@ def clear_specific_document(doc_id, description="doküman"):
         print(f"❌ MongoDB'den {description} silinirken hata: {e}")
         return False
 
-def load_data_by_pattern(pattern, data_key="data", description="veri", transform_func=None):
-    """Regex pattern ile eşleşen verileri MongoDB'den yükler"""
-    try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print(f"❌ MongoDB bağlantısı kurulamadı, {description} yüklenemedi")
-                return {}
-        
-        result = {}
-        docs = mongo_collection.find({"_id": {"$regex": pattern}})
-        
-        for doc in docs:
-            if transform_func:
-                result.update(transform_func(doc))
-            else:
-                # Varsayılan transform: _id'den pattern'i çıkar ve data_key'i al
-                key = doc["_id"].replace(pattern.replace("^", "").replace("$", ""), "")
-                if data_key and data_key in doc:
-                    result[key] = doc[data_key]
-                else:
-                    result[key] = doc
-        
-        print(f"✅ MongoDB'den {len(result)} {description} yüklendi")
-        return result
-    except Exception as e:
-        print(f"❌ MongoDB'den {description} yüklenirken hata: {e}")
-        return {}
-
 def safe_mongodb_operation(operation_func, error_message="MongoDB işlemi", default_return=None):
     """MongoDB işlemlerini güvenli şekilde yapar"""
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print(f"❌ MongoDB bağlantısı kurulamadı, {error_message} yapılamadı")
-                return default_return
+        if not mongodb_ready():
+            print(f"❌ MongoDB bağlantısı kurulamadı, {error_message} yapılamadı")
+            return default_return
         return operation_func()
     except Exception as e:
+        if isinstance(e, ConnectionFailure):
+            mark_mongodb_health(False, e)
         print(f"❌ {error_message} sırasında hata: {e}")
         return default_return
     
-def save_stop_cooldown_to_db(stop_cooldown):
-    """Stop cooldown verilerini MongoDB'ye kaydet"""
-    try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print("❌ MongoDB bağlantısı kurulamadı, stop cooldown kaydedilemedi")
-                return False
-        
-        # Önce tüm stop cooldown verilerini sil
-        mongo_collection.delete_many({"_id": {"$regex": "^stop_cooldown_"}})
-        
-        # Yeni stop cooldown verilerini ekle
-        for symbol, timestamp in stop_cooldown.items():
-            doc_id = f"stop_cooldown_{symbol}"
-            mongo_collection.insert_one({
-                "_id": doc_id,
-                "data": timestamp,
-                "timestamp": datetime.now()
-            })
-        
-        print(f"✅ {len(stop_cooldown)} stop cooldown MongoDB'ye kaydedildi")
-        return True
-    except Exception as e:
-        print(f"❌ Stop cooldown MongoDB'ye kaydedilirken hata: {e}")
-        return False
-
-async def close_position(symbol, trigger_type, final_price, signal, position_data=None):
+async def close_position(symbol, trigger_type, final_price, position, signal=None, trigger_time=None, claim=True):
+    # Yalnızca pozisyon motoru (finalize_position) çağırır: pozisyon motor durumundan çıkarıldığı için
+    # aynı pozisyon ikinci kez buraya gelemez. trigger_time: tetikleyen işlemin zamanı (ms, aggTrade), yoksa tespit anı
+    # claim=False: pozisyon DB'ye hiç yazılamadı, sahiplenilecek doküman yok (kapanış doğrudan yazılır)
     print(f"--- Pozisyon Kapatılıyor: {symbol} ({trigger_type}) ---")
     try:
-        # Önce veritabanından pozisyonun hala var olduğunu doğrula
-        position_doc = mongo_collection.find_one({"_id": f"position_{symbol}"})
-        if not position_doc:
-            print(f"⚠️ {symbol} pozisyonu zaten kapatılmış veya DB'de bulunamadı. Yinelenen işlem engellendi.")
-            # Bellekteki global değişkenlerden de temizle
-            global_positions.pop(symbol, None)
-            global_active_signals.pop(symbol, None)
-            return
-        try:
-            if position_data:
-                entry_price_raw = position_data.get('open_price', 0)
-                target_price_raw = position_data.get('target', 0)
-                stop_loss_raw = position_data.get('stop', 0)
-                entry_price = float(entry_price_raw) if entry_price_raw is not None else 0.0
-                target_price = float(target_price_raw) if target_price_raw is not None else 0.0
-                stop_loss_price = float(stop_loss_raw) if stop_loss_raw is not None else 0.0
-                signal_type = str(position_data.get('type', 'ALIŞ'))
-                leverage = int(position_data.get('leverage', 10))
-                
-            else:
-                entry_price_raw = signal.get('entry_price_float', 0)
-                target_price_raw = signal.get('target_price', '0')
-                stop_loss_raw = signal.get('stop_loss', '0')
-                entry_price = float(entry_price_raw) if entry_price_raw is not None else 0.0
-                
-                # String formatındaki fiyatları temizle
-                if isinstance(target_price_raw, str):
-                    target_price = float(target_price_raw.replace('$', '').replace(',', ''))
-                else:
-                    target_price = float(target_price_raw) if target_price_raw is not None else 0.0
-                
-                if isinstance(stop_loss_raw, str):
-                    stop_loss_price = float(stop_loss_raw.replace('$', '').replace(',', ''))
-                else:
-                    stop_loss_price = float(stop_loss_raw) if stop_loss_raw is not None else 0.0
-                
-                signal_type = str(signal.get('type', 'ALIŞ'))
-                leverage = int(signal.get('leverage', 10))
-                        
-        except (ValueError, TypeError) as e:
-            print(f"❌ {symbol} - Pozisyon verisi dönüşüm hatası: {e}")
-            print(f"   position_data: {position_data}")
-            print(f"   signal: {signal}")
-            # Hatalı pozisyonu temizle
-            mongo_collection.delete_one({"_id": f"position_{symbol}"})
-            mongo_collection.delete_one({"_id": f"active_signal_{symbol}"})
-            global_positions.pop(symbol, None)
-            global_active_signals.pop(symbol, None)
-            return
+        side = position.side
+        entry_price = position.open_price
+        target_price = position.target
+        stop_loss_price = position.stop
+        leverage = position.leverage
         
         # Giriş fiyatı 0 ise pozisyonu temizle ve çık
         if entry_price <= 0:
             print(f"⚠️ {symbol} - Geçersiz giriş fiyatı ({entry_price}), pozisyon temizleniyor")
             # Pozisyonu veritabanından sil
-            mongo_collection.delete_one({"_id": f"position_{symbol}"})
-            mongo_collection.delete_one({"_id": f"active_signal_{symbol}"})
+            removal = MongoUnitOfWork(f"{symbol} geçersiz pozisyon silme")
+            queue_position_removal(removal, symbol)
+            await removal.commit_async()
             # Bellekteki global değişkenlerden de temizle
             global_positions.pop(symbol, None)
             global_active_signals.pop(symbol, None)
@@ -4327,7 +5768,7 @@ async def close_position(symbol, trigger_type, final_price, signal, position_dat
                     print(f"🔍 {symbol} - Güncel fiyat: ${current_price:.6f}")
                     
                     # Pozisyon tipine göre hedef ve stop kontrolü
-                    if signal_type == "ALIŞ" or signal_type == "ALIS":
+                    if side is Side.LONG:
                         # ALIŞ pozisyonu için
                         if current_price >= target_price:
                             trigger_type = "take_profit"
@@ -4343,7 +5784,7 @@ async def close_position(symbol, trigger_type, final_price, signal, position_dat
                             final_price = target_price
                             print(f"⚠️ {symbol} - Pozisyon hala aktif, varsayılan TP: ${target_price:.6f}")
                     
-                    elif signal_type == "SATIŞ" or signal_type == "SATIS":
+                    else:
                         # SATIŞ pozisyonu için
                         if current_price <= target_price:
                             trigger_type = "take_profit"
@@ -4383,26 +5824,17 @@ async def close_position(symbol, trigger_type, final_price, signal, position_dat
             try:
                 if trigger_type == "take_profit":
                     # Take-profit: Hedef fiyatından çıkış (ne kadar yükselirse yükselsin)
-                    if signal_type == "ALIŞ" or signal_type == "ALIS":
-                        profit_loss_percent = ((target_price - entry_price) / entry_price) * 100
-                    else: # SATIŞ veya SATIS
-                        profit_loss_percent = ((entry_price - target_price) / entry_price) * 100
+                    profit_loss_percent = side.change_percent(entry_price, target_price)
                     print(f"🎯 {symbol} - TP hesaplaması: Hedef fiyatından (${target_price:.6f}) çıkış")
                     
                 elif trigger_type == "stop_loss":
                     # Stop-loss: Stop fiyatından çıkış (ne kadar düşerse düşsün)
-                    if signal_type == "ALIŞ" or signal_type == "ALIS":
-                        profit_loss_percent = ((stop_loss_price - entry_price) / entry_price) * 100
-                    else: # SATIŞ veya SATIS
-                        profit_loss_percent = ((entry_price - stop_loss_price) / entry_price) * 100
+                    profit_loss_percent = side.change_percent(entry_price, stop_loss_price)
                     print(f"🛑 {symbol} - SL hesaplaması: Stop fiyatından (${stop_loss_price:.6f}) çıkış")
                     
                 else:
                     # Varsayılan durum (final_price kullan)
-                    if signal_type == "ALIŞ" or signal_type == "ALIS":
-                        profit_loss_percent = ((final_price_float - entry_price) / entry_price) * 100
-                    else: # SATIŞ veya SATIS
-                        profit_loss_percent = ((entry_price - final_price_float) / entry_price) * 100
+                    profit_loss_percent = side.change_percent(entry_price, final_price_float)
                     print(f"⚠️ {symbol} - Varsayılan hesaplama: Final fiyattan (${final_price_float:.6f}) çıkış")
                  
             except Exception as e:
@@ -4414,15 +5846,38 @@ async def close_position(symbol, trigger_type, final_price, signal, position_dat
         
         profit_loss_usd = (100 * (profit_loss_percent / 100)) * leverage # 100$ ve kaldıraç ile
         
+        trigger_dt = datetime.fromtimestamp(trigger_time / 1000) if trigger_time else datetime.now()
+        trigger_clock = trigger_dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+        # MAE/MFE: motorun bellekte tuttuğu mum/fiyat uçları + çıkış fiyatı; kapanış kaydıyla yazılır
+        exit_reference = final_price_float or entry_price
+        excursion_max = max((signal.max_price if signal else 0) or entry_price, exit_reference)
+        excursion_min = min((signal.min_price if signal else 0) or entry_price, exit_reference)
+        mfe_percent, mae_percent = calculate_excursion_percents(side, entry_price, excursion_max, excursion_min)
+        excursion_record = {
+            "symbol": symbol,
+            "type": side.value,
+            "result": trigger_type,
+            "mfe_percent": round(mfe_percent, 4),
+            "mae_percent": round(mae_percent, 4),
+            "closed_at": trigger_clock,
+        }
+        print(f"📐 {symbol} - MFE: %{mfe_percent:.2f}, MAE: %{mae_percent:.2f}")
+
         # İstatistikleri atomik olarak güncelle (Race condition'ları önler)
-        print(f"🔍 {symbol} - Pozisyon kapatılıyor: {trigger_type} - ${final_price_float:.6f}")
+        print(f"🔍 {symbol} - Pozisyon kapatılıyor: {trigger_type} - ${final_price_float:.6f} ({trigger_clock}{', aggTrade' if trigger_time else ''})")
+        # Kapanışın DB değişiklikleri (istatistik, aktif sinyal silme, cooldown) tek iş biriminde; pozisyon
+        # dokümanı commit'ten önce find_one_and_delete ile sahiplenilir (başka süreç kapattıysa hiçbiri yazılmaz)
+        closing = MongoUnitOfWork(f"{symbol} pozisyon kapanışı")
+        message = None
+        notify = None
             
         if trigger_type == "take_profit":
             # Atomik güncelleme ile istatistikleri güncelle
             update_stats_atomic({
                 "successful_signals": 1,
                 "total_profit_loss": profit_loss_usd
-            })
+            }, history={"excursions": excursion_record}, unit_of_work=closing)
             
             # Take-profit mesajında hedef fiyatından çıkış göster
             exit_price = target_price if trigger_type == "take_profit" else final_price_float
@@ -4431,9 +5886,10 @@ async def close_position(symbol, trigger_type, final_price, signal, position_dat
                 f"🔹 <b>Kripto Çifti:</b> {symbol}\n"
                 f"💰 <b>Kar:</b> %{profit_loss_percent:.2f} (${profit_loss_usd:.2f})\n"
                 f"📈 <b>Giriş:</b> ${entry_price:.6f}\n"
-                f"💵 <b>Çıkış:</b> ${exit_price:.6f}"
+                f"💵 <b>Çıkış:</b> ${exit_price:.6f}\n"
+                f"⏱️ <b>Tetiklenme:</b> {trigger_clock} (${final_price_float:.6f})"
             )
-            await send_signal_to_all_users(message)
+            notify = send_signal_to_all_users
             # Bot sahibine hedef mesajı gönderme
         
         elif trigger_type == "stop_loss":
@@ -4441,7 +5897,7 @@ async def close_position(symbol, trigger_type, final_price, signal, position_dat
             update_stats_atomic({
                 "failed_signals": 1,
                 "total_profit_loss": profit_loss_usd
-            })
+            }, history={"excursions": excursion_record}, unit_of_work=closing)
             
             # Stop-loss mesajında stop fiyatından çıkış göster
             exit_price = stop_loss_price if trigger_type == "stop_loss" else final_price_float
@@ -4450,21 +5906,44 @@ async def close_position(symbol, trigger_type, final_price, signal, position_dat
                 f"🔹 <b>Kripto Çifti:</b> {symbol}\n"
                 f"💸 <b>Zarar:</b> %{profit_loss_percent:.2f} (${profit_loss_usd:.2f})\n"
                 f"📈 <b>Giriş:</b> ${entry_price:.6f}\n"
-                f"💵 <b>Çıkış:</b> ${exit_price:.6f}"
+                f"💵 <b>Çıkış:</b> ${exit_price:.6f}\n"
+                f"⏱️ <b>Tetiklenme:</b> {trigger_clock} (${final_price_float:.6f})"
             )
             # STOP mesajları sadece bot sahibine gidecek
-            await send_admin_message(message)
-        
-        # Pozisyonu veritabanından sil
-        mongo_collection.delete_one({"_id": f"position_{symbol}"})
-        mongo_collection.delete_one({"_id": f"active_signal_{symbol}"})
+            notify = send_admin_message
         
-        # Cooldown'a ekle (2 saat)
-        global global_stop_cooldown
-        global_stop_cooldown[symbol] = datetime.now()
+        if trigger_type in ("take_profit", "stop_loss"):
+            record_trade({
+                "symbol": symbol,
+                "side": side.value,
+                "result": trigger_type,
+                "entry_price": entry_price,
+                "exit_price": exit_price,
+                "trigger_price": final_price_float,
+                "leverage": leverage,
+                "profit_loss_percent": profit_loss_percent,
+                "profit_loss_usd": profit_loss_usd,
+                "mfe_percent": mfe_percent,
+                "mae_percent": mae_percent,
+                "opened_at": ms_to_datetime(position.entry_timestamp),
+                "closed_at": trigger_dt,
+            }, closing)
+        closing.delete(active_signals_collection, symbol)
+        
+        # Cooldown'a ekle (2 saat) - repository yalnızca bu sembolün dokümanını yazar
+        add_stop_cooldown(symbol, unit_of_work=closing)
+        if claim and not await run_db(claim_position_close, symbol, closing):
+            print(f"⚠️ {symbol} pozisyonu başka bir süreç tarafından kapatılmış, kapanış yazılmadı ve bildirilmedi")
+            global_positions.pop(symbol, None)
+            global_active_signals.pop(symbol, None)
+            await reload_repository_async()  # Bellekteki istatistikler o kapanışı içeren DB değerlerine döner
+            trade_stats_cache.clear()
+            return
+        await closing.commit_async()  # Transaction'da yazıldıysa iş birimi boştur
+        trade_stats_cache.clear()
         
-        # Cooldown'ı veritabanına kaydet
-        save_stop_cooldown_to_db({symbol: datetime.now()})
+        if notify is not None:
+            await notify(message)
         
         # Bellekteki global değişkenlerden de temizle
         global_positions.pop(symbol, None)
@@ -4476,8 +5955,9 @@ async def close_position(symbol, trigger_type, final_price, signal, position_dat
         print(f"❌ {symbol} pozisyon kapatılırken hata: {e}")
         # Hata durumunda da pozisyonu temizlemeye çalış
         try:
-            mongo_collection.delete_one({"_id": f"position_{symbol}"})
-            mongo_collection.delete_one({"_id": f"active_signal_{symbol}"})
+            removal = MongoUnitOfWork(f"{symbol} pozisyon temizliği")
+            queue_position_removal(removal, symbol)
+            await removal.commit_async()
             global_positions.pop(symbol, None)
             global_active_signals.pop(symbol, None)
             print(f"✅ {symbol} pozisyonu hata sonrası temizlendi")
@@ -4487,53 +5967,31 @@ async def close_position(symbol, trigger_type, final_price, signal, position_dat
 def cleanup_corrupted_positions():
     """MongoDB'deki bozuk pozisyon verilerini temizler"""
     try:
-        if mongo_collection is None:
-            if not connect_mongodb():
-                print("❌ MongoDB bağlantısı kurulamadı, bozuk pozisyonlar temizlenemedi")
-                return False
+        if not mongodb_ready():
+            print("❌ MongoDB bağlantısı kurulamadı, bozuk pozisyonlar temizlenemedi")
+            return False
         
         print("🧹 Bozuk pozisyon verileri temizleniyor...")
         
-        # Tüm pozisyon belgelerini kontrol et
-        docs = mongo_collection.find({"_id": {"$regex": "^position_"}})
+        # Tüm pozisyon belgelerini kontrol et; silmeler tek iş biriminde yazılır
+        docs = positions_collection.find({})
         corrupted_count = 0
+        removals = MongoUnitOfWork("Bozuk pozisyon temizliği")
         
         for doc in docs:
-            symbol = doc["_id"].replace("position_", "")
+            symbol = doc["_id"]
             data = doc.get("data", {})
             
-            # Kritik alanların varlığını kontrol et
-            required_fields = ['type', 'target', 'stop', 'open_price', 'leverage']
-            missing_fields = [field for field in required_fields if field not in data]
-            
-            if missing_fields:
-                print(f"⚠️ {symbol} - Eksik alanlar: {missing_fields}, pozisyon siliniyor")
-                mongo_collection.delete_one({"_id": f"position_{symbol}"})
-                mongo_collection.delete_one({"_id": f"active_signal_{symbol}"})
-                corrupted_count += 1
-                continue
-            
-            # Fiyat değerlerinin geçerliliğini kontrol et
+            # Kritik alanlar, yön ve fiyat değerleri yüklemedeki doğrulamayla aynı
             try:
-                open_price = float(data['open_price'])
-                target_price = float(data['target'])
-                stop_price = float(data['stop'])
-                
-                if open_price <= 0 or target_price <= 0 or stop_price <= 0:
-                    print(f"⚠️ {symbol} - Geçersiz fiyat değerleri, pozisyon siliniyor")
-                    print(f"   Giriş: {open_price}, Hedef: {target_price}, Stop: {stop_price}")
-                    mongo_collection.delete_one({"_id": f"position_{symbol}"})
-                    mongo_collection.delete_one({"_id": f"active_signal_{symbol}"})
-                    corrupted_count += 1
-                    continue
-                    
+                Position.from_doc(symbol, data)
             except (ValueError, TypeError) as e:
-                print(f"⚠️ {symbol} - Fiyat dönüşüm hatası: {e}, pozisyon siliniyor")
-                mongo_collection.delete_one({"_id": f"position_{symbol}"})
-                mongo_collection.delete_one({"_id": f"active_signal_{symbol}"})
+                print(f"⚠️ {symbol} - {e}, pozisyon siliniyor")
+                queue_position_removal(removals, symbol)
                 corrupted_count += 1
-                continue
         
+        if not removals.commit():
+            return False
         if corrupted_count > 0:
             print(f"✅ {corrupted_count} bozuk pozisyon verisi temizlendi")
         else:
@@ -4545,66 +6003,5 @@ def cleanup_corrupted_positions():
         print(f"❌ Bozuk pozisyonlar temizlenirken hata: {e}")
         return False
 
-async def process_position_close(symbol, trigger_type, final_price, positions, active_signals, stats, stop_cooldown, level_name):
-    """Pozisyon kapatma işlemini yönetir"""
-    try:
-        print(f"🔒 {symbol} → {level_name} gerçekleşti! Pozisyon kapatılıyor...")
-        
-        # İstatistikleri güncelle
-        if trigger_type == "take_profit":
-            stats["successful_signals"] += 1
-            # Kar hesaplaması
-            position = positions.get(symbol, {})
-            entry_price = float(position.get('open_price', 0))
-            if entry_price > 0:
-                profit_percentage = ((final_price - entry_price) / entry_price) * 100
-                leverage = position.get('leverage', 10)  # Varsayılan 10x
-                profit_usd = (100 * (profit_percentage / 100)) * leverage
-                stats["total_profit_loss"] += profit_usd
-                print(f"💰 {symbol} - Kar: %{profit_percentage:.2f} (${profit_usd:.2f})")
-        else:  # stop_loss
-            stats["failed_signals"] += 1
-            # Zarar hesaplaması
-            position = positions.get(symbol, {})
-            entry_price = float(position.get('open_price', 0))
-            if entry_price > 0:
-                loss_percentage = ((entry_price - final_price) / entry_price) * 100
-                leverage = position.get('leverage', 10)  # Varsayılan 10x
-                loss_usd = (100 * (loss_percentage / 100)) * leverage
-                stats["total_profit_loss"] -= loss_usd
-                print(f"💸 {symbol} - Zarar: %{loss_percentage:.2f} (${loss_usd:.2f})")
-        
-        # Cooldown'a ekle (2 saat)
-        cooldown_time = datetime.now()
-        stop_cooldown[symbol] = cooldown_time
-        print(f"🔒 {symbol} → {level_name} Cooldown'a eklendi: {cooldown_time.strftime('%H:%M:%S')}")
-        print(f"   Cooldown süresi: 2 saat → Bitiş: {(cooldown_time + timedelta(hours=2)).strftime('%H:%M:%S')}")
-        save_stop_cooldown_to_db(stop_cooldown)
-        
-        # Pozisyon ve aktif sinyali kaldır
-        del positions[symbol]
-        if symbol in active_signals:
-            del active_signals[symbol]
-        
-        # Veritabanı kayıtlarını kontrol et
-        positions_saved = save_positions_to_db(positions)
-        active_signals_saved = save_active_signals_to_db(active_signals)
-        
-        if not positions_saved or not active_signals_saved:
-            print(f"⚠️ {symbol} veritabanı kaydı başarısız! Pozisyon: {positions_saved}, Aktif Sinyal: {active_signals_saved}")
-            # Hata durumunda tekrar dene
-            await asyncio.sleep(1)
-            positions_saved = save_positions_to_db(positions)
-            active_signals_saved = save_active_signals_to_db(active_signals)
-            if not positions_saved or not active_signals_saved:
-                print(f"❌ {symbol} veritabanı kaydı ikinci denemede de başarısız!")
-        else:
-            print(f"✅ {symbol} veritabanından başarıyla kaldırıldı")
-        
-        print(f"✅ {symbol} - {level_name} tespit edildi ve işlendi!")
-        
-    except Exception as e:
-        print(f"❌ {symbol} pozisyon kapatma hatası: {e}")
-
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
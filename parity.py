@@ -0,0 +1,219 @@
+"""
+Sinyal motorları için golden-output parity harness'i.
+
+Kayıtlı (veya sentetik) mum setleri farklı bitiş noktalarından tekrar oynatılır ve her
+noktada referans hat (calculate_full_pine_signals -> son mum -> calculate_signal_counts ->
+check_2_2_rule) ile optimize edilmiş motorlar karşılaştırılır:
+
+    - Mum bazlı `signal` kolonları: COLUMN_ENGINES (ör. toplu matris motoru)
+    - Son sinyaller ve 2/2 kararları: DECISION_ENGINES (planlı lookback, toplu, process havuzu)
+
+Herhangi bir farkta ayrıntılar yazdırılır ve çıkış kodu 1 olur. Yeni bir motor eklendiğinde
+ilgili sözlüğe kaydedilmesi yeterlidir.
+
+Kullanım:
+    python parity.py                          # sentetik veri
+    python parity.py --recorded klines.json   # benchmark.py --record ile kaydedilmiş veri
+    python parity.py --no-pool --replays 5
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime
+
+import numpy as np
+
+from benchmark import KlineStore, start_binance_stand_in, patched, _quiet, benchmark_timeframes
+import crypto_signal_v2 as bot
+
+class ReplayStore(KlineStore):
+    """KlineStore'u sondan `offset` mum kısaltarak sunar (geçmişteki bir ana dönüş)"""
+
+    def __init__(self, base):
+        super().__init__(recorded=base.recorded, synthetic_bars=base.synthetic_bars)
+        self._synthetic = base._synthetic
+        self.offset = 0
+
+    def series(self, symbol, interval):
+        rows = super().series(symbol, interval)
+        return rows[:len(rows) - self.offset] if self.offset else rows
+
+# ============================================================================
+# MOTORLAR
+# ============================================================================
+
+def reference_columns(frames, timeframe):
+    """Referans: her sembol için calculate_full_pine_signals 'signal' kolonu"""
+    return {
+        symbol: bot.calculate_full_pine_signals(df.copy(), timeframe)['signal'].to_numpy(dtype=np.int64)
+        for symbol, df in frames.items()
+    }
+
+def batch_columns(frames, timeframe):
+    """Toplu matris motoru: aynı uzunluktaki semboller tek (n_symbols, n_bars) geçişinde"""
+    symbols = list(frames)
+    ohlcv = bot._stack_ohlcv(frames, symbols)
+    signal, _ = bot.calculate_batch_pine_matrix(ohlcv[0], ohlcv[1], ohlcv[2], ohlcv[3], timeframe)
+    return {symbol: signal[row].astype(np.int64) for row, symbol in enumerate(symbols)}
+
+# Mum bazlı kolon üreten motorlar: (frames, timeframe) -> {symbol: signal dizisi}
+COLUMN_ENGINES = {
+    "batch": batch_columns,
+}
+
+async def symbol_planned_decisions(symbols):
+    """calculate_signals_for_symbol: sembol başına planlı lookback + gerekirse tam geçmiş"""
+    results = {}
+    for symbol in symbols:
+        timeframes = bot.CRYPTO_SETTINGS[symbol]["timeframes"]
+        results[symbol] = await bot.calculate_signals_for_symbol(symbol, {tf: tf for tf in timeframes}, timeframes)
+    return results
+
+async def symbols_batch_decisions(symbols):
+    """calculate_signals_for_symbols_batch: planlı lookback ile toplu hesaplama"""
+    return await bot.calculate_signals_for_symbols_batch(symbols)
+
+async def symbols_batch_full_decisions(symbols):
+    """calculate_signals_for_symbols_batch: tam geçmiş (FULL_SIGNAL_LOOKBACK) ile toplu hesaplama"""
+    return await bot.calculate_signals_for_symbols_batch(symbols, lookback=bot.FULL_SIGNAL_LOOKBACK)
+
+# Son sinyal üreten motorlar: async (symbols) -> {symbol: {tf: signal} veya None}
+DECISION_ENGINES = {
+    "symbol_planned": symbol_planned_decisions,
+    "symbols_batch": symbols_batch_decisions,
+    "symbols_batch_full": symbols_batch_full_decisions,
+}
+
+def two_of_two_decision(signals, timeframes):
+    """Sinyallerden 2/2 kararı: (ALIŞ sayısı, SATIŞ sayısı, kural sağlandı mı)"""
+    if signals is None:
+        return None
+    buy_count, sell_count = bot.calculate_signal_counts(signals, timeframes)
+    return buy_count, sell_count, bot.check_2_2_rule(buy_count, sell_count)
+
+# ============================================================================
+# KARŞILAŞTIRMA
+# ============================================================================
+
+def diff_columns(reference, candidate):
+    """İki sinyal kolonunu karşılaştırır; fark yoksa None, varsa özet döndürür"""
+    if candidate is None or len(candidate) != len(reference):
+        return {"reason": "uzunluk farkı", "reference_len": len(reference),
+                "candidate_len": None if candidate is None else len(candidate)}
+    mismatched = np.flatnonzero(reference != candidate)
+    if mismatched.size == 0:
+        return None
+    first = int(mismatched[0])
+    return {"mismatched_bars": int(mismatched.size), "first_bar": first,
+            "reference": int(reference[first]), "candidate": int(candidate[first])}
+
+async def replay_point(store, symbols, timeframes, engine_names, verbose):
+    """Tek bir ana dönüş: referansı hesaplar ve tüm motorları karşılaştırır"""
+    divergences = []
+    reference_last = {}
+
+    for tf in timeframes:
+        frames = {symbol: bot.klines_to_dataframe(store.tail(symbol, tf, bot.FULL_SIGNAL_LOOKBACK)) for symbol in symbols}
+        with _quiet(verbose):
+            reference = reference_columns(frames, tf)
+        for symbol, column in reference.items():
+            reference_last[(symbol, tf)] = int(column[-1])
+
+        for engine_name, engine in COLUMN_ENGINES.items():
+            with _quiet(verbose):
+                candidate = engine(frames, tf)
+            for symbol in symbols:
+                diff = diff_columns(reference[symbol], candidate.get(symbol))
+                if diff:
+                    divergences.append({"kind": "column", "engine": engine_name, "symbol": symbol, "timeframe": tf, **diff})
+
+    for engine_name in engine_names:
+        engine = DECISION_ENGINES[engine_name.split('/')[0]]
+        # Havuz varyantları: küçük işler dahil her hesaplama process havuzuna gider
+        inline_max_cells = 0 if engine_name.endswith('/pool') else bot.INDICATOR_INLINE_MAX_CELLS
+        with _quiet(verbose), patched(bot, INDICATOR_INLINE_MAX_CELLS=inline_max_cells):
+            decisions = await engine(symbols)
+        for symbol in symbols:
+            symbol_timeframes = bot.CRYPTO_SETTINGS[symbol]["timeframes"]
+            expected = {tf: reference_last[(symbol, tf)] for tf in symbol_timeframes}
+            actual = decisions.get(symbol)
+            with _quiet(verbose):
+                expected_rule = two_of_two_decision(expected, symbol_timeframes)
+                actual_rule = two_of_two_decision(actual, symbol_timeframes)
+            if actual != expected or actual_rule != expected_rule:
+                divergences.append({"kind": "decision", "engine": engine_name, "symbol": symbol,
+                                    "reference": expected, "candidate": actual,
+                                    "reference_2_2": expected_rule, "candidate_2_2": actual_rule})
+    return divergences
+
+async def run(args):
+    base = KlineStore.from_file(args.recorded) if args.recorded else KlineStore()
+    store = ReplayStore(base)
+    symbols = list(bot.CRYPTO_SETTINGS)
+    timeframes = benchmark_timeframes()
+
+    max_offset = min(len(base.series(symbol, tf)) for symbol in symbols for tf in timeframes) - bot.FULL_SIGNAL_LOOKBACK
+    if max_offset < 0:
+        print(f"❌ Kayıtlı veri yetersiz: en az {bot.FULL_SIGNAL_LOOKBACK} mum gerekli")
+        return 2
+    offsets = [offset for offset in range(0, max_offset + 1, args.step)][:args.replays]
+
+    engine_names = list(DECISION_ENGINES)
+    runner, base_url, _ = await start_binance_stand_in(store)
+    report = {"created_at": str(datetime.now()), "data": args.recorded or "synthetic",
+              "offsets": offsets, "engines": list(COLUMN_ENGINES) + engine_names, "divergences": []}
+    try:
+        with patched(bot, BINANCE_FUTURES_URL=base_url):
+            if args.pool:
+                with _quiet(args.verbose):
+                    await bot.start_indicator_pool()
+                if bot.indicator_pool is not None:
+                    engine_names += [f"{name}/pool" for name in DECISION_ENGINES]
+                    report["engines"] = list(COLUMN_ENGINES) + engine_names
+
+            print(f"🚀 Parity kontrolü: {len(offsets)} ana dönüş, {len(symbols)} sembol, timeframe'ler: {', '.join(timeframes)}")
+            print(f"   Motorlar: {', '.join(report['engines'])}")
+            for offset in offsets:
+                store.offset = offset
+                divergences = await replay_point(store, symbols, timeframes, engine_names, args.verbose)
+                for divergence in divergences:
+                    divergence["offset"] = offset
+                report["divergences"].extend(divergences)
+                icon = "❌" if divergences else "✅"
+                print(f"{icon} offset={offset}: {len(divergences)} fark")
+    finally:
+        if args.pool:
+            with _quiet(args.verbose):
+                bot.shutdown_indicator_pool()
+        await runner.cleanup()
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+        print(f"💾 Rapor kaydedildi: {args.report}")
+
+    if report["divergences"]:
+        print(f"\n❌ {len(report['divergences'])} fark bulundu:")
+        for divergence in report["divergences"][:args.max_print]:
+            print(f"   {divergence}")
+        return 1
+    print("\n✅ Tüm motorlar referansla birebir aynı")
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sinyal motorları için golden-output parity harness'i")
+    parser.add_argument("--recorded", help="benchmark.py --record ile kaydedilmiş kline JSON dosyası")
+    parser.add_argument("--replays", type=int, default=10, help="Tekrar oynatılacak ana dönüş sayısı")
+    parser.add_argument("--step", type=int, default=20, help="Ana dönüşler arası mum sayısı")
+    parser.add_argument("--no-pool", dest="pool", action="store_false", help="Process havuzu varyantlarını atla")
+    parser.add_argument("--report", help="Farkları JSON olarak kaydet")
+    parser.add_argument("--max-print", type=int, default=20, help="Yazdırılacak en fazla fark sayısı")
+    parser.add_argument("--verbose", action="store_true", help="Bot çıktılarını gizleme")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    return asyncio.run(run(parse_args(argv)))
+
+if __name__ == "__main__":
+    sys.exit(main())